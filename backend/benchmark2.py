@@ -5,16 +5,24 @@ import uvicorn
 import threading
 from fastapi import FastAPI, Request
 
+from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock
-import routers.documents
-routers.documents.parse_document = AsyncMock(return_value=[])
-routers.documents.process_and_store_documents = MagicMock(return_value=1)
+from services.ingestion import new_job
 
 from routers.documents import router
 
 app = FastAPI()
 app.include_router(router, prefix="/api")
 
+
+def _accept(customer_id, filename, path):
+    # Upload only spools and queues; the stubbed queue discards the file
+    Path(path).unlink(missing_ok=True)
+    return new_job(customer_id, filename, path)
+
+
+app.state.ingestion = MagicMock(submit=AsyncMock(side_effect=_accept))
+
 @app.get("/ping")
 async def ping():
     return {"ping": "pong"}
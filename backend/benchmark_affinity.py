@@ -0,0 +1,176 @@
+"""Tenant-affinity harness — random vs. rendezvous routing across worker processes.
+
+Spawns N worker processes that each keep an LRU of "tenant indexes" (byte
+buffers sized like a persisted TreeIndex) under a per-worker memory budget,
+then replays a Zipf-distributed tenant request stream twice:
+
+  random    — any worker may take any request (gunicorn's shared socket)
+  affinity  — each tenant always goes to its rendezvous-hash owner
+
+and reports hit rates, resident tenants and memory per worker, plus how many
+tenants move when a worker is added or removed.
+
+Usage:
+    python benchmark_affinity.py --workers 4 --tenants 200 --requests 5000
+"""
+import argparse
+import json
+import multiprocessing as mp
+import random
+import resource
+import time
+from collections import OrderedDict
+
+from services.tenant_affinity import RendezvousRouter
+
+
+def _worker_main(name, inbox, outbox, budget_bytes, load_ms):
+    resident = OrderedDict()
+    resident_bytes = 0
+    requests = hits = 0
+    while True:
+        msg = inbox.get()
+        if msg is None:
+            break
+        if msg == "stats":
+            outbox.put({
+                "worker": name,
+                "requests": requests,
+                "hits": hits,
+                "hit_rate": round(hits / requests, 4) if requests else 0.0,
+                "resident_tenants": len(resident),
+                "resident_mb": round(resident_bytes / 1024 / 1024, 2),
+                "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+            })
+            continue
+
+        tenant, size = msg
+        requests += 1
+        if tenant in resident:
+            hits += 1
+            resident.move_to_end(tenant)
+        else:
+            time.sleep(load_ms / 1000)  # Simulated snapshot load
+            resident[tenant] = bytearray(size)
+            resident_bytes += size
+            while resident_bytes > budget_bytes and len(resident) > 1:
+                _, evicted = resident.popitem(last=False)
+                resident_bytes -= len(evicted)
+        outbox.put(None)
+
+
+def _zipf_stream(tenants, count, skew, rng):
+    weights = [1.0 / (rank + 1) ** skew for rank in range(len(tenants))]
+    return rng.choices(tenants, weights=weights, k=count)
+
+
+def _run_mode(mode, args, tenants, sizes, stream):
+    ctx = mp.get_context("spawn")
+    names = [f"worker-{i}" for i in range(args.workers)]
+    inboxes = {n: ctx.Queue() for n in names}
+    outbox = ctx.Queue()
+    procs = [
+        ctx.Process(
+            target=_worker_main,
+            args=(n, inboxes[n], outbox, args.budget_mb * 1024 * 1024, args.load_ms),
+            daemon=True,
+        )
+        for n in names
+    ]
+    for p in procs:
+        p.start()
+
+    router = RendezvousRouter(names)
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    in_flight = 0
+    for tenant in stream:
+        target = router.owner(tenant) if mode == "affinity" else rng.choice(names)
+        inboxes[target].put((tenant, sizes[tenant]))
+        in_flight += 1
+        # Keep roughly one request in flight per worker
+        if in_flight >= args.workers:
+            outbox.get()
+            in_flight -= 1
+    for _ in range(in_flight):
+        outbox.get()
+    elapsed = time.perf_counter() - start
+
+    for n in names:
+        inboxes[n].put("stats")
+    workers = sorted((outbox.get() for _ in names), key=lambda s: s["worker"])
+    for n in names:
+        inboxes[n].put(None)
+    for p in procs:
+        p.join()
+
+    total = sum(w["requests"] for w in workers)
+    hits = sum(w["hits"] for w in workers)
+    return {
+        "mode": mode,
+        "elapsed_s": round(elapsed, 3),
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+        "total_resident_mb": round(sum(w["resident_mb"] for w in workers), 2),
+        "workers": workers,
+    }
+
+
+def _rebalance_report(args, tenants):
+    names = [f"worker-{i}" for i in range(args.workers)]
+    base = RendezvousRouter(names)
+    grown = base.with_nodes(names + [f"worker-{args.workers}"])
+    shrunk = base.with_nodes(names[:-1]) if len(names) > 1 else base
+    moved_add = sum(base.owner(t) != grown.owner(t) for t in tenants)
+    moved_remove = sum(base.owner(t) != shrunk.owner(t) for t in tenants)
+    return {
+        "tenants": len(tenants),
+        "moved_on_add": moved_add,
+        "moved_on_add_pct": round(100 * moved_add / len(tenants), 2),
+        "ideal_on_add_pct": round(100 / (args.workers + 1), 2),
+        "moved_on_remove": moved_remove,
+        "moved_on_remove_pct": round(100 * moved_remove / len(tenants), 2),
+        "ideal_on_remove_pct": round(100 / args.workers, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of tenant popularity")
+    parser.add_argument("--budget-mb", type=int, default=64, help="Per-worker index memory budget")
+    parser.add_argument("--index-mb", type=float, default=2.0, help="Mean tenant index size")
+    parser.add_argument("--load-ms", type=float, default=1.0, help="Simulated snapshot load time")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON only")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tenants = [f"tenant-{i:04d}" for i in range(args.tenants)]
+    sizes = {t: max(1024, int(rng.expovariate(1 / (args.index_mb * 1024 * 1024)))) for t in tenants}
+    stream = _zipf_stream(tenants, args.requests, args.skew, rng)
+
+    report = {
+        "config": vars(args),
+        "results": [_run_mode(mode, args, tenants, sizes, stream) for mode in ("random", "affinity")],
+        "rebalance": _rebalance_report(args, tenants),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for result in report["results"]:
+        print(f"\n== {result['mode']} routing: hit rate {result['hit_rate']:.1%}, "
+              f"resident {result['total_resident_mb']} MB total, {result['elapsed_s']}s")
+        for w in result["workers"]:
+            print(f"  {w['worker']}: requests={w['requests']} hit_rate={w['hit_rate']:.1%} "
+                  f"tenants={w['resident_tenants']} resident={w['resident_mb']}MB rss={w['max_rss_mb']}MB")
+    rb = report["rebalance"]
+    print(f"\nRebalance: +1 worker moves {rb['moved_on_add_pct']}% of tenants (ideal {rb['ideal_on_add_pct']}%), "
+          f"-1 worker moves {rb['moved_on_remove_pct']}% (ideal {rb['ideal_on_remove_pct']}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""Ingestion throughput benchmark — per-stage time, docs/min and event-loop lag.
+
+Drives both upload paths end to end, in-process, behind the real JWT
+middleware on the simulated providers (services/simulated_providers.py):
+
+  documents  — POST /api/documents/upload, then the ingestion queue's
+               parse → mask → index stages, polled via /api/documents/jobs/{id}
+  kb         — POST /api/kb/folders/{id}/upload (spool and record only;
+               KB files are read at chat time)
+
+Every (format, size, concurrency) cell uploads --docs files for a fresh
+tenant. Text formats (md, txt, csv) carry markdown sections; binary formats
+(pdf, docx, xlsx) are opaque bytes the simulated parser turns into one
+section per 4 KB. Reported per cell:
+
+  spool       upload request time (multipart read, write to disk, job record)
+  parse       simulated LlamaParse job (--parse-ms + --parse-kb-ms per KB)
+  mask        mask_pii over the parsed pages
+  split       MarkdownNodeParser
+  tree_build  rest of the index stage: summaries, BM25/vector indexes, snapshot
+  docs_per_min, from first upload to last finished job
+  loop_lag    how late a 5 ms ticker on the event loop woke up meanwhile
+
+Jobs and KB records are kept in tests.memory_db unless --mongo-url points
+at a real MongoDB.
+
+Usage:
+    python benchmark_ingest.py --formats pdf md --sizes-kb 8 64 256 --concurrency 1 4 --docs 8
+    python benchmark_ingest.py --json --output ingest.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import APIRouter, FastAPI
+from llama_index.core import Settings
+
+from middleware import auth
+from middleware.auth import JWTAuthMiddleware
+from routers import knowledge_base
+from routers.documents import router as documents_router
+from routers.knowledge_base import router as kb_router
+from services import rag_engine, simulated_providers
+from services.embedding_cache import EmbeddingStore
+from services.index_store import IndexStore
+from services.ingestion import IngestionQueue
+from services.llm_cache import LLMCache
+from services.simulated_providers import (
+    Latency,
+    SimulatedEmbedding,
+    SimulatedLLM,
+    SimulationProfile,
+    simulated_verify_token,
+)
+from tests.memory_db import MemoryDB
+
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "md": "text/markdown",
+    "txt": "text/plain",
+    "csv": "text/csv",
+}
+TEXT_FORMATS = {"md", "txt", "csv"}
+TOPICS = [
+    "landing gear overhaul", "engine borescope inspection", "avionics software load",
+    "fuel tank sealing", "hydraulic pump replacement", "corrosion prevention program",
+    "APU shop visit", "brake wear limits", "structural repair manual", "tooling calibration",
+]
+# KB uploads are capped per user (routers.knowledge_base.MAX_DOCS_PER_USER)
+KB_MAX_DOCS = knowledge_base.MAX_DOCS_PER_USER
+
+
+# ──────────────────────────────────────────────────
+# Workload
+# ──────────────────────────────────────────────────
+def _payload(fmt: str, size_kb: int, rng: random.Random) -> bytes:
+    """A file of about ``size_kb`` KB: markdown sections for text formats, opaque bytes otherwise."""
+    target = size_kb * 1024
+    if fmt not in TEXT_FORMATS:
+        return f"%{fmt.upper()}-bench\n".encode() + rng.randbytes(max(0, target - 16))
+    parts, size = [], 0
+    while size < target:
+        wo = f"WO-{rng.randint(1000, 9999)}"
+        topics = rng.sample(TOPICS, 2)
+        part = (
+            f"## Work order {wo}\n{wo} covers {topics[0]} and {topics[1]} for tail "
+            f"N{rng.randint(100, 999)}AV with a {rng.randint(2, 30)} day turnaround.\n\n"
+        )
+        parts.append(part)
+        size += len(part)
+    return f"# Capabilities\n\n{''.join(parts)}".encode()[:target]
+
+
+class LoopLagProbe:
+    """Ticks every ``interval`` seconds and records how late each wake-up was."""
+
+    def __init__(self, interval: float = 0.005):
+        self._interval = interval
+        self.lags_ms: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            self.lags_ms.append(max(0.0, (loop.time() - expected) * 1000))
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._tick())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+class SplitTimer:
+    """Times ``rag_engine._to_nodes`` (MarkdownNodeParser) per customer."""
+
+    def __init__(self):
+        self.seconds: Dict[str, List[float]] = defaultdict(list)
+        self._inner = rag_engine._to_nodes
+
+    def __call__(self, documents, customer_id):
+        start = time.perf_counter()
+        try:
+            return self._inner(documents, customer_id)
+        finally:
+            self.seconds[customer_id].append(time.perf_counter() - start)
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2)
+
+    return {
+        "mean_ms": round(sum(ordered) / len(ordered), 2),
+        "p50_ms": rank(0.50),
+        "p95_ms": rank(0.95),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+# ──────────────────────────────────────────────────
+# Cells
+# ──────────────────────────────────────────────────
+async def _token(tag: str) -> Dict[str, Any]:
+    token = f"sim:{tag}"
+    user = await simulated_verify_token(token, SimulationProfile.instant())
+    return {"headers": {"Authorization": f"Bearer {token}"}, "sub": user["sub"]}
+
+
+async def _documents_cell(client, fmt: str, size_kb: int, concurrency: int, args, split: SplitTimer, rng) -> Dict[str, Any]:
+    who = await _token(f"ingest-{fmt}-{size_kb}-{concurrency}-{uuid.uuid4().hex[:6]}")
+    files = [_payload(fmt, size_kb, rng) for _ in range(args.docs)]
+    gate = asyncio.Semaphore(concurrency)
+    spool_ms: List[float] = []
+    finished: List[Dict[str, Any]] = []
+
+    async def ingest(i: int, data: bytes):
+        async with gate:
+            sent = time.perf_counter()
+            upload = await client.post(
+                "/api/documents/upload",
+                files={"file": (f"doc-{i}.{fmt}", data, CONTENT_TYPES[fmt])},
+                headers=who["headers"],
+            )
+            spool_ms.append((time.perf_counter() - sent) * 1000)
+        upload.raise_for_status()
+        job_id = upload.json()["job_id"]
+        while True:
+            job = (await client.get(f"/api/documents/jobs/{job_id}", headers=who["headers"])).json()
+            if job["status"] in ("succeeded", "failed"):
+                finished.append(job)
+                return
+            await asyncio.sleep(args.poll_ms / 1000)
+
+    with LoopLagProbe() as probe:
+        start = time.perf_counter()
+        await asyncio.gather(*(ingest(i, data) for i, data in enumerate(files)))
+        wall_s = time.perf_counter() - start
+
+    stages: Dict[str, List[float]] = defaultdict(list)
+    for job in finished:
+        for stage, status in job["stages"].items():
+            if status.get("duration_ms") is not None:
+                stages[stage].append(status["duration_ms"])
+    split_ms = [s * 1000 for s in split.seconds.pop(who["sub"], [])]
+    # Splits are not tied to a job id: take their mean out of each index stage
+    mean_split = sum(split_ms) / len(split_ms) if split_ms else 0.0
+    tree_ms = [index - mean_split for index in stages["index"]]
+    succeeded = [j for j in finished if j["status"] == "succeeded"]
+    return {
+        "path": "documents",
+        "format": fmt,
+        "size_kb": size_kb,
+        "concurrency": concurrency,
+        "docs": len(files),
+        "succeeded": len(succeeded),
+        "failed": len(finished) - len(succeeded),
+        "chunks": sum(j.get("chunks_created") or 0 for j in succeeded),
+        "docs_per_min": round(len(succeeded) / wall_s * 60, 1) if wall_s else None,
+        "mb_per_s": round(len(succeeded) * size_kb / 1024 / wall_s, 3) if wall_s else None,
+        "stages": {
+            "spool": _summary(spool_ms),
+            "parse": _summary(stages["parse"]),
+            "mask": _summary(stages["mask"]),
+            "split": _summary(split_ms),
+            "tree_build": _summary(tree_ms),
+        },
+        "loop_lag": _summary(probe.lags_ms),
+    }
+
+
+async def _kb_cell(client, db, fmt: str, size_kb: int, concurrency: int, args, rng) -> Dict[str, Any]:
+    who = await _token(f"kb-{fmt}-{size_kb}-{concurrency}-{uuid.uuid4().hex[:6]}")
+    folder_id = str(uuid.uuid4())
+    await db.kb_folders.insert_one({
+        "id": folder_id, "user_id": who["sub"], "name": "bench", "created_at": datetime.now(timezone.utc),
+    })
+    files = [_payload(fmt, size_kb, rng) for _ in range(min(args.docs, KB_MAX_DOCS))]
+    gate = asyncio.Semaphore(concurrency)
+    spool_ms: List[float] = []
+    ok = 0
+
+    async def upload(i: int, data: bytes):
+        nonlocal ok
+        async with gate:
+            sent = time.perf_counter()
+            response = await client.post(
+                f"/api/kb/folders/{folder_id}/upload",
+                files={"file": (f"doc-{i}.{fmt}", data, CONTENT_TYPES[fmt])},
+                headers=who["headers"],
+            )
+            spool_ms.append((time.perf_counter() - sent) * 1000)
+        ok += response.status_code == 200
+
+    with LoopLagProbe() as probe:
+        start = time.perf_counter()
+        await asyncio.gather(*(upload(i, data) for i, data in enumerate(files)))
+        wall_s = time.perf_counter() - start
+    shutil.rmtree(knowledge_base.UPLOAD_DIR / who["sub"], ignore_errors=True)
+
+    return {
+        "path": "kb",
+        "format": fmt,
+        "size_kb": size_kb,
+        "concurrency": concurrency,
+        "docs": len(files),
+        "succeeded": ok,
+        "failed": len(files) - ok,
+        "docs_per_min": round(ok / wall_s * 60, 1) if wall_s else None,
+        "mb_per_s": round(ok * size_kb / 1024 / wall_s, 3) if wall_s else None,
+        "stages": {"spool": _summary(spool_ms)},
+        "loop_lag": _summary(probe.lags_ms),
+    }
+
+
+def _app(db, ingestion: IngestionQueue) -> FastAPI:
+    app = FastAPI()
+    api = APIRouter(prefix="/api")
+    api.include_router(documents_router)
+    api.include_router(kb_router)
+    app.include_router(api)
+    app.add_middleware(JWTAuthMiddleware)
+    app.state.db = db
+    app.state.ingestion = ingestion
+    return app
+
+
+async def _main(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    profile = SimulationProfile.from_spec(args.profile) if args.profile else SimulationProfile.instant(
+        llm=Latency(median_ms=args.llm_ms, sigma=0.35, per_unit_ms=args.llm_token_ms),
+        embed=Latency(median_ms=args.embed_ms, sigma=0.25),
+        parse=Latency(median_ms=args.parse_ms, sigma=0.4, per_unit_ms=args.parse_kb_ms),
+    )
+    simulated_providers.set_profile(profile)
+    simulated_providers.SIMULATED_PROVIDERS = True
+    auth.SIMULATED_PROVIDERS = True
+
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        db = AsyncIOMotorClient(args.mongo_url)[f"avicon_bench_{uuid.uuid4().hex[:8]}"]
+    else:
+        db = MemoryDB()
+
+    with tempfile.TemporaryDirectory() as root:
+        rag_engine._index_store = IndexStore(root=os.path.join(root, "indexes"))
+        rag_engine._llm_cache = LLMCache(path=os.path.join(root, "llm.sqlite3"))
+        rag_engine._embedding_store = EmbeddingStore(path=os.path.join(root, "embeddings.sqlite3"))
+        Settings.llm = SimulatedLLM(profile=profile)
+        Settings.embed_model = rag_engine._cached_embed_model(SimulatedEmbedding(profile=profile))
+        Settings._avicon_configured = True
+        split = SplitTimer()
+        rag_engine._to_nodes = split
+
+        ingestion = IngestionQueue(db, workers=args.workers)
+        await ingestion.start()
+        results = []
+        try:
+            transport = httpx.ASGITransport(app=_app(db, ingestion))
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for fmt in args.formats:
+                    for size_kb in args.sizes_kb:
+                        for concurrency in args.concurrency:
+                            if "documents" in args.paths:
+                                results.append(await _documents_cell(client, fmt, size_kb, concurrency, args, split, rng))
+                            if "kb" in args.paths:
+                                results.append(await _kb_cell(client, db, fmt, size_kb, concurrency, args, rng))
+        finally:
+            await ingestion.stop()
+            if args.mongo_url:
+                await db.client.drop_database(db.name)
+
+    return {
+        "benchmark": "ingest",
+        "config": vars(args),
+        "profile": {"llm": vars(profile.llm), "embed": vars(profile.embed), "parse": vars(profile.parse)},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", default=["pdf", "docx", "md"], choices=sorted(CONTENT_TYPES))
+    parser.add_argument("--sizes-kb", type=int, nargs="+", default=[8, 64, 256])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="Uploads in flight")
+    parser.add_argument("--docs", type=int, default=8, help="Files per cell")
+    parser.add_argument("--paths", nargs="+", default=["documents", "kb"], choices=["documents", "kb"])
+    parser.add_argument("--workers", type=int, default=2, help="Ingestion queue workers (INGEST_WORKERS)")
+    parser.add_argument("--parse-ms", type=float, default=200.0, help="Median simulated parse job time")
+    parser.add_argument("--parse-kb-ms", type=float, default=2.0, help="Simulated parse time per KB")
+    parser.add_argument("--llm-ms", type=float, default=20.0, help="Median time to first token")
+    parser.add_argument("--llm-token-ms", type=float, default=0.5, help="Time per further output token")
+    parser.add_argument("--embed-ms", type=float, default=5.0, help="Median time per embedding request")
+    parser.add_argument("--profile", default="", help="Full simulation profile (JSON or path); overrides --*-ms")
+    parser.add_argument("--poll-ms", type=float, default=50.0, help="Job status polling interval")
+    parser.add_argument("--mongo-url", default="", help="Keep jobs in this MongoDB instead of memory")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON only")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(_main(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for r in report["results"]:
+        print(f"\n== {r['path']} {r['format']} {r['size_kb']}KB x{r['docs']} @{r['concurrency']}: "
+              f"{r['docs_per_min']} docs/min, {r['mb_per_s']} MB/s, failed={r['failed']}")
+        for stage, pct in r["stages"].items():
+            if pct:
+                print(f"  {stage:<10} mean={pct['mean_ms']}ms p95={pct['p95_ms']}ms max={pct['max_ms']}ms")
+        lag = r["loop_lag"]
+        print(f"  loop lag   p50={lag.get('p50_ms')}ms p95={lag.get('p95_ms')}ms max={lag.get('max_ms')}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""Full-stack load harness — server:app, every router, the whole middleware chain.
+
+Boots the real ``server:app`` (lifespan, middleware stack, routers) in-process
+with local stand-ins: tests.memory_db for MongoDB and the simulated
+providers (SIMULATED_PROVIDERS=1) for Supabase auth, Azure OpenAI and
+LlamaParse. Virtual users each get their own ``sim:`` token, a KB folder with
+one document, a draft, a team template and a small RAG index; then an
+open-loop Poisson arrival process drives a weighted mix of routes across
+/api/kb, /api/drafts, /api/stats, /api/team-templates, /api/rfp-response and
+/api/query at --rps for --duration seconds.
+
+Reported per route: achieved RPS, status counts, error (5xx/transport) and 429
+rates, latency percentiles and a histogram, plus CPU per request measured by
+replaying each route serially. The middleware baseline replays a no-op
+endpoint through apps carrying no middleware, then the server's layers one by
+one (innermost first), isolating what the stack costs per request.
+
+Usage:
+    python benchmark_load.py --rps 50 --duration 20 --users 40
+    python benchmark_load.py --weights query=40,stats=0 --json --output load.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, fields, replace
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI
+
+# Latency histogram upper bounds (ms); the last bucket is open-ended
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+QUESTIONS = [
+    "What is the turnaround for {wo}?",
+    "Which tail is scheduled for {wo}?",
+    "Who handles landing gear overhaul with a short turnaround?",
+    "Summarize our borescope inspection capability",
+]
+TOPICS = ["landing gear overhaul", "engine borescope inspection", "APU shop visit", "fuel tank sealing", "brake wear limits"]
+
+
+@dataclass
+class VirtualUser:
+    token: str
+    sub: str = ""
+    folder_id: str = ""
+    document_id: str = ""
+    draft_id: str = ""
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+@dataclass
+class Route:
+    name: str
+    weight: float
+    method: str
+    path: Callable[[VirtualUser], str]
+    body: Optional[Callable[[VirtualUser, random.Random], Dict[str, Any]]] = None
+    params: Optional[Callable[[VirtualUser, random.Random], Dict[str, Any]]] = None
+
+
+def _question(user: VirtualUser, rng: random.Random) -> str:
+    return rng.choice(QUESTIONS).format(wo=f"WO-{rng.randint(1000, 1000 + 29)}")
+
+
+ROUTES = [
+    Route("query", 20, "POST", lambda u: "/api/query/", lambda u, r: {"query": _question(u, r)}),
+    Route("kb.folders", 10, "GET", lambda u: "/api/kb/folders"),
+    Route("kb.documents", 5, "GET", lambda u: f"/api/kb/folders/{u.folder_id}/documents"),
+    Route("kb.limits", 3, "GET", lambda u: "/api/kb/limits"),
+    Route("drafts.list", 10, "GET", lambda u: "/api/drafts"),
+    Route("drafts.get", 5, "GET", lambda u: f"/api/drafts/{u.draft_id}"),
+    Route("drafts.save", 5, "PUT", lambda u: f"/api/drafts/{u.draft_id}",
+          lambda u, r: {"content": f"Section {r.randint(1, 99)}: revised turnaround commitments."}),
+    Route("drafts.presence", 5, "POST", lambda u: f"/api/drafts/{u.draft_id}/presence",
+          lambda u, r: {"action": r.choice(["viewing", "editing"])}),
+    Route("stats", 8, "GET", lambda u: "/api/stats"),
+    Route("team_templates.list", 8, "GET", lambda u: "/api/team-templates",
+          params=lambda u, r: {"search": r.choice(["", "mro", "engine"])}),
+    Route("team_templates.categories", 3, "GET", lambda u: "/api/team-templates/categories/list"),
+    Route("rfp.templates", 3, "GET", lambda u: "/api/rfp-response/templates"),
+    Route("rfp.chat", 5, "POST", lambda u: "/api/rfp-response/chat",
+          lambda u, r: {"query": _question(u, r), "document_ids": [u.document_id]}),
+    Route("rfp.draft", 3, "POST", lambda u: "/api/rfp-response/draft",
+          lambda u, r: {"rfp_context": f"Describe your {r.choice(TOPICS)} capability and turnaround.",
+                        "document_ids": [u.document_id]}),
+]
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    """``"query=40,stats=0"`` -> {"query": 40.0, "stats": 0.0}."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        if name not in {route.name for route in ROUTES}:
+            raise SystemExit(f"Unknown route in --weights: {name}")
+        weights[name] = float(value)
+    return weights
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2)
+
+    return {"p50_ms": rank(0.50), "p95_ms": rank(0.95), "p99_ms": rank(0.99), "max_ms": round(ordered[-1], 2)}
+
+
+def _histogram(values: List[float]) -> Dict[str, int]:
+    counts = Counter()
+    for value in values:
+        bound = next((b for b in BUCKETS_MS if value <= b), None)
+        counts[f"<={bound}ms" if bound is not None else f">{BUCKETS_MS[-1]}ms"] += 1
+    labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+    return {label: counts[label] for label in labels if counts[label]}
+
+
+async def _send(client: httpx.AsyncClient, route: Route, user: VirtualUser, rng: random.Random) -> httpx.Response:
+    return await client.request(
+        route.method,
+        route.path(user),
+        json=route.body(user, rng) if route.body else None,
+        params=route.params(user, rng) if route.params else None,
+        headers=user.headers,
+    )
+
+
+# ──────────────────────────────────────────────────
+# Setup
+# ──────────────────────────────────────────────────
+def _boot(args, root: str):
+    """Import server:app with every external dependency pointed at a local stand-in."""
+    os.environ["SIMULATED_PROVIDERS"] = "1"
+    os.environ["AVICON_ENV"] = "test"
+    if args.profile:
+        os.environ["SIMULATED_PROFILE"] = args.profile
+    for name, path in (
+        ("RAG_INDEX_DIR", "indexes"), ("RAG_LLM_CACHE_PATH", "llm.sqlite3"), ("RAG_EMBED_CACHE_PATH", "embeddings.sqlite3"),
+    ):
+        os.environ[name] = os.path.join(root, path)
+
+    # NOTE: imported late — the modules read the environment above at import time
+    import server
+    from middleware import auth
+    from middleware.audit import AuditLoggingMiddleware
+    from tests.memory_db import MemoryDB
+
+    if not args.verbose:
+        # 429s are an expected outcome under load; keep their warnings off the report
+        logging.disable(logging.WARNING)
+    # sim: tokens are accepted only when a harness switches them on in-process
+    auth.SIMULATED_PROVIDERS = True
+    db = MemoryDB("avicon_load")
+    # Lifespan, status routes and the audit middleware all read server.db
+    server.db = db
+    for middleware in server.app.user_middleware:
+        if middleware.cls is AuditLoggingMiddleware:
+            middleware.kwargs["db"] = db
+    return server
+
+
+async def _seed(client: httpx.AsyncClient, user: VirtualUser, sections: int, rng: random.Random):
+    """Per-user fixtures, created through the API (4 requests, under the burst limit)."""
+    from services import rag_engine
+    from services.simulated_providers import SimulationProfile, simulated_verify_token
+
+    user.sub = (await simulated_verify_token(user.token, SimulationProfile.instant()))["sub"]
+    folder = await client.post("/api/kb/folders", json={"name": "Capabilities"}, headers=user.headers)
+    user.folder_id = folder.json()["id"]
+    document = await client.post(
+        f"/api/kb/folders/{user.folder_id}/upload",
+        files={"file": ("capabilities.md", _corpus_text(sections, rng).encode(), "text/markdown")},
+        headers=user.headers,
+    )
+    user.document_id = document.json()["document"]["id"]
+    draft = await client.post("/api/drafts", json={"title": "MRO response", "content": "Draft body"}, headers=user.headers)
+    user.draft_id = draft.json()["id"]
+    await client.post(
+        "/api/team-templates",
+        json={"title": "MRO capability", "content": "Template body", "category": "MRO", "tags": ["mro", "engine"]},
+        headers=user.headers,
+    )
+
+    class Section:
+        def __init__(self, text):
+            self.page_content = text
+            self.metadata = {"source": "capabilities.md"}
+
+    await rag_engine.aprocess_and_store_documents([Section(_corpus_text(sections, rng))], user.sub)
+
+
+def _corpus_text(sections: int, rng: random.Random) -> str:
+    return "# Capabilities\n\n" + "\n".join(
+        f"## Work order WO-{1000 + i}\nWO-{1000 + i} covers {rng.choice(TOPICS)} for tail "
+        f"N{rng.randint(100, 999)}AV with a {rng.randint(2, 30)} day turnaround.\n"
+        for i in range(sections)
+    )
+
+
+# ──────────────────────────────────────────────────
+# Phases
+# ──────────────────────────────────────────────────
+async def _load(client: httpx.AsyncClient, routes: List[Route], users: List[VirtualUser], args, rng) -> Dict[str, Any]:
+    """Open-loop Poisson arrivals at --rps; requests over --max-inflight are shed client-side."""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    shed: Counter = Counter()
+    inflight: set = set()
+    weights = [route.weight for route in routes]
+
+    async def one(route: Route, user: VirtualUser, seed: int):
+        sent = time.perf_counter()
+        try:
+            response = await _send(client, route, user, random.Random(seed))
+            status = str(response.status_code)
+        except Exception as e:
+            status = f"error:{type(e).__name__}"
+        latencies[route.name].append((time.perf_counter() - sent) * 1000)
+        statuses[route.name][status] += 1
+
+    loop = asyncio.get_running_loop()
+    cpu_start, start = time.process_time(), loop.time()
+    next_at = start
+    while next_at - start < args.duration:
+        next_at += rng.expovariate(args.rps)
+        await asyncio.sleep(max(0.0, next_at - loop.time()))
+        route = rng.choices(routes, weights=weights)[0]
+        if len(inflight) >= args.max_inflight:
+            shed[route.name] += 1
+            continue
+        task = asyncio.create_task(one(route, rng.choice(users), rng.getrandbits(32)))
+        inflight.add(task)
+        task.add_done_callback(inflight.discard)
+    await asyncio.gather(*inflight)
+    wall = loop.time() - start
+    cpu = time.process_time() - cpu_start
+
+    per_route = {}
+    for route in routes:
+        counts = statuses.get(route.name, Counter())
+        n = sum(counts.values())
+        errors = sum(c for s, c in counts.items() if s.startswith("error") or s.startswith("5"))
+        per_route[route.name] = {
+            "requests": n,
+            "rps": round(n / wall, 2),
+            "statuses": dict(counts),
+            "error_rate": round(errors / n, 4) if n else None,
+            "rate_limited_rate": round(counts["429"] / n, 4) if n else None,
+            "shed": shed[route.name],
+            "latency": _percentiles(latencies.get(route.name, [])),
+            "histogram": _histogram(latencies.get(route.name, [])),
+        }
+    completed = sum(r["requests"] for r in per_route.values())
+    all_statuses = sum((statuses[r] for r in statuses), Counter())
+    return {
+        "offered_rps": args.rps,
+        "achieved_rps": round(completed / wall, 2),
+        "duration_s": round(wall, 2),
+        "requests": completed,
+        "shed": sum(shed.values()),
+        "error_rate": round(
+            sum(c for s, c in all_statuses.items() if s.startswith("error") or s.startswith("5")) / completed, 4
+        ) if completed else None,
+        "rate_limited_rate": round(all_statuses["429"] / completed, 4) if completed else None,
+        "cpu_ms_per_request": round(cpu * 1000 / completed, 3) if completed else None,
+        "latency": _percentiles([ms for values in latencies.values() for ms in values]),
+        "routes": per_route,
+    }
+
+
+async def _calibrate(client: httpx.AsyncClient, routes: List[Route], users: List[VirtualUser], repeats: int, rng) -> Dict[str, Any]:
+    """CPU and latency per request of each route, replayed serially by a user of its own."""
+    out = {}
+    for route, user in zip(routes, users):
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        codes = Counter()
+        for _ in range(repeats):
+            codes[(await _send(client, route, user, rng)).status_code] += 1
+        out[route.name] = {
+            "cpu_ms_per_request": round((time.process_time() - cpu_start) * 1000 / repeats, 3),
+            "latency_ms": round((time.perf_counter() - wall_start) * 1000 / repeats, 3),
+            "statuses": dict(codes),
+        }
+    return out
+
+
+def _baseline_headers(depth: int, i: int) -> Dict[str, str]:
+    n = depth * 1_000_000 + i + 1
+    return {
+        "Authorization": f"Bearer sim:baseline-{n}",
+        "X-Forwarded-For": f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}",
+    }
+
+
+async def _middleware_baseline(server, requests: int) -> List[Dict[str, Any]]:
+    """A no-op route behind 0..N of the server's middleware layers, innermost added first.
+
+    Every request comes from a fresh user and client IP, so the rate limiter's
+    full path is measured rather than its cheaper 429 short-circuit.
+    """
+    layers = list(server.app.user_middleware)  # Outermost first
+    results = []
+    for depth in range(len(layers) + 1):
+        app = FastAPI()
+
+        @app.get("/api/noop")
+        async def noop():
+            return {"ok": True}
+
+        app.user_middleware = layers[len(layers) - depth:]
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load") as client:
+            await client.get("/api/noop", headers=_baseline_headers(depth, -1))  # Warm up
+            latencies, codes = [], Counter()
+            cpu_start = time.process_time()
+            for i in range(requests):
+                sent = time.perf_counter()
+                response = await client.get("/api/noop", headers=_baseline_headers(depth, i))
+                latencies.append((time.perf_counter() - sent) * 1000)
+                codes[response.status_code] += 1
+            cpu = time.process_time() - cpu_start
+        results.append({
+            "layers": [m.cls.__name__ for m in app.user_middleware],
+            "added": layers[len(layers) - depth].cls.__name__ if depth else None,
+            "cpu_ms_per_request": round(cpu * 1000 / requests, 4),
+            "latency": _percentiles(latencies),
+            "statuses": dict(codes),
+        })
+    for previous, current in zip(results, results[1:]):
+        current["added_cpu_ms"] = round(current["cpu_ms_per_request"] - previous["cpu_ms_per_request"], 4)
+    return results
+
+
+async def _main(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    weights = _parse_weights(args.weights)
+    routes = [replace(route, weight=weights.get(route.name, route.weight)) for route in ROUTES]
+    routes = [route for route in routes if route.weight > 0]
+
+    with tempfile.TemporaryDirectory() as root:
+        server = _boot(args, root)
+        from services import simulated_providers
+
+        profile = simulated_providers.get_profile()
+        # Fixtures are built without simulated latency; the run uses the profile
+        timed = replace(profile)
+        for field in fields(profile):
+            if field.name in ("llm", "embed", "parse", "auth"):
+                setattr(profile, field.name, simulated_providers.Latency())
+
+        users = [VirtualUser(f"sim:load-{i}") for i in range(args.users + len(routes))]
+        async with server.lifespan(server.app):
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None) as client:
+                seed_start = time.perf_counter()
+                await asyncio.gather(*(_seed(client, user, args.seed_sections, rng) for user in users))
+                seed_s = round(time.perf_counter() - seed_start, 2)
+                for field in fields(profile):
+                    setattr(profile, field.name, getattr(timed, field.name))
+
+                # Calibration users are separate, so the load phase's rate-limit windows stay clean
+                load_users, calibration_users = users[: args.users], users[args.users:]
+                report: Dict[str, Any] = {"seed_s": seed_s}
+                report["load"] = await _load(client, routes, load_users, args, rng)
+                report["cpu_per_route"] = await _calibrate(client, routes, calibration_users, args.calibrate, rng)
+            if not args.skip_baseline:
+                report["middleware_baseline"] = await _middleware_baseline(server, args.baseline_requests)
+
+    return {
+        "benchmark": "load",
+        "config": vars(args),
+        "weights": {route.name: route.weight for route in routes},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=50.0, help="Offered load (Poisson arrivals)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load")
+    parser.add_argument(
+        "--users", type=int, default=120,
+        help="Virtual users; each is rate-limited separately (30/min), so sustained rps/users above 0.5 draws 429s",
+    )
+    parser.add_argument("--max-inflight", type=int, default=256, help="Shed arrivals beyond this many in flight")
+    parser.add_argument("--weights", default="", help="Route weight overrides, e.g. query=40,stats=0")
+    parser.add_argument("--seed-sections", type=int, default=30, help="Sections in each user's RAG index")
+    parser.add_argument("--calibrate", type=int, default=8, help="Serial requests per route for CPU/request")
+    parser.add_argument("--baseline-requests", type=int, default=300, help="No-op requests per middleware depth")
+    parser.add_argument("--skip-baseline", action="store_true")
+    parser.add_argument("--profile", default="", help="Simulation profile (SIMULATED_PROFILE JSON or path)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Keep the server's logging")
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON only")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(_main(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    load = report["load"]
+    print(f"Seeded {args.users} users in {report['seed_s']}s")
+    print(f"\n== load: offered {load['offered_rps']} rps, achieved {load['achieved_rps']} rps over {load['duration_s']}s "
+          f"({load['requests']} requests, shed {load['shed']})")
+    print(f"  errors={load['error_rate']} 429={load['rate_limited_rate']} cpu/request={load['cpu_ms_per_request']}ms "
+          f"latency={load['latency']}")
+    for name, r in load["routes"].items():
+        if not r["requests"]:
+            print(f"  {name:<26} no requests")
+            continue
+        cpu = report["cpu_per_route"].get(name, {}).get("cpu_ms_per_request")
+        lat = r["latency"]
+        print(f"  {name:<26} {r['rps']:>7} rps  p50={lat.get('p50_ms')}ms p95={lat.get('p95_ms')}ms "
+              f"p99={lat.get('p99_ms')}ms  err={r['error_rate']} 429={r['rate_limited_rate']} cpu={cpu}ms")
+    if "middleware_baseline" in report:
+        print("\n== middleware baseline (no-op route)")
+        for row in report["middleware_baseline"]:
+            print(f"  +{row['added'] or '(none)':<28} cpu={row['cpu_ms_per_request']}ms "
+                  f"({row.get('added_cpu_ms', 0):+}ms) p50={row['latency'].get('p50_ms')}ms {row['statuses']}")
+    print(f"\npeak RSS {report['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""Micro-benchmarks for hot-path helpers, with a stored baseline and regression gate.
+
+Covers the per-request / per-document functions that sit under every query,
+upload and middleware pass:
+
+  mask_pii                                   services/pii_masker.py
+  QueryCache.get / set / invalidate_customer services/query_cache.py
+  RateLimiterMiddleware._clean_old_entries   middleware/rate_limiter.py
+  extract_text                               services/doc_extractor.py
+  _extract_sources                           services/rag_engine.py
+  calculate_adoption_score                   routers/adoption_metrics.py
+  AuditLoggingMiddleware._get_client_ip      middleware/audit.py
+
+Each case is timed timeit-style: the loop count is calibrated so one repeat
+takes at least --min-time seconds, then timed --repeat times. Comparisons use
+the fastest repeat's per-call time, the figure least disturbed by other load
+on the machine; median and spread are reported alongside. Cases whose optional
+dependency is missing (python-docx, openpyxl) are skipped.
+
+Two guards keep shared or throttled machines from failing the gate on noise:
+ratios are normalised by a fixed pure-Python reference workload timed in the
+same run (so a uniformly slower CPU cancels out; --no-normalize disables it),
+and a case over the threshold is re-timed --confirm times, keeping its best,
+before it counts as a regression.
+
+  run      time every case and print the table (--save writes the baseline)
+  compare  time every case against the baseline; exits 1 when any case is
+           slower than baseline by more than --threshold (default 25%)
+
+The baseline (benchmark_micro_baseline.json) is machine-specific: re-record it
+with ``run --save`` on the machine that runs ``compare``.
+
+Usage:
+    python benchmark_micro.py run
+    python benchmark_micro.py run --save
+    python benchmark_micro.py compare --threshold 0.25
+    python benchmark_micro.py compare --filter query_cache --json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_micro_baseline.json")
+
+PROSE = (
+    "The MRO provider shall perform landing gear overhaul within 23 days of induction. "
+    "Borescope inspections follow the engine manufacturer's limits and are recorded per work order. "
+)
+PII = (
+    "Contact jane.doe@example.com or +1 (555) 123-4567 from 10.2.33.4; "
+    "SSN 123-45-6789, card 4111 1111 1111 1111, IBAN DE89370400440532013000. "
+)
+
+
+@dataclass
+class Case:
+    name: str
+    make: Callable[[str], Optional[Callable[[], Any]]]  # tmp dir -> zero-arg callable (None to skip)
+    note: str = ""
+
+
+# ──────────────────────────────────────────────────
+# Cases
+# ──────────────────────────────────────────────────
+def _mask_pii(text: str):
+    def make(tmp):
+        from services.pii_masker import mask_pii
+
+        return lambda: mask_pii(text)
+
+    return make
+
+
+def _query_cache(op: str):
+    def make(tmp):
+        from services.query_cache import QueryCache
+
+        cache = QueryCache(max_size=500, ttl_seconds=300)
+        answer = {"response": PROSE * 4, "sources": [{"source": "capabilities.pdf", "headers": ["", ""]}]}
+        for tenant in range(10):
+            for i in range(40):
+                cache.set(f"tenant-{tenant}", f"question {i}", answer, tags=(f"doc:{i % 5}",))
+        if op == "get.hit":
+            return lambda: cache.get("tenant-3", "question 7")
+        if op == "get.miss":
+            return lambda: cache.get("tenant-3", "never asked")
+        if op == "set":
+            counter = iter(range(sys.maxsize))
+            return lambda: cache.set("tenant-3", f"new question {next(counter) % 400}", answer, tags=("doc:1",))
+
+        def refill_and_invalidate():
+            for i in range(20):
+                cache.set("tenant-9", f"question {i}", answer)
+            cache.invalidate_customer("tenant-9")
+
+        return refill_and_invalidate
+
+    return make
+
+
+def _clean_old_entries(count: int):
+    def make(tmp):
+        from middleware.rate_limiter import RateLimiterMiddleware
+
+        limiter = RateLimiterMiddleware(app=None)
+        now = time.time()
+        # Half the timestamps fall outside the hour window
+        entries = [now - 7200 + i * (7200 / count) for i in range(count)]
+        return lambda: limiter._clean_old_entries(entries, 3600)
+
+    return make
+
+
+def _extract_text(ext: str, kb: int):
+    def make(tmp):
+        from services.doc_extractor import extract_text
+
+        path = os.path.join(tmp, f"sample-{kb}kb{ext}")
+        rows = max(1, kb * 1024 // len(PROSE))
+        if ext in (".txt", ".md"):
+            with open(path, "w") as f:
+                f.write("# Capabilities\n\n" + PROSE * rows)
+        elif ext == ".csv":
+            with open(path, "w") as f:
+                f.writelines(f"WO-{i},landing gear overhaul,N{i % 900 + 100}AV,{i % 30} days\n" for i in range(rows * 3))
+        elif ext == ".docx":
+            try:
+                from docx import Document
+            except ImportError:
+                return None
+            doc = Document()
+            for _ in range(rows):
+                doc.add_paragraph(PROSE)
+            doc.save(path)
+        elif ext == ".xlsx":
+            try:
+                from openpyxl import Workbook
+            except ImportError:
+                return None
+            wb = Workbook()
+            for i in range(rows * 3):
+                wb.active.append([f"WO-{i}", "landing gear overhaul", f"N{i % 900 + 100}AV", i % 30])
+            wb.save(path)
+        return lambda: extract_text(path)
+
+    return make
+
+
+def _extract_sources(nodes: int, sources: int):
+    def make(tmp):
+        from services.rag_engine import _extract_sources
+
+        docs = [
+            SimpleNamespace(node=SimpleNamespace(metadata={
+                "source": f"doc-{i % sources}.pdf", "Header 1": "Capabilities", "Header 2": f"Section {i}",
+            }), score=0.5)
+            for i in range(nodes)
+        ]
+        return lambda: _extract_sources(docs)
+
+    return make
+
+
+def _adoption_score(count: int):
+    def make(tmp):
+        from routers.adoption_metrics import calculate_adoption_score
+
+        types = ["daily_active_users", "feature_usage", "session_duration", "page_views", "custom"]
+        metrics = [{"metric_type": types[i % len(types)], "current_value": (i * 37) % 130} for i in range(count)]
+        return lambda: calculate_adoption_score(metrics)
+
+    return make
+
+
+def _client_ip(forwarded: str, trusted: str):
+    def make(tmp):
+        from starlette.requests import Request
+
+        from middleware.audit import AuditLoggingMiddleware
+
+        previous = os.environ.get("TRUSTED_PROXIES")
+        os.environ["TRUSTED_PROXIES"] = trusted
+        try:
+            audit = AuditLoggingMiddleware(app=None)
+        finally:
+            if previous is None:
+                os.environ.pop("TRUSTED_PROXIES", None)
+            else:
+                os.environ["TRUSTED_PROXIES"] = previous
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        request = Request({"type": "http", "headers": headers, "client": ("10.0.0.5", 443)})
+        return lambda: audit._get_client_ip(request)
+
+    return make
+
+
+CASES: List[Case] = [
+    Case("mask_pii.clean_2kb", _mask_pii(PROSE * 12), "no PII present"),
+    Case("mask_pii.dense_2kb", _mask_pii((PROSE + PII) * 6), "~40 redactions"),
+    Case("query_cache.get.hit", _query_cache("get.hit")),
+    Case("query_cache.get.miss", _query_cache("get.miss")),
+    Case("query_cache.set", _query_cache("set"), "LRU at capacity, with a tag"),
+    Case("query_cache.invalidate_customer", _query_cache("invalidate"), "20 set() + one invalidate_customer"),
+    Case("rate_limiter.clean_old_entries.30", _clean_old_entries(30)),
+    Case("rate_limiter.clean_old_entries.500", _clean_old_entries(500), "hour limit's worth of timestamps"),
+    Case("extract_text.txt_64kb", _extract_text(".txt", 64)),
+    Case("extract_text.md_4kb", _extract_text(".md", 4)),
+    Case("extract_text.csv_64kb", _extract_text(".csv", 64)),
+    Case("extract_text.docx_64kb", _extract_text(".docx", 64), "needs python-docx"),
+    Case("extract_text.xlsx_64kb", _extract_text(".xlsx", 64), "needs openpyxl"),
+    Case("extract_sources.10", _extract_sources(10, 4)),
+    Case("extract_sources.100", _extract_sources(100, 20)),
+    Case("adoption_score.5", _adoption_score(5)),
+    Case("adoption_score.200", _adoption_score(200)),
+    Case("client_ip.direct", _client_ip("", "127.0.0.1")),
+    Case("client_ip.untrusted_peer", _client_ip("203.0.113.9, 10.0.0.5", "127.0.0.1")),
+    Case("client_ip.proxy_chain", _client_ip("203.0.113.9, 10.1.2.3, 10.0.0.4", "10.0.0.0/8,172.16.0.0/12")),
+]
+
+
+# ──────────────────────────────────────────────────
+# Timing
+# ──────────────────────────────────────────────────
+def _time(fn: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    """Min/median per-call nanoseconds over ``repeat`` runs of a calibrated loop."""
+    fn()  # Warm up (imports, lazy caches)
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops * 1e9)
+    median = statistics.median(samples)
+    return {
+        "median_ns": round(median, 1),
+        "min_ns": round(min(samples), 1),
+        "spread": round((max(samples) - min(samples)) / median, 4) if median else 0.0,
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def _reference():
+    """Fixed interpreter-bound workload; its timing tracks the machine, not the code under test."""
+    table = {}
+    for i in range(500):
+        table[f"k{i}"] = i * i
+    return sorted(table.values(), reverse=True)[:10]
+
+
+def reference_ns(repeat: int, min_time: float) -> float:
+    return _time(_reference, repeat, min_time)["min_ns"]
+
+
+def run_cases(selected: Callable[[str], bool], repeat: int, min_time: float) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for case in CASES:
+            if not selected(case.name):
+                continue
+            fn = case.make(tmp)
+            if fn is None:
+                results[case.name] = {"skipped": case.note or "unavailable"}
+                continue
+            results[case.name] = _time(fn, repeat, min_time)
+    return results
+
+
+def _environment() -> Dict[str, str]:
+    return {"python": platform.python_version(), "machine": platform.machine(), "node": platform.node()}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float, scale: float = 1.0) -> List[Dict[str, Any]]:
+    """One row per case; ``regressed`` when slower than baseline by more than ``threshold``.
+
+    ``scale`` is how much slower the machine is now than when the baseline was
+    recorded (reference workload now / then); ratios are divided by it.
+    """
+    rows = []
+    for name, current in results.items():
+        base = baseline.get("results", {}).get(name)
+        row: Dict[str, Any] = {"case": name, "current_ns": current.get("min_ns")}
+        if "skipped" in current or not base or "min_ns" not in base:
+            row["status"] = "skipped" if "skipped" in current else "new"
+        else:
+            ratio = current["min_ns"] / base["min_ns"] / scale
+            row.update(baseline_ns=base["min_ns"], ratio=round(ratio, 3))
+            row["status"] = "regressed" if ratio > 1 + threshold else "improved" if ratio < 1 - threshold else "ok"
+        rows.append(row)
+    return rows
+
+
+def _format_ns(ns: Optional[float]) -> str:
+    if ns is None:
+        return "-"
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f}{unit}"
+    return f"{ns:.0f}ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "compare"])
+    parser.add_argument("--filter", default="", help="Only cases whose name contains this substring")
+    parser.add_argument("--repeat", type=int, default=7, help="Timed repeats per case")
+    parser.add_argument("--min-time", type=float, default=0.1, help="Minimum seconds per repeat")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON path")
+    parser.add_argument("--save", action="store_true", help="run: write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="compare: allowed slowdown (0.25 = +25%%)")
+    parser.add_argument("--confirm", type=int, default=2, help="compare: re-timings of a case before it counts as regressed")
+    parser.add_argument("--no-normalize", action="store_true", help="compare: raw ratios, no reference scaling")
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON only")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    # Redaction and cache log lines are not what is being measured
+    logging.disable(logging.CRITICAL)
+    reference = reference_ns(args.repeat, args.min_time)
+    results = run_cases(lambda name: args.filter in name, args.repeat, args.min_time)
+    # Bracket the cases so drift during the run shows up in the reference too
+    reference = min(reference, reference_ns(args.repeat, args.min_time))
+    report: Dict[str, Any] = {
+        "benchmark": "micro", "environment": _environment(), "reference_ns": reference, "results": results,
+    }
+
+    if args.command == "run" and args.save:
+        baseline = {"environment": report["environment"], "reference_ns": reference, "results": results}
+        if args.filter and os.path.exists(args.baseline):
+            # Filtered runs update their cases and keep the rest
+            with open(args.baseline) as f:
+                previous = json.load(f)
+            baseline["results"] = {**previous.get("results", {}), **results}
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    regressed = []
+    if args.command == "compare":
+        if not os.path.exists(args.baseline):
+            raise SystemExit(f"No baseline at {args.baseline}; record one with: python benchmark_micro.py run --save")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        scale = 1.0
+        if not args.no_normalize and baseline.get("reference_ns"):
+            scale = reference / baseline["reference_ns"]
+        report.update(threshold=args.threshold, scale=round(scale, 4), baseline_environment=baseline.get("environment", {}))
+        comparison = compare(results, baseline, args.threshold, scale)
+        for _ in range(args.confirm):
+            suspects = {row["case"] for row in comparison if row["status"] == "regressed"}
+            if not suspects:
+                break
+            for name, retimed in run_cases(suspects.__contains__, args.repeat, args.min_time).items():
+                if retimed["min_ns"] < results[name]["min_ns"]:
+                    results[name] = retimed
+            comparison = compare(results, baseline, args.threshold, scale)
+        report["comparison"] = comparison
+        regressed = [row["case"] for row in comparison if row["status"] == "regressed"]
+        report["regressed"] = regressed
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    elif args.command == "run":
+        print(f"{'case':<38} {'min':>10} {'median':>10} {'spread':>7} {'loops':>8}")
+        for name, r in results.items():
+            if "skipped" in r:
+                print(f"{name:<38} {'skipped':>10}  ({r['skipped']})")
+                continue
+            print(f"{name:<38} {_format_ns(r['min_ns']):>10} {_format_ns(r['median_ns']):>10} "
+                  f"{r['spread']:>7.1%} {r['loops']:>8}")
+        if args.save:
+            print(f"\nBaseline written to {args.baseline}")
+    else:
+        if report["baseline_environment"] != report["environment"]:
+            print(f"warning: baseline recorded on {report['baseline_environment']}, running on {report['environment']}")
+        print(f"machine speed vs baseline: {report['scale']:.2f}x (ratios below are divided by this)\n")
+        print(f"{'case':<38} {'baseline':>10} {'current':>10} {'ratio':>7}  status")
+        for row in report["comparison"]:
+            ratio = f"{row['ratio']:.2f}x" if "ratio" in row else "-"
+            print(f"{row['case']:<38} {_format_ns(row.get('baseline_ns')):>10} "
+                  f"{_format_ns(row['current_ns']):>10} {ratio:>7}  {row['status']}")
+        print(f"\n{len(regressed)} regression(s) beyond +{args.threshold:.0%}" + (f": {', '.join(regressed)}" if regressed else ""))
+
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
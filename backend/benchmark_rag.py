@@ -0,0 +1,358 @@
+"""End-to-end RAG query benchmark — latency percentiles, LLM calls and cache hit rates.
+
+For each corpus size a synthetic tenant is built (markdown sections grouped
+into documents, each section carrying a unique work-order id, aviation topics,
+a tail number and a turnaround), then a realistic query mix is replayed
+through POST /api/query behind the real JWT middleware:
+
+  novel       — first question about a work order
+  repeat      — an earlier question again, verbatim (popular ones more often)
+  paraphrase  — an earlier question reworded (term order, case, phrasing)
+
+Everything runs in-process on the simulated providers (deterministic LLM,
+embeddings and auth; see services/simulated_providers.py), with the engine's
+caches as configured by the environment. Per corpus size the report has
+p50/p95/p99 latency overall and per query kind, LLM calls per query, hit
+rates of every cache layer over the run (from /api/metrics/rag deltas) and
+the tenant's index and answer-cache memory. --json emits the report alone so
+runs can be diffed or stored.
+
+Usage:
+    python benchmark_rag.py --sizes 10 100 500 2000 --queries 200 --llm-ms 20
+    python benchmark_rag.py --profile '{"llm": {"median_ms": 400, "sigma": 0.35, "per_unit_ms": 12.5}}'
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import APIRouter, FastAPI
+from llama_index.core import Settings
+
+from middleware import auth
+from middleware.auth import JWTAuthMiddleware
+from routers.metrics import router as metrics_router
+from routers.query import router as query_router
+from services import rag_engine
+from services.embedding_cache import EmbeddingStore
+from services.index_store import IndexStore
+from services.llm_cache import LLMCache
+from services.simulated_providers import (
+    Latency,
+    SimulatedEmbedding,
+    SimulatedLLM,
+    SimulationProfile,
+    simulated_verify_token,
+)
+
+TOPICS = [
+    "landing gear overhaul", "engine borescope inspection", "avionics software load",
+    "cabin interior refurbishment", "fuel tank sealing", "hydraulic pump replacement",
+    "corrosion prevention program", "APU shop visit", "brake wear limits", "NDT eddy current",
+    "structural repair manual", "ETOPS maintenance", "tooling calibration", "spare parts pooling",
+]
+SECTIONS_PER_DOCUMENT = 20
+
+# Question templates per intent; paraphrases pick another template of the same intent
+TEMPLATES = {
+    "turnaround": [
+        "What is the turnaround for {wo}?",
+        "How many days does {wo} take?",
+        "turnaround for {wo} — what is it",
+        "{wo}: how long is the turnaround?",
+    ],
+    "tail": [
+        "Which tail is scheduled for {wo} {topic}?",
+        "What aircraft tail number is {wo} {topic} for?",
+        "{topic} under {wo}: which tail?",
+    ],
+    "topic": [
+        "Who handles {topic} with a short turnaround?",
+        "Which work orders cover {topic}?",
+        "{topic} — which work orders, shortest turnaround?",
+    ],
+}
+TOGGLES = {
+    "llm_cache": "LLM_CACHE_ENABLED",
+    "semantic_cache": "SEMANTIC_CACHE_ENABLED",
+    "retrieval_cache": "RETRIEVAL_CACHE_ENABLED",
+    "traversal_memo": "TRAVERSAL_MEMO_ENABLED",
+}
+
+
+class Section:
+    def __init__(self, text, source):
+        self.page_content = text
+        self.metadata = {"source": source}
+
+
+def _corpus(sections: int, rng: random.Random) -> Tuple[List[Section], List[Dict[str, Any]]]:
+    """Markdown documents of up to SECTIONS_PER_DOCUMENT sections, and the facts they hold."""
+    docs, facts = [], []
+    for start in range(0, sections, SECTIONS_PER_DOCUMENT):
+        source = f"capabilities-{start // SECTIONS_PER_DOCUMENT:03d}.pdf"
+        parts = []
+        for i in range(start, min(sections, start + SECTIONS_PER_DOCUMENT)):
+            wo = f"WO-{1000 + i}"
+            topics = rng.sample(TOPICS, 2)
+            tail, days = f"N{rng.randint(100, 999)}AV", rng.randint(2, 30)
+            parts.append(
+                f"## Work order {wo}\n{wo} covers {topics[0]} and {topics[1]} "
+                f"for tail {tail} with a {days} day turnaround.\n"
+            )
+            facts.append({"wo": wo, "topics": topics, "source": source})
+        docs.append(Section(f"# Capabilities {source}\n\n" + "\n".join(parts), source))
+    return docs, facts
+
+
+def _reword(question: str, rng: random.Random) -> str:
+    """Same terms, different surface: case and word order."""
+    words = question.rstrip("?").split()
+    if len(words) > 3 and rng.random() < 0.5:
+        cut = rng.randint(1, len(words) - 1)
+        words = words[cut:] + words[:cut]
+    text = " ".join(words)
+    return (text.lower() if rng.random() < 0.5 else text.upper()) + "?"
+
+
+def _queries(
+    facts: List[Dict[str, Any]], count: int, repeat: float, paraphrase: float, rng: random.Random
+) -> List[Tuple[str, str, Optional[str]]]:
+    """(query, kind, expected source) — repeats favour popular questions (Zipf-like)."""
+    asked: List[Tuple[str, int, Dict[str, Any], Optional[str]]] = []  # (intent, template, fact, source)
+    popularity: List[float] = []
+    out = []
+    for _ in range(count):
+        roll = rng.random()
+        if asked and roll < repeat:
+            i = rng.choices(range(len(asked)), weights=popularity)[0]
+            intent, template, fact, source = asked[i]
+            popularity[i] += 1
+            out.append((TEMPLATES[intent][template].format(wo=fact["wo"], topic=fact["topics"][0]), "repeat", source))
+            continue
+        if asked and roll < repeat + paraphrase:
+            intent, template, fact, source = asked[rng.choices(range(len(asked)), weights=popularity)[0]]
+            choices = [t for t in range(len(TEMPLATES[intent])) if t != template]
+            question = TEMPLATES[intent][rng.choice(choices)].format(wo=fact["wo"], topic=fact["topics"][0])
+            out.append((_reword(question, rng) if rng.random() < 0.5 else question, "paraphrase", source))
+            continue
+        fact = rng.choice(facts)
+        intent = rng.choice(list(TEMPLATES))
+        source = None if intent == "topic" else fact["source"]
+        asked.append((intent, 0, fact, source))
+        popularity.append(1.0)
+        out.append((TEMPLATES[intent][0].format(wo=fact["wo"], topic=fact["topics"][0]), "novel", source))
+    return out
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2)
+
+    return {"p50_ms": rank(0.50), "p95_ms": rank(0.95), "p99_ms": rank(0.99), "max_ms": round(ordered[-1], 2)}
+
+
+def _rate(hits: float, lookups: float) -> Optional[float]:
+    return round(hits / lookups, 4) if lookups else None
+
+
+def _cache_rates(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Hit rate of each cache layer over the run, from worker-wide counter deltas."""
+
+    def delta(*path: str) -> float:
+        a, b = after, before
+        for key in path:
+            a, b = (a or {}).get(key), (b or {}).get(key)
+        return (a or 0) - (b or 0)
+
+    answer_hits = delta("query_cache", "hits") + delta("query_cache", "stale_hits")
+    llm_endpoints = set(after["llm_cache"].get("endpoints", {}))
+    llm_hits = sum(delta("llm_cache", "endpoints", e, "hits") for e in llm_endpoints)
+    llm_misses = sum(delta("llm_cache", "endpoints", e, "misses") for e in llm_endpoints)
+    return {
+        "answer_cache": _rate(answer_hits, answer_hits + delta("query_cache", "misses")),
+        "semantic_cache": _rate(
+            delta("semantic_cache", "hits"), delta("semantic_cache", "hits") + delta("semantic_cache", "misses")
+        ),
+        "retrieval_cache": _rate(
+            delta("retrieval", "result_cache", "hits"),
+            delta("retrieval", "result_cache", "hits") + delta("retrieval", "result_cache", "misses"),
+        ),
+        "traversal_memo": _rate(delta("retrieval", "traversal_memo", "hits"), delta("retrieval", "traversal_memo", "lookups")),
+        "llm_cache": _rate(llm_hits, llm_hits + llm_misses),
+        "embedding_cache": _rate(
+            delta("embedding_cache", "hits"), delta("embedding_cache", "hits") + delta("embedding_cache", "misses")
+        ),
+        "coalesced_queries": int(delta("query_coalescing", "coalesced")),
+    }
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    api = APIRouter(prefix="/api")
+    api.include_router(query_router)
+    api.include_router(metrics_router)
+    app.include_router(api)
+    app.add_middleware(JWTAuthMiddleware)
+    return app
+
+
+async def _run_size(client: httpx.AsyncClient, size: int, args, rng: random.Random) -> Dict[str, Any]:
+    token = f"sim:bench-{size}"
+    customer_id = (await simulated_verify_token(token, SimulationProfile.instant()))["sub"]
+    headers = {"Authorization": f"Bearer {token}"}
+    docs, facts = _corpus(size, rng)
+    queries = _queries(facts, args.queries, args.repeat, args.paraphrase, rng)
+
+    llm_calls = Settings.llm.calls
+    start = time.perf_counter()
+    await rag_engine.aprocess_and_store_documents(docs, customer_id)
+    build_s = round(time.perf_counter() - start, 2)
+    build_calls = sum(llm_calls.values())
+
+    before = (await client.get("/api/metrics/rag", headers=headers)).json()
+    llm_calls.clear()
+    by_kind: Dict[str, List[float]] = defaultdict(list)
+    server_ms: List[float] = []
+    found = expected = errors = cached = 0
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def ask(query: str, kind: str, source: Optional[str]):
+        nonlocal found, expected, errors, cached
+        async with gate:
+            sent = time.perf_counter()
+            response = await client.post("/api/query/", json={"query": query, "retrieval_mode": args.mode}, headers=headers)
+            elapsed = (time.perf_counter() - sent) * 1000
+        if response.status_code != 200:
+            errors += 1
+            return
+        body = response.json()
+        by_kind[kind].append(elapsed)
+        server_ms.append(body["latency_ms"])
+        cached += body["cached"]
+        if source is not None:
+            expected += 1
+            found += any(s["source"] == source for s in body["sources"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(*q) for q in queries))
+    wall_s = time.perf_counter() - start
+    after = (await client.get("/api/metrics/rag", headers=headers)).json()
+
+    n = len(queries)
+    everything = [ms for values in by_kind.values() for ms in values]
+    tenant_index = after["index_memory"]["tenant_bytes"].get(customer_id, 0)
+    tenant_answers = after["query_cache"]["tenants"].get(customer_id, {})
+    return {
+        "sections": size,
+        "documents": len(docs),
+        "queries": n,
+        "mix": dict(Counter(kind for _, kind, _ in queries)),
+        "errors": errors,
+        "build_s": build_s,
+        "build_llm_calls": build_calls,
+        "throughput_qps": round(n / wall_s, 2) if wall_s else None,
+        "latency": _percentiles(everything),
+        "latency_by_kind": {kind: _percentiles(values) for kind, values in sorted(by_kind.items())},
+        "server_latency": _percentiles(server_ms),
+        "llm_calls_per_query": round(sum(llm_calls.values()) / n, 3),
+        "llm_calls_by_kind": dict(llm_calls),
+        "cached_responses": round(cached / n, 4),
+        "cache_hit_rates": _cache_rates(before, after),
+        "expected_source_recall": round(found / expected, 4) if expected else None,
+        "memory": {
+            "tenant_index_bytes": tenant_index,
+            "tenant_answer_cache_bytes": tenant_answers.get("bytes", 0),
+            "tenant_answer_cache_entries": tenant_answers.get("entries", 0),
+        },
+    }
+
+
+async def _main(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    profile = SimulationProfile.from_spec(args.profile) if args.profile else SimulationProfile.instant(
+        llm=Latency(median_ms=args.llm_ms, sigma=0.35, per_unit_ms=args.llm_token_ms),
+        embed=Latency(median_ms=args.embed_ms, sigma=0.25),
+    )
+    for name in args.disable:
+        setattr(rag_engine, TOGGLES[name], False)
+
+    with tempfile.TemporaryDirectory() as root:
+        # Fresh index and persistent caches: nothing carried over from earlier runs
+        rag_engine._index_store = IndexStore(root=os.path.join(root, "indexes"))
+        rag_engine._llm_cache = LLMCache(path=os.path.join(root, "llm.sqlite3"))
+        rag_engine._embedding_store = EmbeddingStore(path=os.path.join(root, "embeddings.sqlite3"))
+        Settings.llm = SimulatedLLM(profile=profile)
+        Settings.embed_model = rag_engine._cached_embed_model(SimulatedEmbedding(profile=profile))
+        Settings._avicon_configured = True
+        auth.SIMULATED_PROVIDERS = True
+
+        transport = httpx.ASGITransport(app=_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            results = [await _run_size(client, size, args, rng) for size in args.sizes]
+
+    return {
+        "benchmark": "rag_query",
+        "config": vars(args),
+        "profile": {"llm": vars(profile.llm), "embed": vars(profile.embed), "llm_error_rate": profile.llm_error_rate},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500, 2000], help="Sections per tenant")
+    parser.add_argument("--queries", type=int, default=200, help="Queries replayed per tenant")
+    parser.add_argument("--repeat", type=float, default=0.35, help="Share of verbatim repeats")
+    parser.add_argument("--paraphrase", type=float, default=0.25, help="Share of reworded earlier questions")
+    parser.add_argument("--concurrency", type=int, default=8, help="Queries in flight")
+    parser.add_argument("--mode", choices=rag_engine.RETRIEVAL_MODES, default=None,
+                        help="Retrieval mode (default: the server's RAG_RETRIEVAL_MODE)")
+    parser.add_argument("--llm-ms", type=float, default=20.0, help="Median time to first token")
+    parser.add_argument("--llm-token-ms", type=float, default=0.5, help="Time per further output token")
+    parser.add_argument("--embed-ms", type=float, default=5.0, help="Median time per embedding request")
+    parser.add_argument("--profile", default="", help="Full simulation profile (JSON or path); overrides --*-ms")
+    parser.add_argument("--disable", nargs="*", default=[], choices=sorted(TOGGLES), help="Cache layers to turn off")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON only")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(_main(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for r in report["results"]:
+        lat = r["latency"]
+        print(f"\n== {r['sections']} sections ({r['documents']} docs): built in {r['build_s']}s, "
+              f"{r['queries']} queries {r['mix']}, errors={r['errors']}")
+        print(f"  latency p50={lat.get('p50_ms')}ms p95={lat.get('p95_ms')}ms p99={lat.get('p99_ms')}ms "
+              f"throughput={r['throughput_qps']} q/s")
+        for kind, pct in r["latency_by_kind"].items():
+            print(f"    {kind:<10} p50={pct['p50_ms']}ms p95={pct['p95_ms']}ms p99={pct['p99_ms']}ms")
+        print(f"  LLM calls/query={r['llm_calls_per_query']} {r['llm_calls_by_kind']} "
+              f"recall={r['expected_source_recall']}")
+        print(f"  hit rates={r['cache_hit_rates']}")
+        print(f"  memory={r['memory']}")
+    print(f"\npeak RSS {report['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
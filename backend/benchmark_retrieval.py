@@ -0,0 +1,165 @@
+"""Retrieval-mode harness — LLM calls per query for each retrieval mode.
+
+Ingests a synthetic tenant (one source document per section, each carrying a
+unique work-order id and a few aviation topics) through the real ingestion
+path, then replays the same query set in every retrieval mode:
+
+  tree     — LLM-guided select_leaf traversal
+  hybrid   — BM25 answers confident keyword queries from the top-k leaves and
+             prunes the traversal to the subtrees holding hits otherwise
+  lexical  — always answer from the BM25 top-k leaves
+  vector   — answer from the cosine top-k leaf embeddings
+
+The LLM and embedding model are the deterministic simulated providers with a
+fixed per-call delay, so the report isolates how many calls each mode makes
+(selection vs. synthesis), latency and whether the expected source was
+retrieved.
+
+Usage:
+    python benchmark_retrieval.py --sections 300 --queries 60 --llm-ms 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from collections import Counter
+
+from llama_index.core import Settings
+
+from services import rag_engine
+from services.index_store import IndexStore
+from services.simulated_providers import (
+    Latency,
+    SimulatedEmbedding,
+    SimulatedLLM,
+    SimulationProfile,
+)
+
+TOPICS = [
+    "landing gear overhaul", "engine borescope inspection", "avionics software load",
+    "cabin interior refurbishment", "fuel tank sealing", "hydraulic pump replacement",
+    "corrosion prevention program", "APU shop visit", "brake wear limits", "NDT eddy current",
+    "structural repair manual", "ETOPS maintenance", "tooling calibration", "spare parts pooling",
+]
+
+class Section:
+    def __init__(self, text, source):
+        self.page_content = text
+        self.metadata = {"source": source}
+
+
+def _corpus(sections: int, rng: random.Random):
+    docs, facts = [], []
+    for i in range(sections):
+        wo = f"WO-{1000 + i}"
+        topics = rng.sample(TOPICS, 2)
+        source = f"section-{i:04d}.pdf"
+        docs.append(Section(
+            f"# Work order {wo}\n{wo} covers {topics[0]} and {topics[1]} "
+            f"for tail N{rng.randint(100, 999)}AV with a {rng.randint(2, 30)} day turnaround.",
+            source,
+        ))
+        facts.append((wo, topics, source))
+    return docs, facts
+
+
+def _queries(facts, count: int, rng: random.Random):
+    queries = []
+    for i in range(count):
+        wo, topics, source = rng.choice(facts)
+        if i % 3 == 0:
+            queries.append((f"What is the turnaround for {wo}?", source, "identifier"))
+        elif i % 3 == 1:
+            queries.append((f"Which tail is scheduled for {wo} {topics[0]}?", source, "identifier+topic"))
+        else:
+            queries.append((f"Who handles {topics[0]} with a short turnaround?", None, "topic"))
+    return queries
+
+
+async def _run_mode(mode: str, customer_id: str, queries) -> dict:
+    calls = Settings.llm.calls
+    calls.clear()
+    found = expected = 0
+    routes: Counter = Counter()
+    latencies = []
+    for query, source, _ in queries:
+        result = await rag_engine.get_customer_response(customer_id, query, use_cache=False, retrieval_mode=mode)
+        latencies.append(result["latency_ms"])
+        routes[result["retrieval"]["route"]] += 1
+        if source is not None:
+            expected += 1
+            found += any(s["source"] == source for s in result["sources"])
+
+    n = len(queries)
+    latencies.sort()
+    return {
+        "mode": mode,
+        "queries": n,
+        "llm_calls_per_query": round(sum(calls.values()) / n, 2),
+        "selection_calls_per_query": round(calls["select"] / n, 2),
+        "synthesis_calls_per_query": round((calls["summarize"] + calls["answer"]) / n, 2),
+        "routes": dict(routes),
+        "expected_source_recall": round(found / expected, 4) if expected else None,
+        "latency_p50_ms": latencies[n // 2],
+        "latency_p95_ms": latencies[min(n - 1, int(n * 0.95))],
+    }
+
+
+async def _main(args) -> dict:
+    rng = random.Random(args.seed)
+    docs, facts = _corpus(args.sections, rng)
+    queries = _queries(facts, args.queries, rng)
+
+    profile = SimulationProfile.instant()
+    Settings.llm = SimulatedLLM(profile=profile)
+    Settings.embed_model = SimulatedEmbedding(profile=profile)
+    Settings._avicon_configured = True
+    # Count every LLM call: completions cached by earlier runs would hide them
+    rag_engine.LLM_CACHE_ENABLED = False
+
+    with tempfile.TemporaryDirectory() as root:
+        rag_engine._index_store = IndexStore(root=root)
+        start = time.perf_counter()
+        await rag_engine.aprocess_and_store_documents(docs, "bench-tenant")
+        build_s = round(time.perf_counter() - start, 2)
+
+        profile.llm = Latency(median_ms=args.llm_ms)
+        results = [await _run_mode(mode, "bench-tenant", queries) for mode in args.modes]
+
+    tree = next((r for r in results if r["mode"] == "tree"), None)
+    for result in results:
+        if tree is not None:
+            result["llm_calls_saved_per_query"] = round(tree["llm_calls_per_query"] - result["llm_calls_per_query"], 2)
+    return {"config": vars(args), "build_s": build_s, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=60)
+    parser.add_argument("--llm-ms", type=float, default=20.0, help="Simulated latency per LLM call")
+    parser.add_argument("--modes", nargs="+", default=list(rag_engine.RETRIEVAL_MODES),
+                        choices=rag_engine.RETRIEVAL_MODES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON only")
+    args = parser.parse_args()
+
+    report = asyncio.run(_main(args))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Built {args.sections}-section tree in {report['build_s']}s")
+    for r in report["results"]:
+        print(f"\n== {r['mode']}: {r['llm_calls_per_query']} LLM calls/query "
+              f"(select {r['selection_calls_per_query']}, synth {r['synthesis_calls_per_query']}), "
+              f"saved vs tree {r.get('llm_calls_saved_per_query', 'n/a')}")
+        print(f"  routes={r['routes']} recall={r['expected_source_recall']} "
+              f"p50={r['latency_p50_ms']}ms p95={r['latency_p95_ms']}ms")
+
+
+if __name__ == "__main__":
+    main()
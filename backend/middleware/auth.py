@@ -17,6 +17,10 @@ logger = logging.getLogger("avicon.auth")
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "")
 SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY", "")
+# Accept offline "sim:<user>[:<role>]" tokens instead of calling Supabase.
+# Deliberately not read from the environment: only the test and benchmark
+# harnesses switch it on, in-process.
+SIMULATED_PROVIDERS = False
 
 _http_client: Optional[httpx.AsyncClient] = None
 
@@ -37,6 +41,12 @@ async def verify_supabase_token(token: str) -> Optional[dict]:
     This is the most secure approach — it validates the token against
     Supabase's auth server directly, ensuring revoked tokens are rejected.
     """
+    if SIMULATED_PROVIDERS:
+        # NOTE: lazy import — keeps llama_index out of the auth path
+        from services.simulated_providers import simulated_verify_token
+
+        return await simulated_verify_token(token)
+
     try:
         client = get_http_client()
         response = await client.get(
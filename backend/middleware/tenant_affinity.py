@@ -0,0 +1,123 @@
+"""Tenant-affinity middleware — optional owner-node routing for RAG requests.
+
+When TENANT_AFFINITY_PEERS lists the base URLs of every backend node and
+TENANT_AFFINITY_SELF names this one, RAG requests for a customer are proxied
+to the node that owns that customer (rendezvous hashing), so each node only
+holds the tree indexes of its own tenants. Disabled when the peer list is empty.
+"""
+import logging
+import os
+from typing import Optional
+
+import httpx
+from fastapi import Request
+from starlette.background import BackgroundTask
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+
+from services.tenant_affinity import RendezvousRouter, router_from_env
+
+logger = logging.getLogger("avicon.affinity")
+
+# Only endpoints backed by per-tenant in-memory RAG state are routed
+AFFINITY_PATHS = (
+    "/api/query",
+    "/api/documents",
+)
+
+FORWARDED_HEADER = "X-Avicon-Affinity-Hop"
+
+# Hop-by-hop headers must not be forwarded by a proxy (RFC 7230 §6.1)
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+}
+
+
+class TenantAffinityMiddleware(BaseHTTPMiddleware):
+    """Proxies tenant-scoped RAG requests to the customer's owner node.
+
+    Must run inside JWT auth so request.state.customer_id is populated.
+    Requests that were already forwarded once are always served locally, and
+    an unreachable owner falls back to local handling rather than failing.
+    The body is buffered (RequestValidatorMiddleware caps its size) so that
+    fallback can replay it. Only connect failures fall back: once the request
+    may have reached the owner it may have acted on it, so any later upstream
+    error is reported as a 502 rather than processed a second time locally.
+    """
+
+    def __init__(
+        self,
+        app,
+        router: Optional[RendezvousRouter] = None,
+        self_node: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        super().__init__(app)
+        self.router = router if router is not None else router_from_env()
+        self.self_node = (self_node or os.environ.get("TENANT_AFFINITY_SELF", "")).rstrip("/")
+        self._client = client
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+                timeout=httpx.Timeout(120.0, connect=2.0),
+            )
+        return self._client
+
+    def _owner_for(self, request: Request) -> Optional[str]:
+        if self.router is None or not self.self_node:
+            return None
+        if not request.url.path.startswith(AFFINITY_PATHS):
+            return None
+        if request.headers.get(FORWARDED_HEADER):
+            return None
+        customer_id = getattr(request.state, "customer_id", None)
+        if not customer_id:
+            return None
+        owner = self.router.owner(customer_id)
+        return None if owner == self.self_node else owner
+
+    async def dispatch(self, request: Request, call_next):
+        owner = self._owner_for(request)
+        if owner is None:
+            return await call_next(request)
+
+        headers = {
+            k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS
+        }
+        headers[FORWARDED_HEADER] = self.self_node
+        client = self._get_client()
+        body = await request.body()
+        upstream_request = client.build_request(
+            request.method,
+            f"{owner}{request.url.path}",
+            params=request.query_params,
+            headers=headers,
+            content=body,
+        )
+        try:
+            upstream = await client.send(upstream_request, stream=True)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            logger.warning(f"AFFINITY_FALLBACK | owner={owner} | path={request.url.path} | error={e}")
+            return await call_next(request)
+        except httpx.HTTPError as e:
+            logger.error(f"AFFINITY_UPSTREAM_ERROR | owner={owner} | path={request.url.path} | error={type(e).__name__}")
+            return JSONResponse(
+                status_code=502,
+                content={"detail": "Owner node failed to handle the request"},
+            )
+
+        logger.info(f"AFFINITY_FORWARD | owner={owner} | path={request.url.path} | status={upstream.status_code}")
+        # Body is relayed decoded, so the upstream content-encoding no longer applies
+        response_headers = {
+            k: v for k, v in upstream.headers.items()
+            if k.lower() not in HOP_BY_HOP_HEADERS and k.lower() != "content-encoding"
+        }
+        return StreamingResponse(
+            upstream.aiter_bytes(),
+            status_code=upstream.status_code,
+            headers=response_headers,
+            background=BackgroundTask(upstream.aclose),
+        )
@@ -1,7 +1,7 @@
 """Pydantic V2 models for the Avicon Enterprise API."""
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -29,6 +29,9 @@ class AuthenticatedUser(BaseModel):
 class QueryRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=2000, description="The natural-language question")
     namespace_override: Optional[str] = Field(None, description="Admin-only namespace override")
+    retrieval_mode: Optional[Literal["tree", "hybrid", "lexical", "vector"]] = Field(
+        None, description="Leaf retrieval strategy; defaults to the server's RAG_RETRIEVAL_MODE"
+    )
 
     @field_validator("query")
     @classmethod
@@ -46,6 +49,17 @@ class QueryResponse(BaseModel):
     cached: bool = False
 
 
+class RAGMetricsResponse(BaseModel):
+    index_memory: Dict[str, Any] = Field(default_factory=dict)
+    query_coalescing: Dict[str, int] = Field(default_factory=dict)
+    tree_build: Dict[str, Any] = Field(default_factory=dict)
+    retrieval: Dict[str, Any] = Field(default_factory=dict)
+    query_cache: Dict[str, Any] = Field(default_factory=dict)
+    llm_cache: Dict[str, Any] = Field(default_factory=dict)
+    embedding_cache: Dict[str, Any] = Field(default_factory=dict)
+    semantic_cache: Dict[str, Any] = Field(default_factory=dict)
+
+
 # ──────────────────────────────────────────────
 # Document Upload
 # ──────────────────────────────────────────────
@@ -57,6 +71,27 @@ class UploadResponse(BaseModel):
     message: str
 
 
+class IngestionStageStatus(BaseModel):
+    status: str = "pending"  # pending | running | done | failed
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[float] = None
+
+
+class IngestionJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued | running | succeeded | failed
+    filename: str
+    customer_id: str
+    stage: Optional[str] = None
+    stages: Dict[str, IngestionStageStatus] = Field(default_factory=dict)
+    chunks_created: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+
 # ──────────────────────────────────────────────
 # Audit Log
 # ──────────────────────────────────────────────
@@ -157,6 +192,7 @@ class ContextualChatRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=2000)
     document_ids: List[str] = Field(default_factory=list, description="KB document IDs to use as context")
     session_id: Optional[str] = None
+    use_cache: bool = Field(True, description="Set false to bypass the LLM completion cache")
 
     @field_validator("query")
     @classmethod
@@ -179,6 +215,7 @@ class RFPDraftRequest(BaseModel):
     rfp_context: str = Field(..., min_length=1, max_length=10000, description="The RFP question/section")
     document_ids: List[str] = Field(default_factory=list, description="KB documents for context")
     template_id: Optional[str] = None
+    use_cache: bool = Field(True, description="Set false to bypass the LLM completion cache")
 
     @field_validator("rfp_context")
     @classmethod
@@ -1,10 +1,11 @@
 """Document upload and management endpoints.
 
 All uploads are authenticated and scoped to the customer's namespace.
+Uploads are spooled to disk and processed by the background ingestion
+queue; clients poll the job status endpoint for progress.
 """
 
 import logging
-import asyncio
 import re
 import uuid
 from pathlib import Path
@@ -13,9 +14,7 @@ import aiofiles
 
 from fastapi import APIRouter, File, HTTPException, Request, UploadFile
 
-from models.schemas import UploadResponse
-from services.document_parser import parse_document
-from services.rag_engine import process_and_store_documents
+from models.schemas import IngestionJobResponse
 
 logger = logging.getLogger("avicon.documents")
 
@@ -28,13 +27,19 @@ ALLOWED_EXTENSIONS = {".pdf", ".docx", ".xlsx", ".pptx", ".csv", ".txt", ".md"}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
 
-@router.post("/upload", response_model=UploadResponse)
+def _get_ingestion(request: Request):
+    return getattr(request.app.state, "ingestion", None)
+
+
+@router.post("/upload", response_model=IngestionJobResponse, status_code=202)
 async def upload_document(
     request: Request,
     file: UploadFile = File(...),
 ):
-    """Upload and process a document into the customer's RAG namespace.
+    """Spool a document and queue it for processing into the customer's RAG namespace.
 
+    Returns 202 with the ingestion job as soon as the file is on disk;
+    parsing, PII masking and indexing run in the background.
     Authentication is handled by JWT middleware — customer_id comes from the token.
     """
     # Get authenticated customer_id from middleware
@@ -42,6 +47,10 @@ async def upload_document(
     if not customer_id:
         raise HTTPException(status_code=401, detail="Authentication required")
 
+    ingestion = _get_ingestion(request)
+    if ingestion is None:
+        raise HTTPException(status_code=503, detail="Ingestion queue unavailable")
+
     # Validate file extension
     filename = file.filename or "unknown"
     ext = Path(filename).suffix.lower()
@@ -59,6 +68,7 @@ async def upload_document(
     safe_filename = f"{uuid.uuid4().hex}_{safe_stem}{ext}"
     temp_path = TEMP_DIR / safe_filename
 
+    queued = False
     try:
         # Stream file to disk to prevent memory exhaustion (DoS)
         size = 0
@@ -71,35 +81,17 @@ async def upload_document(
                     break
                 size += len(chunk)
                 if size > MAX_FILE_SIZE:
-<<<<<<< fix/optimize-document-upload-5614807190897417828
-                    raise HTTPException(
-                        status_code=400, detail="File size exceeds 50MB limit"
-                    )
-                buffer.write(chunk)
-=======
                     raise HTTPException(status_code=400, detail="File size exceeds 50MB limit")
                 await buffer.write(chunk)
->>>>>>> main
 
-        # Parse document
-        docs = await parse_document(str(temp_path), customer_id)
-
-        # Chunk and embed to Pinecone
-        loop = asyncio.get_running_loop()
-        num_chunks = await loop.run_in_executor(
-            None, process_and_store_documents, docs, customer_id
-        )
+        # Hand the spooled file to the ingestion queue, which now owns it
+        job = await ingestion.submit(customer_id, filename, str(temp_path))
+        queued = True
 
         logger.info(
-            f"UPLOAD_SUCCESS | customer={customer_id} | file={filename} | chunks={num_chunks}"
-        )
-
-        return UploadResponse(
-            filename=filename,
-            customer_id=customer_id,
-            chunks_created=num_chunks,
-            message=f"Successfully processed and embedded {num_chunks} chunks",
+            f"UPLOAD_ACCEPTED | customer={customer_id} | file={filename} | job={job['job_id']} | size={size}"
         )
+        return IngestionJobResponse(**job)
 
     except HTTPException:
         # Re-raise HTTP exceptions (like our 400) directly
@@ -111,5 +103,22 @@ async def upload_document(
         )
         raise HTTPException(status_code=500, detail="Failed to process document")
     finally:
-        if temp_path.exists():
+        if not queued and temp_path.exists():
             temp_path.unlink()
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(request: Request, job_id: str):
+    """Status of an upload's ingestion job, with per-stage progress and timings."""
+    customer_id = getattr(request.state, "customer_id", None)
+    if not customer_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    ingestion = _get_ingestion(request)
+    if ingestion is None:
+        raise HTTPException(status_code=503, detail="Ingestion queue unavailable")
+
+    job = await ingestion.get(job_id, customer_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return IngestionJobResponse(**job)
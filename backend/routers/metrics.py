@@ -0,0 +1,43 @@
+"""RAG engine metrics — memory and cache accounting for capacity planning.
+
+Scoped to the authenticated tenant: aggregate counters are worker-wide,
+per-tenant figures only ever cover the caller's own customer_id.
+"""
+import logging
+
+from fastapi import APIRouter, HTTPException, Request
+
+from models.schemas import RAGMetricsResponse
+from services.rag_engine import (
+    get_embedding_cache_metrics,
+    get_index_memory_metrics,
+    get_llm_cache_metrics,
+    get_query_cache_metrics,
+    get_query_coalescing_metrics,
+    get_retrieval_metrics,
+    get_semantic_cache_metrics,
+    get_tree_build_metrics,
+)
+
+logger = logging.getLogger("avicon.metrics")
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/rag", response_model=RAGMetricsResponse)
+async def get_rag_metrics(request: Request):
+    """Index memory, coalescing, retrieval, cache and last-build accounting of this worker, for the caller's tenant."""
+    customer_id = getattr(request.state, "customer_id", None)
+    if not customer_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    return RAGMetricsResponse(
+        index_memory=get_index_memory_metrics(customer_id),
+        query_coalescing=get_query_coalescing_metrics(),
+        tree_build=get_tree_build_metrics(customer_id),
+        retrieval=get_retrieval_metrics(),
+        query_cache=get_query_cache_metrics(customer_id),
+        llm_cache=get_llm_cache_metrics(),
+        embedding_cache=get_embedding_cache_metrics(),
+        semantic_cache=get_semantic_cache_metrics(),
+    )
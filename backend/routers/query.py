@@ -3,12 +3,14 @@
 All queries are authenticated and strictly scoped to the customer's Pinecone namespace.
 Phase 2: Full async support with optimistic response patterns.
 """
+import json
 import logging
 
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 
 from models.schemas import QueryRequest, QueryResponse
-from services.rag_engine import get_customer_response
+from services.rag_engine import get_customer_response, stream_customer_response
 
 logger = logging.getLogger("avicon.query")
 
@@ -31,6 +33,7 @@ async def query_knowledge_base(request: Request, body: QueryRequest):
         result = await get_customer_response(
             customer_id=customer_id,
             query=body.query,
+            retrieval_mode=body.retrieval_mode,
         )
 
         return QueryResponse(
@@ -45,3 +48,36 @@ async def query_knowledge_base(request: Request, body: QueryRequest):
     except Exception as e:
         logger.error(f"QUERY_ERROR | customer={customer_id} | error={e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to process query")
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/stream")
+async def stream_knowledge_base_query(request: Request, body: QueryRequest):
+    """Query the customer's RAG knowledge base as a server-sent event stream.
+
+    Emits `progress` events during tree traversal (level, branches chosen),
+    one `sources` event, `token` events as the answer is generated, then
+    `done` — or `error` if the query fails part-way through.
+    """
+    customer_id = getattr(request.state, "customer_id", None)
+    if not customer_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    async def event_stream():
+        try:
+            async for event in stream_customer_response(
+                customer_id=customer_id, query=body.query, retrieval_mode=body.retrieval_mode,
+            ):
+                yield _sse(event["event"], event["data"])
+        except Exception as e:
+            logger.error(f"QUERY_STREAM_ERROR | customer={customer_id} | error={e}", exc_info=True)
+            yield _sse("error", {"detail": "Failed to process query"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -16,6 +16,7 @@ from models.schemas import (
     ContextualChatRequest, ContextualChatResponse,
 )
 from services.pii_masker import mask_pii
+from services.llm_cache import llm_cache_disabled, llm_endpoint
 from services.doc_extractor import extract_text
 
 logger = logging.getLogger("avicon.rfp_response")
@@ -179,7 +180,9 @@ async def generate_draft(request: Request, body: RFPDraftRequest):
     try:
         from services.rag_engine import _get_llm
         llm = _get_llm()
-        result = await llm.acomplete(full_prompt)
+        # Works whether or not _get_llm() put the completion cache in front
+        with llm_endpoint("rfp_draft"), llm_cache_disabled(not body.use_cache):
+            result = await llm.acomplete(full_prompt)
         draft_text = result.text
     except Exception as e:
         logger.error(f"RFP_DRAFT_ERROR | user={user_id} | error={e}")
@@ -227,7 +230,8 @@ async def contextual_chat(request: Request, body: ContextualChatRequest):
     try:
         from services.rag_engine import _get_llm
         llm = _get_llm()
-        result = await llm.acomplete(prompt)
+        with llm_endpoint("kb_chat"), llm_cache_disabled(not body.use_cache):
+            result = await llm.acomplete(prompt)
         response_text = result.text
     except Exception as e:
         logger.error(f"KB_CHAT_ERROR | user={user_id} | error={e}")
@@ -2,6 +2,7 @@
 
 Architecture:
   Request → CORS → Rate Limiter → JWT Auth → Audit Logger → Router
+  (optionally Tenant Affinity after JWT Auth, proxying RAG calls to the owner node)
 
 Multi-tenancy enforced at every layer:
   - JWT middleware extracts customer_id from Supabase token
@@ -11,9 +12,9 @@ Multi-tenancy enforced at every layer:
 
 import logging
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import List
-from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 
@@ -21,18 +22,23 @@ from dotenv import load_dotenv
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / ".env")
 
-from fastapi import APIRouter, FastAPI
-from motor.motor_asyncio import AsyncIOMotorClient
-from starlette.middleware.cors import CORSMiddleware
-
-from middleware.audit import AuditLoggingMiddleware
-from middleware.auth import JWTAuthMiddleware
-from middleware.rate_limiter import RateLimiterMiddleware
-from middleware.request_validator import RequestValidationMiddleware
-from models.schemas import StatusCheck, StatusCheckCreate
-from routers.documents import router as documents_router
-from routers.health import router as health_router
-from routers.query import router as query_router
+from fastapi import APIRouter, FastAPI  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from starlette.middleware.cors import CORSMiddleware  # noqa: E402
+
+from middleware import auth  # noqa: E402
+from middleware.audit import AuditLoggingMiddleware  # noqa: E402
+from middleware.auth import JWTAuthMiddleware  # noqa: E402
+from middleware.rate_limiter import RateLimiterMiddleware  # noqa: E402
+from middleware.request_validator import RequestValidationMiddleware  # noqa: E402
+from middleware.tenant_affinity import TenantAffinityMiddleware  # noqa: E402
+from models.schemas import StatusCheck, StatusCheckCreate  # noqa: E402
+from routers.documents import router as documents_router  # noqa: E402
+from routers.health import router as health_router  # noqa: E402
+from routers.metrics import router as metrics_router  # noqa: E402
+from routers.query import router as query_router  # noqa: E402
+from services import simulated_providers  # noqa: E402
+from services.ingestion import IngestionQueue  # noqa: E402
 
 # Configure structured logging
 logging.basicConfig(
@@ -56,15 +62,28 @@ db = client[db_name]
 async def lifespan(app: FastAPI):
     # Expose db on app state for routers
     app.state.db = db
+    # Background document ingestion; resumes orphaned jobs and retries an
+    # unreachable Mongo in the background instead of blocking boot
+    app.state.ingestion = IngestionQueue(db)
+    await app.state.ingestion.start()
     logger.info("Avicon Enterprise API starting up...")
     logger.info(f"MongoDB: connected to {db_name}")
     logger.info(f"Pinecone Index: {os.environ.get('PINECONE_INDEX_NAME', 'not set')}")
     logger.info(f"Azure OpenAI: {os.environ.get('AZURE_OPENAI_ENDPOINT', 'not set')}")
     logger.info(f"Supabase: {os.environ.get('SUPABASE_URL', 'not set')}")
+    # Importing simulated_providers already refused SIMULATED_PROVIDERS=1 outside dev/test
+    if simulated_providers.SIMULATED_PROVIDERS:
+        logger.warning(
+            f"SIMULATED_PROVIDERS ACTIVE | env={os.environ.get('AVICON_ENV')} | "
+            "LLM, embeddings and document parsing are offline stand-ins — NOT FOR PRODUCTION"
+        )
+    if auth.SIMULATED_PROVIDERS:
+        logger.warning("SIMULATED_AUTH ACTIVE | sim: bearer tokens are accepted without Supabase — NOT FOR PRODUCTION")
 
     yield
 
     logger.info("Avicon Enterprise API shutting down...")
+    await app.state.ingestion.stop()
     client.close()
 
 
@@ -108,10 +127,13 @@ app.add_middleware(
 # 3. Request Validation
 app.add_middleware(RequestValidationMiddleware)
 
-# 4. JWT Authentication
+# 4. Tenant affinity (optional) — runs inside JWT auth so customer_id is known
+app.add_middleware(TenantAffinityMiddleware)
+
+# 5. JWT Authentication
 app.add_middleware(JWTAuthMiddleware)
 
-# 5. Audit Logging
+# 6. Audit Logging
 app.add_middleware(AuditLoggingMiddleware, db=db)
 
 # ─────────────────────────────────────────
@@ -120,17 +142,18 @@ app.add_middleware(AuditLoggingMiddleware, db=db)
 api_router = APIRouter(prefix="/api")
 
 # Import and include routers
-from routers.knowledge_base import router as kb_router
-from routers.rfp_response import router as rfp_response_router
-from routers.stats import router as stats_router
-from routers.drafts import router as drafts_router
-from routers.integrations import router as integrations_router
-from routers.team_templates import router as team_templates_router
-from routers.adoption_metrics import router as adoption_router
+from routers.adoption_metrics import router as adoption_router  # noqa: E402
+from routers.drafts import router as drafts_router  # noqa: E402
+from routers.integrations import router as integrations_router  # noqa: E402
+from routers.knowledge_base import router as kb_router  # noqa: E402
+from routers.rfp_response import router as rfp_response_router  # noqa: E402
+from routers.stats import router as stats_router  # noqa: E402
+from routers.team_templates import router as team_templates_router  # noqa: E402
 
 api_router.include_router(health_router)
 api_router.include_router(query_router)
 api_router.include_router(documents_router)
+api_router.include_router(metrics_router)
 api_router.include_router(kb_router)
 api_router.include_router(rfp_response_router)
 api_router.include_router(stats_router)
@@ -0,0 +1,146 @@
+"""In-process BM25 inverted index over a tenant's tree leaves.
+
+Built at index time and persisted next to the TreeIndex snapshot, so keyword
+lookups (part numbers, certifications, "EASA Part-145") can be answered from
+the best-matching leaves, or used to prune the LLM-guided tree traversal to
+the subtrees that actually contain the query terms.
+"""
+import json
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Tuple
+
+BM25_ARTIFACT = "bm25.json"
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Keep compound identifiers ("part-145", "a320-200", "do-178c") as one token
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[-./]")
+
+STOPWORDS = frozenset(
+    "a an and any are as at be by can do does for from has have how i if in is it its "
+    "me of on or our please should that the their them there these they this to us was "
+    "we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound identifiers also yield their parts."""
+    tokens = []
+    for term in _TOKEN_RE.findall(text.lower()):
+        if term in STOPWORDS:
+            continue
+        tokens.append(term)
+        if _SPLIT_RE.search(term):
+            tokens.extend(p for p in _SPLIT_RE.split(term) if p and p not in STOPWORDS)
+    return tokens
+
+
+@dataclass
+class LexicalMatch:
+    """Top-k BM25 hits for a query, with how well the best hit covers it."""
+    hits: List[Tuple[str, float]] = field(default_factory=list)
+    coverage: float = 0.0  # idf-weighted share of query terms in the top hit
+    full_matches: int = 0  # leaves covering the query at least as well as the threshold
+
+    def is_confident(self, threshold: float, top_k: int) -> bool:
+        """The query terms are present and pin down no more than top_k leaves."""
+        return bool(self.hits) and self.coverage >= threshold and self.full_matches <= top_k
+
+
+class BM25Index:
+    """Okapi BM25 over (node_id, text) documents."""
+
+    def __init__(
+        self,
+        doc_ids: List[str],
+        doc_lens: List[int],
+        postings: Dict[str, Dict[int, int]],
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+    ):
+        self.doc_ids = doc_ids
+        self.doc_lens = doc_lens
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self._avgdl = (sum(doc_lens) / len(doc_lens)) if doc_lens else 0.0
+        n = len(doc_ids)
+        self._idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+        # Terms absent from the corpus weigh as much as the rarest possible term
+        self._unseen_idf = math.log(1 + (n + 0.5) / 0.5)
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, str]]) -> "BM25Index":
+        doc_ids: List[str] = []
+        doc_lens: List[int] = []
+        postings: Dict[str, Dict[int, int]] = {}
+        for doc_idx, (doc_id, text) in enumerate(documents):
+            terms = tokenize(text)
+            doc_ids.append(doc_id)
+            doc_lens.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings.setdefault(term, {})[doc_idx] = tf
+        return cls(doc_ids, doc_lens, postings)
+
+    @classmethod
+    def from_index(cls, index: Any) -> "BM25Index":
+        """Index every leaf of a TreeIndex (internal summary nodes are skipped)."""
+        graph = index.index_struct
+        leaf_ids = [
+            node_id for node_id in graph.all_nodes.values()
+            if not graph.node_id_to_children_ids.get(node_id)
+        ]
+        nodes = index.docstore.get_nodes(leaf_ids, raise_error=False)
+        return cls.build((node.node_id, node.get_content()) for node in nodes if node)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def match(self, query: str, top_k: int = 5, threshold: float = 0.8) -> LexicalMatch:
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        terms = [t for t in query_terms if t in self.postings]
+        if not terms:
+            return LexicalMatch()
+        query_idf = sum(self._idf.get(t, self._unseen_idf) for t in query_terms)
+
+        scores: Dict[int, float] = {}
+        matched_idf: Dict[int, float] = {}
+        for term in terms:
+            idf = self._idf[term]
+            for doc_idx, tf in self.postings[term].items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[doc_idx] / (self._avgdl or 1.0))
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                matched_idf[doc_idx] = matched_idf.get(doc_idx, 0.0) + idf
+
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+        best = ranked[0][0]
+        return LexicalMatch(
+            hits=[(self.doc_ids[i], round(s, 4)) for i, s in ranked],
+            coverage=round(matched_idf[best] / query_idf, 4),
+            full_matches=sum(1 for m in matched_idf.values() if m / query_idf >= threshold),
+        )
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        return self.match(query, top_k).hits
+
+    def to_bytes(self) -> bytes:
+        return json.dumps({
+            "k1": self.k1,
+            "b": self.b,
+            "doc_ids": self.doc_ids,
+            "doc_lens": self.doc_lens,
+            "postings": {term: list(docs.items()) for term, docs in self.postings.items()},
+        }).encode()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BM25Index":
+        raw = json.loads(data)
+        postings = {term: {int(i): tf for i, tf in docs} for term, docs in raw["postings"].items()}
+        return cls(raw["doc_ids"], raw["doc_lens"], postings, raw["k1"], raw["b"])
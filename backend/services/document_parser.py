@@ -7,7 +7,8 @@ Injected with customer_id metadata for tenant isolation.
 import asyncio
 import logging
 import os
-from typing import List
+import time
+from typing import List, Optional
 
 from langchain_core.documents import Document
 from llama_parse import LlamaParse
@@ -17,28 +18,34 @@ from services.pii_masker import mask_pii
 logger = logging.getLogger("avicon.parser")
 
 
-async def parse_document(file_path: str, customer_id: str) -> List[Document]:
-    """Parse a document file using LlamaParse.
+async def load_document(file_path: str) -> list:
+    """Extract markdown from a document file with LlamaParse (unmasked)."""
+    from services import simulated_providers as simulated
 
-    Args:
-        file_path: Local path to the uploaded file
-        customer_id: Tenant ID for metadata injection
+    if simulated.SIMULATED_PROVIDERS:
+        return await simulated.simulated_load_document(file_path)
 
-    Returns:
-        List of LangChain Documents with customer_id metadata
-    """
     parser = LlamaParse(
         api_key=os.environ.get("LLAMA_CLOUD_API_KEY"),
         result_type="markdown",
         verbose=False,
     )
+    started = time.perf_counter()
+    documents = await parser.aload_data(file_path)
+    if simulated.SIMULATED_RECORD:
+        await simulated.record_parse(file_path, documents, (time.perf_counter() - started) * 1000)
+    return documents
 
-    logger.info(
-        f"PARSE_START | customer={customer_id} | file={os.path.basename(file_path)}"
-    )
 
-    documents = await parser.aload_data(file_path)
+async def mask_documents(
+    documents: list, file_path: str, customer_id: str, source: Optional[str] = None
+) -> List[Document]:
+    """PII-mask parsed documents and wrap them as LangChain Documents with tenant metadata.
 
+    ``source`` names the document in citations and answer-cache tags; uploads
+    pass the original filename so it does not change with the spooled temp
+    name. Defaults to the file's basename.
+    """
     # PII-mask document content concurrently without blocking event loop
     loop = asyncio.get_running_loop()
     mask_tasks = [loop.run_in_executor(None, mask_pii, doc.text) for doc in documents]
@@ -51,10 +58,30 @@ async def parse_document(file_path: str, customer_id: str) -> List[Document]:
                 page_content=masked_content,
                 metadata={
                     "customer_id": customer_id,
-                    "source": os.path.basename(file_path),
+                    "source": source or os.path.basename(file_path),
                 },
             )
         )
+    return langchain_docs
+
+
+async def parse_document(file_path: str, customer_id: str, source: Optional[str] = None) -> List[Document]:
+    """Parse a document file using LlamaParse.
+
+    Args:
+        file_path: Local path to the uploaded file
+        customer_id: Tenant ID for metadata injection
+        source: Original document name (defaults to the file's basename)
+
+    Returns:
+        List of LangChain Documents with customer_id metadata
+    """
+    logger.info(
+        f"PARSE_START | customer={customer_id} | file={os.path.basename(file_path)}"
+    )
+
+    documents = await load_document(file_path)
+    langchain_docs = await mask_documents(documents, file_path, customer_id, source)
 
     logger.info(
         f"PARSE_DONE | customer={customer_id} | documents={len(langchain_docs)}"
@@ -0,0 +1,272 @@
+"""Persistent content-hash -> vector cache in front of the embedding model.
+
+Re-indexing or re-uploading a document re-embeds every chunk, almost all of
+them unchanged. ``CachedEmbedding`` looks every text of a batch up by a hash
+of (model, kind, text) in one SQLite query and sends only the misses to the
+wrapped model, still batched, so re-index cost tracks the text that changed.
+Vectors are stored as float16 by default (half the bytes of float32, ample
+precision for cosine ranking); RAG_EMBED_CACHE_DTYPE=float32 keeps them exact.
+Entries expire after RAG_EMBED_CACHE_TTL and the store is trimmed to the
+RAG_EMBED_CACHE_MAX_ENTRIES most recently used, as the completion cache is.
+The async paths do their SQLite reads and writes in a worker thread.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+logger = logging.getLogger("avicon.embedding_cache")
+
+EMBED_CACHE_ENABLED = os.environ.get("RAG_EMBED_CACHE", "1") == "1"
+EMBED_CACHE_PATH = os.environ.get("RAG_EMBED_CACHE_PATH", "/tmp/avicon_embed_cache.sqlite3")
+EMBED_CACHE_DTYPE = os.environ.get("RAG_EMBED_CACHE_DTYPE", "float16")
+EMBED_CACHE_TTL = float(os.environ.get("RAG_EMBED_CACHE_TTL", str(30 * 24 * 3600)))
+EMBED_CACHE_MAX_ENTRIES = int(os.environ.get("RAG_EMBED_CACHE_MAX_ENTRIES", "200000"))
+# Keys per SELECT ... IN (...) (well under SQLite's host parameter limit)
+_LOOKUP_CHUNK = 500
+# Trim to the size bound once per this many stored vectors rather than on every write
+_TRIM_EVERY = 1000
+
+
+class EmbeddingStore:
+    """SQLite (WAL) table of vectors keyed by content hash, shared by a host's workers.
+
+    Bounded like ``LLMCache``: entries older than ``ttl_seconds`` are misses,
+    and ``trim`` drops them and the least recently used beyond ``max_entries``.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL,
+            created REAL NOT NULL, accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings(accessed);
+    """
+
+    def __init__(
+        self,
+        path: str = EMBED_CACHE_PATH,
+        dtype: str = EMBED_CACHE_DTYPE,
+        ttl_seconds: float = EMBED_CACHE_TTL,
+        max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+    ):
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"Unsupported embedding cache dtype: {dtype}")
+        self._path = path
+        self._dtype = dtype
+        self._ttl = ttl_seconds
+        self._max_entries = max(1, max_entries)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"hits": 0, "misses": 0, "remote_batches": 0}
+        with self._conn() as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+            if columns and "accessed" not in columns:
+                # Store from before entries were timestamped: it is only a cache
+                conn.execute("DROP TABLE embeddings")
+            conn.executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{kind}\x00{text}".encode()).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """Live vectors for whichever of ``keys`` are stored, in one query per chunk."""
+        found: Dict[str, List[float]] = {}
+        conn = self._conn()
+        now = time.time()
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), _LOOKUP_CHUNK):
+            chunk = unique[start:start + _LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({placeholders}) AND created >= ?",
+                (*chunk, now - self._ttl),
+            ).fetchall()
+            for key, dtype, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=dtype).astype(np.float32).tolist()
+            if rows:
+                hits = [row[0] for row in rows]
+                conn.execute(
+                    f"UPDATE embeddings SET accessed = ? WHERE key IN ({','.join('?' * len(hits))})",
+                    (now, *hits),
+                )
+        return found
+
+    def put_many(self, items: Dict[str, Sequence[float]]):
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (key, self._dtype, np.asarray(vector, dtype=self._dtype).tobytes(), now, now)
+            for key, vector in items.items()
+        ]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            before, self._writes = self._writes, self._writes + len(rows)
+            trim = before // _TRIM_EVERY != self._writes // _TRIM_EVERY
+        if trim:
+            self.trim()
+
+    def trim(self) -> int:
+        """Drop expired vectors, then the least recently used beyond max_entries."""
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM embeddings WHERE created < ?", (time.time() - self._ttl,)).rowcount
+        removed += conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self._max_entries,),
+        ).rowcount
+        return removed
+
+    def record(self, hits: int, misses: int, remote_batches: int):
+        with self._lock:
+            self._stats["hits"] += hits
+            self._stats["misses"] += misses
+            self._stats["remote_batches"] += remote_batches
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["entries"] = len(self)
+        stats["dtype"] = self._dtype
+        return stats
+
+
+class CachedEmbedding(BaseEmbedding):
+    """BaseEmbedding that serves stored vectors and embeds only the misses with ``inner``."""
+
+    inner: BaseEmbedding
+    _store: EmbeddingStore = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, store: EmbeddingStore, **kwargs: Any):
+        super().__init__(
+            inner=inner,
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            **kwargs,
+        )
+        self._store = store
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _keys(self, kind: str, texts: Sequence[str]) -> List[str]:
+        return [EmbeddingStore.make_key(self.model_name, kind, text) for text in texts]
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        try:
+            return self._store.get_many(keys)
+        except sqlite3.Error as e:
+            logger.warning(f"EMBED_CACHE_ERROR | op=get | error={e}")
+            return {}
+
+    def _save(self, vectors: Dict[str, List[float]]):
+        try:
+            self._store.put_many(vectors)
+        except sqlite3.Error as e:
+            logger.warning(f"EMBED_CACHE_ERROR | op=set | error={e}")
+
+    def _misses(self, texts: Sequence[str], keys: List[str], found: Dict[str, List[float]]) -> Dict[str, str]:
+        """key -> text for each distinct text not in the store."""
+        return {key: text for key, text in zip(keys, texts) if key not in found}
+
+    def _finish(self, keys: List[str], found: Dict[str, List[float]], misses: Dict[str, str]) -> List[List[float]]:
+        batches = -(-len(misses) // max(1, self.inner.embed_batch_size))
+        hits = sum(1 for key in keys if key not in misses)
+        self._store.record(hits=hits, misses=len(misses), remote_batches=batches)
+        return [found[key] for key in keys]
+
+    def get_text_embedding_batch(self, texts: List[str], show_progress: bool = False, **kwargs: Any) -> List[List[float]]:
+        keys = self._keys("text", texts)
+        found = self._lookup(keys)
+        misses = self._misses(texts, keys, found)
+        if misses:
+            vectors = self.inner.get_text_embedding_batch(list(misses.values()), show_progress=show_progress, **kwargs)
+            fresh = dict(zip(misses, vectors))
+            self._save(fresh)
+            found.update(fresh)
+        return self._finish(keys, found, misses)
+
+    async def aget_text_embedding_batch(
+        self, texts: List[str], show_progress: bool = False, **kwargs: Any
+    ) -> List[List[float]]:
+        keys = self._keys("text", texts)
+        found = await asyncio.to_thread(self._lookup, keys)
+        misses = self._misses(texts, keys, found)
+        if misses:
+            vectors = await self.inner.aget_text_embedding_batch(
+                list(misses.values()), show_progress=show_progress, **kwargs
+            )
+            fresh = dict(zip(misses, vectors))
+            await asyncio.to_thread(self._save, fresh)
+            found.update(fresh)
+        return self._finish(keys, found, misses)
+
+    def _cached_one(self, kind: str, text: str, embed) -> List[float]:
+        key = self._keys(kind, [text])[0]
+        found = self._lookup([key])
+        misses = {} if key in found else {key: text}
+        if misses:
+            found[key] = embed(text)
+            self._save({key: found[key]})
+        return self._finish([key], found, misses)[0]
+
+    async def _acached_one(self, kind: str, text: str, aembed) -> List[float]:
+        key = self._keys(kind, [text])[0]
+        found = await asyncio.to_thread(self._lookup, [key])
+        misses = {} if key in found else {key: text}
+        if misses:
+            found[key] = await aembed(text)
+            await asyncio.to_thread(self._save, {key: found[key]})
+        return self._finish([key], found, misses)[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._cached_one("query", query, self.inner.get_query_embedding)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await self._acached_one("query", query, self.inner.aget_query_embedding)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._cached_one("text", text, self.inner.get_text_embedding)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await self._acached_one("text", text, self.inner.aget_text_embedding)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.get_text_embedding_batch(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self.aget_text_embedding_batch(texts)
+
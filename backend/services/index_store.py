@@ -0,0 +1,334 @@
+"""Disk-backed TreeIndex store — versioned snapshots per customer.
+
+Building a TreeIndex costs dozens of LLM summarization calls, so every
+tenant's index is written to disk once it is built and loaded back lazily
+the first time a (possibly freshly started) worker needs it.
+
+Each build produces an immutable, versioned snapshot directory; a small
+CURRENT file names the live version. Every gunicorn worker reads the same
+snapshots, so an index built by one worker is picked up by the others by
+comparing version stamps instead of being rebuilt.
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("avicon.index_store")
+
+INDEX_DIR = Path(os.environ.get("RAG_INDEX_DIR", "/tmp/avicon_indexes"))
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+KEEP_VERSIONS = 2  # The previous snapshot stays readable for workers mid-load
+
+# A loaded TreeIndex takes ~1.7x its JSON snapshot size in RAM (measured with
+# tracemalloc on a 1,000-node aviation corpus); used for memory accounting.
+INDEX_MEMORY_FACTOR = 1.75
+# The snapshot files a load deserializes into the TreeIndex. Artifacts beside
+# them are either memory-mapped (vectors) or charged when loaded (BM25).
+INDEX_FILES = ("docstore.json", "index_store.json")
+
+
+def _default_loader(persist_dir: str) -> Any:
+    from llama_index.core import StorageContext, load_index_from_storage
+
+    storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+    return load_index_from_storage(storage_context)
+
+
+def _new_version() -> str:
+    # Zero-padded nanosecond timestamp keeps versions lexically sortable
+    return f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+
+
+class IndexStore:
+    """Persists and loads per-customer TreeIndex snapshots on local disk.
+
+    Tenant directories are named by a hash of the customer_id so that an
+    attacker-controlled id can never escape the store root or collide with
+    another tenant's directory.
+    """
+
+    def __init__(
+        self,
+        root: Path = INDEX_DIR,
+        loader: Optional[Callable[[str], Any]] = None,
+    ):
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._loader = loader or _default_loader
+
+    def _tenant_dir(self, customer_id: str) -> Path:
+        digest = hashlib.sha256(customer_id.encode()).hexdigest()
+        return self._root / digest
+
+    def exists(self, customer_id: str) -> bool:
+        return self.current_version(customer_id) is not None
+
+    def current_version(self, customer_id: str) -> Optional[str]:
+        """Version stamp of the live snapshot, or None if there is none."""
+        try:
+            version = (self._tenant_dir(customer_id) / CURRENT_FILE).read_text().strip()
+        except FileNotFoundError:
+            return None
+        return version or None
+
+    @contextmanager
+    def lock(self, customer_id: str) -> Iterator[None]:
+        """Exclusive cross-process lock for a read-modify-write of one tenant's index."""
+        tenant_dir = self._tenant_dir(customer_id)
+        tenant_dir.mkdir(parents=True, exist_ok=True)
+        with open(tenant_dir / LOCK_FILE, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def persist(self, customer_id: str, index: Any, artifacts: Optional[Dict[str, bytes]] = None) -> str:
+        """Write the index as a new snapshot and make it current.
+
+        The snapshot is written to a scratch directory, renamed into place and
+        only then published through an atomic replace of CURRENT, so readers
+        never see a half-written index. ``artifacts`` are extra files derived
+        from the index (e.g. a BM25 index) stored in the same snapshot.
+        Returns the new version stamp.
+        """
+        tenant_dir = self._tenant_dir(customer_id)
+        tenant_dir.mkdir(parents=True, exist_ok=True)
+        version = _new_version()
+        scratch = tenant_dir / f".{version}.tmp"
+        try:
+            index.storage_context.persist(persist_dir=str(scratch))
+            for name, data in (artifacts or {}).items():
+                (scratch / name).write_bytes(data)
+            os.replace(scratch, tenant_dir / version)
+        finally:
+            if scratch.exists():
+                shutil.rmtree(scratch, ignore_errors=True)
+
+        pointer = tenant_dir / f".{CURRENT_FILE}.{uuid.uuid4().hex}"
+        pointer.write_text(version)
+        os.replace(pointer, tenant_dir / CURRENT_FILE)
+        self._prune(tenant_dir)
+
+        logger.info(f"INDEX_PERSIST | customer={customer_id} | version={version}")
+        return version
+
+    def _prune(self, tenant_dir: Path):
+        versions = sorted(
+            p for p in tenant_dir.iterdir() if p.is_dir() and not p.name.startswith(".")
+        )
+        for stale in versions[:-KEEP_VERSIONS]:
+            shutil.rmtree(stale, ignore_errors=True)
+
+    def load_versioned(self, customer_id: str) -> Tuple[Optional[Any], Optional[str]]:
+        """Load the live snapshot. Returns (index, version) or (None, None)."""
+        version = self.current_version(customer_id)
+        while version is not None:
+            try:
+                index = self._loader(str(self._tenant_dir(customer_id) / version))
+            except Exception as e:
+                # A newer build may have pruned the snapshot mid-load; retry on the new one
+                latest = self.current_version(customer_id)
+                if latest != version:
+                    version = latest
+                    continue
+                logger.error(f"INDEX_LOAD_ERROR | customer={customer_id} | version={version} | error={e}")
+                return None, None
+            logger.info(f"INDEX_LOAD | customer={customer_id} | version={version}")
+            return index, version
+        return None, None
+
+    def snapshot_dir(self, customer_id: str, version: str) -> Path:
+        return self._tenant_dir(customer_id) / version
+
+    def artifact_path(self, customer_id: str, version: str, name: str) -> Path:
+        return self.snapshot_dir(customer_id, version) / name
+
+    def read_artifact(self, customer_id: str, version: str, name: str) -> Optional[bytes]:
+        """Contents of a snapshot's artifact, or None if it was never written or is pruned."""
+        try:
+            return self.artifact_path(customer_id, version, name).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def snapshot_bytes(self, customer_id: str, version: str) -> int:
+        """On-disk size of one snapshot, or 0 if it no longer exists."""
+        snapshot = self._tenant_dir(customer_id) / version
+        try:
+            return sum(f.stat().st_size for f in snapshot.iterdir() if f.is_file())
+        except FileNotFoundError:
+            return 0
+
+    def index_bytes(self, customer_id: str, version: str) -> int:
+        """Size of the snapshot's INDEX_FILES — the part a load holds in memory."""
+        snapshot = self._tenant_dir(customer_id) / version
+        total = 0
+        for name in INDEX_FILES:
+            try:
+                total += (snapshot / name).stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def load(self, customer_id: str) -> Optional[Any]:
+        """Load the customer's persisted index, or None if there is none."""
+        return self.load_versioned(customer_id)[0]
+
+    def delete(self, customer_id: str):
+        shutil.rmtree(self._tenant_dir(customer_id), ignore_errors=True)
+
+
+class IndexMemoryCache:
+    """Memory-budgeted LRU of loaded TreeIndexes, keyed by customer_id.
+
+    Each entry is charged an estimate of its resident size. When the total
+    exceeds the budget, least-recently-used tenants are dropped; their
+    snapshots stay on disk, so the next query reloads instead of rebuilding.
+    The most recently inserted index is never evicted, even if it alone
+    exceeds the budget.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._budget = max(0, budget_bytes)
+        self._used = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, customer_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(customer_id)
+            self._hits += 1
+            return entry
+
+    def peek(self, customer_id: str) -> Optional[dict]:
+        """Return the entry without touching LRU order or hit counters."""
+        with self._lock:
+            return self._entries.get(customer_id)
+
+    def put(
+        self,
+        customer_id: str,
+        index: Any,
+        version: Optional[str],
+        size_bytes: int,
+        extras: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """Insert or replace an entry. Returns False if a newer version is already cached.
+
+        ``extras`` holds per-version structures derived from the index
+        (retrieval helpers); it lives and is evicted with the entry.
+        """
+        with self._lock:
+            current = self._entries.get(customer_id)
+            if current is not None:
+                if version is not None and current["version"] is not None and version < current["version"]:
+                    return False
+                self._used -= current["bytes"]
+            self._entries[customer_id] = {
+                "index": index,
+                "version": version,
+                "bytes": size_bytes,
+                "extras": extras if extras is not None else {},
+                "checked_at": time.time(),
+            }
+            self._entries.move_to_end(customer_id)
+            self._used += size_bytes
+            evicted = self._evict_over_budget(keep=customer_id)
+
+        self._log_evictions(evicted)
+        return True
+
+    def charge(self, customer_id: str, version: Optional[str], size_bytes: int) -> bool:
+        """Add the size of a structure loaded into an entry's extras after the fact.
+
+        Returns False (and charges nothing) if the tenant no longer holds
+        ``version``. Other tenants are evicted if the charge exceeds the budget.
+        """
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is None or entry["version"] != version:
+                return False
+            entry["bytes"] += size_bytes
+            self._used += size_bytes
+            evicted = self._evict_over_budget(keep=customer_id)
+
+        self._log_evictions(evicted)
+        return True
+
+    def _evict_over_budget(self, keep: str) -> List[Tuple[str, int]]:
+        """Drop least-recently-used tenants other than ``keep`` until within budget (lock held)."""
+        evicted = []
+        for tenant in list(self._entries):
+            if self._used <= self._budget:
+                break
+            if tenant == keep:
+                continue
+            entry = self._entries.pop(tenant)
+            self._used -= entry["bytes"]
+            self._evictions += 1
+            evicted.append((tenant, entry["bytes"]))
+        return evicted
+
+    @staticmethod
+    def _log_evictions(evicted: List[Tuple[str, int]]):
+        for tenant, size in evicted:
+            logger.info(f"INDEX_EVICT | customer={tenant} | bytes={size}")
+
+    def pop(self, customer_id: str, version: Optional[str] = None) -> Optional[dict]:
+        """Remove an entry (only if it still holds ``version``, when given)."""
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is None or (version is not None and entry["version"] != version):
+                return None
+            del self._entries[customer_id]
+            self._used -= entry["bytes"]
+            return entry
+
+    def claim_version_check(self, customer_id: str, interval: float) -> Tuple[bool, Optional[str]]:
+        """Rate-limit version checks: returns (due, cached_version) and marks the check done."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is None or now - entry["checked_at"] < interval:
+                return False, None
+            entry["checked_at"] = now
+            return True, entry["version"]
+
+    def tenant_bytes(self, customer_id: str) -> int:
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            return entry["bytes"] if entry else 0
+
+    def report(self) -> Dict[str, int]:
+        """Resident bytes per tenant, largest first."""
+        with self._lock:
+            sizes = {tenant: entry["bytes"] for tenant, entry in self._entries.items()}
+        return dict(sorted(sizes.items(), key=lambda kv: kv[1], reverse=True))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_bytes": self._budget,
+                "used_bytes": self._used,
+                "tenants": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
@@ -0,0 +1,280 @@
+"""Background ingestion jobs for document uploads.
+
+Uploads are spooled to disk and recorded in the `ingestion_jobs` collection,
+then a bounded pool of worker tasks runs parse → mask → index for each job,
+recording per-stage status, timings and errors. Jobs are claimed with a
+renewable lease; a periodic sweep requeues work left queued or orphaned by a
+worker that died mid-job, once its lease has expired. A failed stage puts the
+job back in the queue (spooled file kept) for the next sweep to retry, until
+its last attempt fails.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from pymongo import ReturnDocument
+
+from services.document_parser import load_document, mask_documents
+from services.rag_engine import aprocess_and_store_documents
+
+logger = logging.getLogger("avicon.ingestion")
+
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+INGEST_LEASE_SECONDS = float(os.environ.get("INGEST_LEASE_SECONDS", "60"))
+INGEST_MAX_ATTEMPTS = int(os.environ.get("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_SWEEP_SECONDS = float(os.environ.get("INGEST_SWEEP_SECONDS", "30"))
+
+STAGES = ("parse", "mask", "index")
+
+# Spooled uploads live on local disk, so only this host can resume its jobs
+NODE = socket.gethostname()
+
+# Internal bookkeeping never returned by the status endpoint
+_PRIVATE_FIELDS = {"_id": 0, "path": 0, "node": 0, "lease_until": 0}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def new_job(customer_id: str, filename: str, path: str) -> Dict[str, Any]:
+    now = _now()
+    return {
+        "job_id": uuid.uuid4().hex,
+        "customer_id": customer_id,
+        "filename": filename,
+        "path": str(path),
+        "node": NODE,
+        "status": "queued",
+        "stage": None,
+        "stages": {stage: {"status": "pending"} for stage in STAGES},
+        "chunks_created": None,
+        "error": None,
+        "attempts": 0,
+        "lease_until": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class IngestionQueue:
+    """Bounded worker pool over Mongo-persisted ingestion jobs.
+
+    One instance per worker process, started and stopped by the app lifespan.
+    Startup does not wait on Mongo: index creation and job recovery run in the
+    background sweep, which logs failures and retries every sweep interval.
+    """
+
+    def __init__(
+        self,
+        db,
+        workers: int = INGEST_WORKERS,
+        lease_seconds: float = INGEST_LEASE_SECONDS,
+        max_attempts: int = INGEST_MAX_ATTEMPTS,
+        sweep_seconds: float = INGEST_SWEEP_SECONDS,
+    ):
+        self._jobs = db.ingestion_jobs
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: Set[str] = set()
+        self._workers = max(1, workers)
+        self._lease = timedelta(seconds=lease_seconds)
+        self._max_attempts = max(1, max_attempts)
+        self._sweep_interval = max(0.01, sweep_seconds)
+        self._indexed = False
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+        logger.info(f"INGEST_START | workers={self._workers} | sweep={self._sweep_interval}s")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, customer_id: str, filename: str, path: str) -> Dict[str, Any]:
+        """Record a spooled upload and queue it. Returns the new job."""
+        job = new_job(customer_id, filename, path)
+        await self._jobs.insert_one(dict(job))
+        self._enqueue(job["job_id"])
+        logger.info(f"INGEST_QUEUED | customer={customer_id} | job={job['job_id']} | file={filename}")
+        return job
+
+    async def get(self, job_id: str, customer_id: str) -> Optional[Dict[str, Any]]:
+        """Job status, scoped to the owning customer."""
+        return await self._jobs.find_one({"job_id": job_id, "customer_id": customer_id}, _PRIVATE_FIELDS)
+
+    async def recover(self) -> int:
+        """Requeue this node's jobs that are still queued or whose lease has expired.
+
+        Returns how many were added; jobs already waiting locally are skipped.
+        """
+        cursor = self._jobs.find(self._claimable({"node": NODE}), {"job_id": 1})
+        jobs = await cursor.to_list(None)
+        return sum(self._enqueue(job["job_id"]) for job in jobs)
+
+    async def sweep(self) -> int:
+        """One pass of the background sweep: ensure indexes, then ``recover``."""
+        if not self._indexed:
+            try:
+                await self._jobs.create_index("job_id", unique=True)
+                await self._jobs.create_index([("node", 1), ("status", 1)])
+                self._indexed = True
+            except Exception as e:
+                logger.warning(f"INGEST_INDEX_ERROR | error={e}")
+        return await self.recover()
+
+    # ── Internals ─────────────────────────────────────
+
+    def _enqueue(self, job_id: str) -> bool:
+        if job_id in self._pending:
+            return False
+        self._pending.add(job_id)
+        self._queue.put_nowait(job_id)
+        return True
+
+    async def _sweeper(self):
+        while True:
+            try:
+                recovered = await self.sweep()
+                if recovered:
+                    logger.info(f"INGEST_RECOVERED | jobs={recovered}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Mongo unreachable (e.g. at boot): keep serving, retry next sweep
+                logger.error(f"INGEST_SWEEP_ERROR | retry_in={self._sweep_interval}s | error={e}")
+            await asyncio.sleep(self._sweep_interval)
+
+    def _claimable(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **query,
+            "$or": [
+                {"status": "queued"},
+                {"status": "running", "lease_until": {"$lt": _now()}},
+            ],
+        }
+
+    async def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Atomically take a job, so duplicate queue entries run it only once."""
+        now = _now()
+        return await self._jobs.find_one_and_update(
+            self._claimable({"job_id": job_id}),
+            {
+                "$set": {"status": "running", "lease_until": now + self._lease, "updated_at": now},
+                "$inc": {"attempts": 1},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._pending.discard(job_id)
+            try:
+                job = await self._claim(job_id)
+                if job is not None:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"INGEST_WORKER_ERROR | job={job_id} | error={e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self._lease.total_seconds() / 3)
+            await self._jobs.update_one(
+                {"job_id": job_id, "status": "running"},
+                {"$set": {"lease_until": _now() + self._lease}},
+            )
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id, customer_id, path = job["job_id"], job["customer_id"], job["path"]
+        if job["attempts"] > self._max_attempts:
+            await self._finish(job, "failed", error="Exceeded retry attempts")
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            stage = "parse"
+            parsed = await self._stage(job_id, stage, lambda: load_document(path))
+            stage = "mask"
+            # Tag chunks with the uploaded filename, not the per-upload temp name
+            masked = await self._stage(
+                job_id, stage, lambda: mask_documents(parsed, path, customer_id, source=job["filename"])
+            )
+            stage = "index"
+            chunks = await self._stage(job_id, stage, lambda: aprocess_and_store_documents(masked, customer_id))
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so the next start resumes it
+            await self._jobs.update_one(
+                {"job_id": job_id},
+                {"$set": {"status": "queued", "lease_until": None, "updated_at": _now()}, "$inc": {"attempts": -1}},
+            )
+            raise
+        except Exception as e:
+            error = f"{stage} failed: {type(e).__name__}"
+            if job["attempts"] < self._max_attempts:
+                logger.warning(
+                    f"INGEST_RETRY | customer={customer_id} | job={job_id} | stage={stage} | "
+                    f"attempt={job['attempts']}/{self._max_attempts} | error={e}"
+                )
+                await self._jobs.update_one(
+                    {"job_id": job_id},
+                    {"$set": {"status": "queued", "lease_until": None, "error": error, "updated_at": _now()}},
+                )
+                return
+            logger.error(f"INGEST_FAILED | customer={customer_id} | job={job_id} | stage={stage} | error={e}", exc_info=True)
+            await self._finish(job, "failed", error=error)
+            return
+        finally:
+            heartbeat.cancel()
+
+        await self._finish(job, "succeeded", chunks_created=chunks)
+        logger.info(f"INGEST_DONE | customer={customer_id} | job={job_id} | chunks={chunks}")
+
+    async def _stage(self, job_id: str, stage: str, step: Callable[[], Awaitable[Any]]) -> Any:
+        started_at = _now()
+        start = time.perf_counter()
+        await self._jobs.update_one(
+            {"job_id": job_id},
+            {"$set": {
+                "stage": stage,
+                f"stages.{stage}": {"status": "running", "started_at": started_at},
+                "updated_at": started_at,
+            }},
+        )
+
+        status = "failed"
+        try:
+            result = await step()
+            status = "done"
+            return result
+        finally:
+            finished_at = _now()
+            await self._jobs.update_one(
+                {"job_id": job_id},
+                {"$set": {
+                    f"stages.{stage}.status": status,
+                    f"stages.{stage}.finished_at": finished_at,
+                    f"stages.{stage}.duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                    "updated_at": finished_at,
+                }},
+            )
+
+    async def _finish(self, job: Dict[str, Any], status: str, **fields: Any):
+        await self._jobs.update_one(
+            {"job_id": job["job_id"]},
+            {"$set": {"status": status, "lease_until": None, "updated_at": _now(), **fields}},
+        )
+        Path(job["path"]).unlink(missing_ok=True)
@@ -0,0 +1,265 @@
+"""Content-addressed cache of LLM completions, shared by every prompting path.
+
+Drafts get regenerated and documents re-indexed with exactly the same
+prompts; each of those is a paid round trip to the deployment. ``CachingLLM``
+wraps the configured LLM and answers a prompt it has already seen from a
+SQLite store keyed by a hash of (deployment, temperature, system prompt,
+full prompt), so every worker on the host shares it and it survives restarts.
+
+Callers tag their calls with ``llm_endpoint("rfp_draft")`` so hit rates and
+tokens saved can be reported per endpoint, and opt out of a single call with
+``cache=False`` (or ``llm_cache_disabled()`` around code they do not own).
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger("avicon.llm_cache")
+
+LLM_CACHE_ENABLED = os.environ.get("RAG_LLM_CACHE", "1") == "1"
+LLM_CACHE_PATH = os.environ.get("RAG_LLM_CACHE_PATH", "/tmp/avicon_llm_cache.sqlite3")
+LLM_CACHE_TTL = float(os.environ.get("RAG_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("RAG_LLM_CACHE_MAX_ENTRIES", "20000"))
+# Trim to the size bound once per this many writes rather than on every one
+_TRIM_EVERY = 100
+
+_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar("llm_endpoint", default="other")
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+@contextmanager
+def llm_endpoint(name: str) -> Iterator[None]:
+    """Attribute LLM calls made inside the block (and tasks it spawns) to ``name``."""
+    token = _endpoint.set(name)
+    try:
+        yield
+    finally:
+        _endpoint.reset(token)
+
+
+@contextmanager
+def llm_cache_disabled(disabled: bool = True) -> Iterator[None]:
+    """Bypass the completion cache for LLM calls made inside the block."""
+    token = _bypass.set(disabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; only used when the API reports no usage
+    return max(1, len(text) // 4)
+
+
+def _usage(response: Any, prompt: str, text: str) -> Tuple[int, int]:
+    """(prompt tokens, completion tokens) as reported by the API, else estimated."""
+    raw = getattr(response, "raw", None)
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    if isinstance(usage, dict):
+        return int(usage.get("prompt_tokens", 0)), int(usage.get("completion_tokens", 0))
+    if usage is not None and hasattr(usage, "prompt_tokens"):
+        return int(usage.prompt_tokens), int(usage.completion_tokens)
+    return _estimate_tokens(prompt), _estimate_tokens(text)
+
+
+class LLMCache:
+    """SQLite (WAL) store of completions with TTL, LRU size bound and per-endpoint counters."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS completions (
+            key TEXT PRIMARY KEY, text TEXT NOT NULL,
+            prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL,
+            created REAL NOT NULL, accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS completions_accessed ON completions(accessed);
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        ttl_seconds: float = LLM_CACHE_TTL,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+    ):
+        self._path = path
+        self._ttl = ttl_seconds
+        self._max_entries = max(1, max_entries)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats: Dict[str, Dict[str, int]] = {}
+        with self._conn() as conn:
+            conn.executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(deployment: str, temperature: Any, system_prompt: Optional[str], prompt: str, **params: Any) -> str:
+        material = json.dumps([deployment, temperature, system_prompt, prompt, params], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _count(self, endpoint: str, **deltas: int):
+        with self._lock:
+            stats = self._stats.setdefault(
+                endpoint, {"hits": 0, "misses": 0, "bypassed": 0, "tokens_saved": 0, "tokens_spent": 0}
+            )
+            for name, delta in deltas.items():
+                stats[name] += delta
+
+    def get(self, key: str, endpoint: str) -> Optional[str]:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT text, prompt_tokens, completion_tokens, created FROM completions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and time.time() - row[3] >= self._ttl:
+            conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+            row = None
+        if row is None:
+            self._count(endpoint, misses=1)
+            return None
+        conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (time.time(), key))
+        self._count(endpoint, hits=1, tokens_saved=row[1] + row[2])
+        return row[0]
+
+    def set(self, key: str, endpoint: str, text: str, prompt_tokens: int, completion_tokens: int):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?)",
+            (key, text, prompt_tokens, completion_tokens, now, now),
+        )
+        self._count(endpoint, tokens_spent=prompt_tokens + completion_tokens)
+        with self._lock:
+            self._writes += 1
+            trim = self._writes % _TRIM_EVERY == 0
+        if trim:
+            self.trim()
+
+    def record_bypass(self, endpoint: str):
+        self._count(endpoint, bypassed=1)
+
+    def trim(self) -> int:
+        """Drop expired entries, then the least recently used beyond max_entries."""
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM completions WHERE created < ?", (time.time() - self._ttl,)).rowcount
+        removed += conn.execute(
+            "DELETE FROM completions WHERE key IN "
+            "(SELECT key FROM completions ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self._max_entries,),
+        ).rowcount
+        return removed
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and tokens saved per endpoint for this worker."""
+        with self._lock:
+            endpoints = {name: dict(counts) for name, counts in self._stats.items()}
+        for counts in endpoints.values():
+            lookups = counts["hits"] + counts["misses"]
+            counts["hit_rate"] = round(counts["hits"] / lookups, 4) if lookups else 0.0
+        return {
+            "entries": len(self),
+            "tokens_saved": sum(c["tokens_saved"] for c in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+
+class CachingLLM:
+    """Wraps a llama_index LLM; ``complete``/``predict`` (sync and async) go through ``cache``.
+
+    Everything else (chat, streaming, metadata) is delegated untouched, so the
+    wrapper can be handed anywhere the LLM itself is used.
+    """
+
+    def __init__(self, llm: Any, cache: LLMCache):
+        self.wrapped = llm
+        self._cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.wrapped, name)
+
+    def _key(self, prompt: str, **params: Any) -> str:
+        llm = self.wrapped
+        deployment = getattr(llm, "engine", None) or getattr(llm, "model", None) or type(llm).__name__
+        return LLMCache.make_key(
+            str(deployment), getattr(llm, "temperature", None), getattr(llm, "system_prompt", None), prompt, **params
+        )
+
+    def _lookup(self, prompt: str, use_cache: bool, **params: Any) -> Tuple[Optional[str], Optional[str]]:
+        """(cached text, key to store under) — key is None when the cache is bypassed."""
+        endpoint = _endpoint.get()
+        if not use_cache or _bypass.get():
+            self._cache.record_bypass(endpoint)
+            return None, None
+        key = self._key(prompt, **params)
+        try:
+            return self._cache.get(key, endpoint), key
+        except sqlite3.Error as e:
+            logger.warning(f"LLM_CACHE_ERROR | op=get | error={e}")
+            return None, None
+
+    def _store(self, key: Optional[str], prompt: str, response: Any, text: str):
+        if key is None:
+            return
+        prompt_tokens, completion_tokens = _usage(response, prompt, text)
+        try:
+            self._cache.set(key, _endpoint.get(), text, prompt_tokens, completion_tokens)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM_CACHE_ERROR | op=set | error={e}")
+
+    @staticmethod
+    def _completion(text: str) -> Any:
+        from llama_index.core.base.llms.types import CompletionResponse
+
+        return CompletionResponse(text=text, additional_kwargs={"cached": True})
+
+    def complete(self, prompt: str, formatted: bool = False, cache: bool = True, **kwargs: Any) -> Any:
+        text, key = self._lookup(prompt, cache, formatted=formatted, **kwargs)
+        if text is not None:
+            return self._completion(text)
+        response = self.wrapped.complete(prompt, formatted=formatted, **kwargs)
+        self._store(key, prompt, response, response.text)
+        return response
+
+    # The async forms do their SQLite reads and writes (busy timeouts, trims)
+    # in a worker thread; to_thread carries the endpoint/bypass context along.
+    async def acomplete(self, prompt: str, formatted: bool = False, cache: bool = True, **kwargs: Any) -> Any:
+        text, key = await asyncio.to_thread(self._lookup, prompt, cache, formatted=formatted, **kwargs)
+        if text is not None:
+            return self._completion(text)
+        response = await self.wrapped.acomplete(prompt, formatted=formatted, **kwargs)
+        await asyncio.to_thread(self._store, key, prompt, response, response.text)
+        return response
+
+    def predict(self, prompt: Any, cache: bool = True, **prompt_args: Any) -> str:
+        rendered = prompt.format(**prompt_args)
+        text, key = self._lookup(rendered, cache, kind="predict")
+        if text is None:
+            text = self.wrapped.predict(prompt, **prompt_args)
+            self._store(key, rendered, None, text)
+        return text
+
+    async def apredict(self, prompt: Any, cache: bool = True, **prompt_args: Any) -> str:
+        rendered = prompt.format(**prompt_args)
+        text, key = await asyncio.to_thread(self._lookup, rendered, cache, kind="predict")
+        if text is None:
+            text = await self.wrapped.apredict(prompt, **prompt_args)
+            await asyncio.to_thread(self._store, key, rendered, None, text)
+        return text
@@ -0,0 +1,773 @@
+"""Query answer cache with pluggable storage backends.
+
+``QueryCache`` owns keying and TTL; a ``CacheBackend`` owns storage, LRU
+bounds and the per-customer tag index used for targeted invalidation:
+
+  memory  — per-process OrderedDict (the default; nothing shared)
+  sqlite  — one SQLite file in WAL mode, shared by the workers on a host
+  redis   — any Redis-protocol server, shared by every worker and host
+
+With a shared backend an invalidation issued by one worker is seen by all
+of them, and an answer computed by one worker is a hit on the others.
+Selected with RAG_QUERY_CACHE_BACKEND (+ _PATH / _REDIS_URL).
+
+The memory backend can be backed by an on-disk SQLite L2 tier
+(RAG_QUERY_CACHE_L2_PATH): writes go through to it, L1 misses fall back to
+it, and a new process warms its LRU from the most recently used entries, so
+answers survive deploys. With RAG_QUERY_CACHE_STALE_SECONDS set, answers
+past their TTL are still served for that long while the caller refreshes
+them in the background (stale-while-revalidate).
+
+An unreachable or failing backend degrades to cache misses (logged), never
+to failed queries. Backends that do network or disk I/O are called from a
+worker thread on the async paths (``alookup``/``aset``/``offload``).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar
+
+from services.resp import RespClient, RespError
+
+logger = logging.getLogger("avicon.query_cache")
+
+QUERY_CACHE_BACKEND = os.environ.get("RAG_QUERY_CACHE_BACKEND", "memory")
+QUERY_CACHE_PATH = os.environ.get("RAG_QUERY_CACHE_PATH", "/tmp/avicon_query_cache.sqlite3")
+QUERY_CACHE_REDIS_URL = os.environ.get("RAG_QUERY_CACHE_REDIS_URL", "redis://127.0.0.1:6379/0")
+QUERY_CACHE_L2_PATH = os.environ.get("RAG_QUERY_CACHE_L2_PATH", "")
+QUERY_CACHE_STALE_SECONDS = float(os.environ.get("RAG_QUERY_CACHE_STALE_SECONDS", "0"))
+# In-memory tier sizing: total byte budget, per-tenant cap (fraction of the
+# budget) and eviction weights ("cust-a=2,cust-b=0.5"); 0 disables a bound
+QUERY_CACHE_BUDGET_MB = float(os.environ.get("RAG_QUERY_CACHE_BUDGET_MB", "64"))
+QUERY_CACHE_TENANT_SHARE = float(os.environ.get("RAG_QUERY_CACHE_TENANT_SHARE", "1.0"))
+QUERY_CACHE_TENANT_WEIGHTS = os.environ.get("RAG_QUERY_CACHE_TENANT_WEIGHTS", "")
+# zlib-compress stored answers at least this large (0 = never)
+QUERY_CACHE_COMPRESS_MIN_BYTES = int(os.environ.get("RAG_QUERY_CACHE_COMPRESS_MIN_BYTES", "0"))
+
+# What a shared backend raises when its server or file is unavailable
+# (ConnectionError and socket timeouts are OSErrors)
+BACKEND_ERRORS = (OSError, sqlite3.Error, RespError)
+
+T = TypeVar("T")
+
+
+def doc_tag(source: str) -> str:
+    return f"doc:{source}"
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """``"cust-a=2,cust-b=0.5"`` -> {"cust-a": 2.0, "cust-b": 0.5}"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        customer_id, _, weight = item.partition("=")
+        weights[customer_id.strip()] = float(weight)
+    return weights
+
+
+class CacheBackend(ABC):
+    """Storage for cache entries, keyed by cache key and tagged per customer.
+
+    Entries are (data, stored_at) pairs; expiry is decided by QueryCache.
+    """
+
+    #: True when every worker sees the same entries (and invalidations)
+    shared = False
+    #: True when calls do network or disk I/O, so async callers use a thread
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """(data, stored_at) for a key, marking it recently used; None if absent."""
+
+    @abstractmethod
+    def set(self, customer_id: str, key: str, data: Any, tags: Set[str], ttl: float): ...
+
+    @abstractmethod
+    def delete(self, key: str): ...
+
+    @abstractmethod
+    def invalidate_customer(self, customer_id: str) -> int: ...
+
+    @abstractmethod
+    def invalidate_tags(self, customer_id: str, tags: Iterable[str]) -> int: ...
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """Per-process LRU with per-customer key sets and tag index.
+
+    Bounded by entry count and, with ``budget_bytes``, by the serialized size
+    of the stored answers. A tenant may hold at most ``tenant_share`` of the
+    budget (its own LRU entries make room first); beyond that, budget
+    pressure evicts from the tenant using the most bytes per unit of weight,
+    so one chatty tenant cannot flush everyone else's answers.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 500,
+        budget_bytes: int = 0,
+        tenant_share: float = 1.0,
+        tenant_weights: Optional[Dict[str, float]] = None,
+        compress_min_bytes: int = 0,
+    ):
+        self._max_size = max(1, max_size)
+        self._budget = max(0, int(budget_bytes))
+        self._tenant_share = min(1.0, max(0.0, tenant_share)) or 1.0
+        self._weights = dict(tenant_weights or {})
+        self._compress_min = max(0, compress_min_bytes)
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        # Per-customer keys in LRU order (values unused)
+        self._by_customer: Dict[str, OrderedDict[str, None]] = {}
+        self._by_tag: Dict[str, Dict[str, Set[str]]] = {}
+        self._tenant_bytes: Dict[str, int] = {}
+        self._used = 0
+        self._evictions = 0
+        self._rejected = 0
+        self._bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self._by_customer[entry["customer"]].move_to_end(key)
+            data, blob = entry["data"], entry["blob"]
+        if blob is not None:
+            data = json.loads(zlib.decompress(blob))
+        return data, entry["ts"]
+
+    def _encode(self, key: str, data: Any, tags: frozenset) -> Tuple[Any, Optional[bytes], int, int]:
+        """(data, compressed blob or None, charged bytes, bytes saved) for an answer."""
+        payload = json.dumps(data, separators=(",", ":"), default=str).encode()
+        overhead = len(key) + sum(len(tag) for tag in tags)
+        if self._compress_min and len(payload) >= self._compress_min:
+            blob = zlib.compress(payload)
+            if len(blob) < len(payload):
+                return None, blob, len(blob) + overhead, len(payload) - len(blob)
+        return data, None, len(payload) + overhead, 0
+
+    def _tenant_cap(self) -> float:
+        return self._budget * self._tenant_share if self._budget else float("inf")
+
+    def set(
+        self, customer_id: str, key: str, data: Any, tags: Set[str], ttl: float,
+        stored_at: Optional[float] = None,
+    ):
+        tags = frozenset(tags)
+        data, blob, size, saved = self._encode(key, data, tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            cap = self._tenant_cap()
+            if size > cap:
+                # Larger than this tenant may ever hold: don't flush it for one answer
+                self._rejected += 1
+                return
+            self._bytes_saved += saved
+            tenant_keys = self._by_customer.get(customer_id, ())
+            while tenant_keys and self._tenant_bytes[customer_id] + size > cap:
+                self._evict(next(iter(tenant_keys)))
+            if len(self._entries) >= self._max_size:
+                self._evict(next(iter(self._entries)))
+
+            self._entries[key] = {
+                "data": data,
+                "blob": blob,
+                "bytes": size,
+                "ts": stored_at if stored_at is not None else time.time(),
+                "customer": customer_id,
+                "tags": tags,
+            }
+            self._by_customer.setdefault(customer_id, OrderedDict())[key] = None
+            self._tenant_bytes[customer_id] = self._tenant_bytes.get(customer_id, 0) + size
+            self._used += size
+            tag_index = self._by_tag.setdefault(customer_id, {})
+            for tag in tags:
+                tag_index.setdefault(tag, set()).add(key)
+
+            while self._budget and self._used > self._budget:
+                victim = self._victim(exclude=key)
+                if victim is None:
+                    break
+                self._evict(victim)
+
+    def _victim(self, exclude: str) -> Optional[str]:
+        """LRU key of the tenant most over its weighted share. Caller holds the lock."""
+        tenants = sorted(
+            self._tenant_bytes,
+            key=lambda c: self._tenant_bytes[c] / self._weights.get(c, 1.0),
+            reverse=True,
+        )
+        for customer_id in tenants:
+            for key in self._by_customer[customer_id]:
+                if key != exclude:
+                    return key
+        return None
+
+    def _evict(self, key: str):
+        self._remove(key)
+        self._evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        """Drop an entry and its index postings. Caller holds the lock."""
+        entry = self._entries.pop(key)
+        customer_id = entry["customer"]
+        keys = self._by_customer[customer_id]
+        keys.pop(key, None)
+        self._used -= entry["bytes"]
+        self._tenant_bytes[customer_id] -= entry["bytes"]
+        if not keys:
+            del self._by_customer[customer_id]
+            del self._tenant_bytes[customer_id]
+        tag_index = self._by_tag.get(customer_id, {})
+        for tag in entry["tags"]:
+            postings = tag_index.get(tag)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del tag_index[tag]
+        if not tag_index:
+            self._by_tag.pop(customer_id, None)
+
+    def occupancy(self) -> Dict[str, Dict[str, Any]]:
+        """Entries, bytes and share of the budget held by each tenant."""
+        with self._lock:
+            return {
+                customer_id: {
+                    "entries": len(self._by_customer[customer_id]),
+                    "bytes": used,
+                    "budget_share": round(used / self._budget, 4) if self._budget else None,
+                    "weight": self._weights.get(customer_id, 1.0),
+                }
+                for customer_id, used in self._tenant_bytes.items()
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._used,
+                "budget_bytes": self._budget,
+                "tenant_cap_bytes": int(self._tenant_cap()) if self._budget else None,
+                "evictions": self._evictions,
+                "rejected": self._rejected,
+                "compression_saved_bytes": self._bytes_saved,
+            }
+
+    def invalidate_customer(self, customer_id: str) -> int:
+        with self._lock:
+            keys = list(self._by_customer.get(customer_id, ()))
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def invalidate_tags(self, customer_id: str, tags: Iterable[str]) -> int:
+        with self._lock:
+            tag_index = self._by_tag.get(customer_id, {})
+            affected: Set[str] = set()
+            for tag in tags:
+                affected |= tag_index.get(tag, set())
+            for key in affected:
+                self._remove(key)
+        return len(affected)
+
+
+class SQLiteBackend(CacheBackend):
+    """SQLite (WAL) file shared by the worker processes of one host."""
+
+    shared = True
+    blocking = True
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY, customer TEXT NOT NULL,
+            data TEXT NOT NULL, ts REAL NOT NULL, accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS entries_customer ON entries(customer);
+        CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+        CREATE TABLE IF NOT EXISTS tags (
+            customer TEXT NOT NULL, tag TEXT NOT NULL, key TEXT NOT NULL,
+            PRIMARY KEY (customer, tag, key)
+        );
+        CREATE INDEX IF NOT EXISTS tags_key ON tags(key);
+    """
+
+    def __init__(self, path: str = QUERY_CACHE_PATH, max_size: int = 500):
+        self._path = path
+        self._max_size = max(1, max_size)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are per thread; WAL lets readers run alongside one writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        conn = self._conn()
+        row = conn.execute("SELECT data, ts FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0]), row[1]
+
+    def set(self, customer_id: str, key: str, data: Any, tags: Set[str], ttl: float):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM tags WHERE key = ?", (key,))
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, customer, data, ts, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, customer_id, json.dumps(data), now, now),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO tags (customer, tag, key) VALUES (?, ?, ?)",
+                [(customer_id, tag, key) for tag in tags],
+            )
+            # Evict least recently used rows beyond max_size
+            stale = [r[0] for r in conn.execute(
+                "SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?", (self._max_size,)
+            )]
+            self._delete_keys(conn, stale)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def recent(self, limit: int, newer_than: float) -> List[Tuple[str, str, Any, float, Set[str]]]:
+        """Most recently used entries stored after ``newer_than``: (key, customer, data, ts, tags)."""
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT key, customer, data, ts FROM entries WHERE ts > ? ORDER BY accessed DESC LIMIT ?",
+            (newer_than, limit),
+        ).fetchall()
+        return [(key, customer_id, json.loads(data), ts, self.tags_for(key)) for key, customer_id, data, ts in rows]
+
+    def tags_for(self, key: str) -> Set[str]:
+        return {row[0] for row in self._conn().execute("SELECT tag FROM tags WHERE key = ?", (key,))}
+
+    @staticmethod
+    def _delete_keys(conn: sqlite3.Connection, keys) -> int:
+        keys = [(k,) for k in keys]
+        conn.executemany("DELETE FROM tags WHERE key = ?", keys)
+        return sum(conn.execute("DELETE FROM entries WHERE key = ?", k).rowcount for k in keys)
+
+    def delete(self, key: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        self._delete_keys(conn, [key])
+        conn.execute("COMMIT")
+
+    def _invalidate(self, select: str, params: tuple) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            keys = [r[0] for r in conn.execute(select, params)]
+            removed = self._delete_keys(conn, keys)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    def invalidate_customer(self, customer_id: str) -> int:
+        return self._invalidate("SELECT key FROM entries WHERE customer = ?", (customer_id,))
+
+    def invalidate_tags(self, customer_id: str, tags: Iterable[str]) -> int:
+        tags = list(tags)
+        if not tags:
+            return 0
+        removed = 0
+        # Stay under SQLite's bound-parameter limit on large uploads' vocabularies
+        for start in range(0, len(tags), 500):
+            chunk = tags[start:start + 500]
+            removed += self._invalidate(
+                f"SELECT DISTINCT key FROM tags WHERE customer = ? AND tag IN ({','.join('?' * len(chunk))})",
+                (customer_id, *chunk),
+            )
+        return removed
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RedisBackend(CacheBackend):
+    """Redis-protocol server shared by all workers.
+
+    Entries expire server-side after their TTL; per-customer key sets and tag
+    sets are refreshed on write and expire with them. Size bounds are left to
+    the server's maxmemory policy.
+    """
+
+    shared = True
+    blocking = True
+
+    def __init__(self, url: str = QUERY_CACHE_REDIS_URL, prefix: str = "avicon:qc", client: Optional[RespClient] = None):
+        self._client = client or RespClient.from_url(url)
+        self._prefix = prefix
+
+    def _entry(self, key: str) -> str:
+        return f"{self._prefix}:e:{key}"
+
+    def _customer(self, customer_id: str) -> str:
+        return f"{self._prefix}:c:{customer_id}"
+
+    def _tag(self, customer_id: str, tag: str) -> str:
+        return f"{self._prefix}:t:{customer_id}:{tag}"
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        raw = self._client.execute("GET", self._entry(key))
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry["data"], entry["ts"]
+
+    def set(self, customer_id: str, key: str, data: Any, tags: Set[str], ttl: float):
+        ttl_ms = max(1, int(ttl * 1000))
+        commands = [
+            ("SET", self._entry(key), json.dumps({"data": data, "ts": time.time()}), "PX", ttl_ms),
+            ("SADD", self._customer(customer_id), key),
+            ("PEXPIRE", self._customer(customer_id), ttl_ms),
+        ]
+        for tag in tags:
+            commands.append(("SADD", self._tag(customer_id, tag), key))
+            commands.append(("PEXPIRE", self._tag(customer_id, tag), ttl_ms))
+        self._check(self._client.pipeline(commands))
+
+    def delete(self, key: str):
+        self._client.execute("DEL", self._entry(key))
+
+    def _drop(self, customer_id: str, keys, extra_deletes=()) -> int:
+        keys = [k.decode() if isinstance(k, bytes) else k for k in keys]
+        commands = [("DEL", self._entry(k)) for k in keys]
+        if keys:
+            commands.append(("SREM", self._customer(customer_id), *keys))
+        commands.extend(("DEL", name) for name in extra_deletes)
+        replies = self._check(self._client.pipeline(commands))
+        return sum(replies[: len(keys)])
+
+    def invalidate_customer(self, customer_id: str) -> int:
+        keys = self._client.execute("SMEMBERS", self._customer(customer_id))
+        return self._drop(customer_id, keys, [self._customer(customer_id)])
+
+    def invalidate_tags(self, customer_id: str, tags: Iterable[str]) -> int:
+        names = [self._tag(customer_id, tag) for tag in tags]
+        if not names:
+            return 0
+        keys = self._client.execute("SUNION", *names)
+        return self._drop(customer_id, keys, names)
+
+    @staticmethod
+    def _check(replies):
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def close(self):
+        self._client.close()
+
+
+class TieredBackend(CacheBackend):
+    """Per-process L1 LRU in front of a restart-surviving SQLite L2.
+
+    Not ``shared``: another worker's invalidation reaches the L2 but not this
+    worker's L1, so each worker still invalidates on index version changes.
+    """
+
+    blocking = True
+
+    def __init__(self, l1: MemoryBackend, l2: SQLiteBackend):
+        self.l1 = l1
+        self.l2 = l2
+        self.l2_hits = 0
+
+    def __len__(self) -> int:
+        return len(self.l1)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        entry = self.l1.get(key)
+        if entry is not None:
+            return entry
+        entry = self.l2.get(key)
+        if entry is not None:
+            self.l2_hits += 1
+            customer_id = key.split(":", 1)[0]
+            self.l1.set(customer_id, key, entry[0], self.l2.tags_for(key), 0, stored_at=entry[1])
+        return entry
+
+    def set(self, customer_id: str, key: str, data: Any, tags: Set[str], ttl: float):
+        self.l1.set(customer_id, key, data, tags, ttl)
+        try:
+            self.l2.set(customer_id, key, data, tags, ttl)
+        except sqlite3.Error as e:
+            logger.warning(f"QUERY_CACHE_L2_ERROR | op=set | error={e}")
+
+    def delete(self, key: str):
+        self.l1.delete(key)
+        self.l2.delete(key)
+
+    def invalidate_customer(self, customer_id: str) -> int:
+        return max(self.l1.invalidate_customer(customer_id), self.l2.invalidate_customer(customer_id))
+
+    def invalidate_tags(self, customer_id: str, tags: Iterable[str]) -> int:
+        tags = list(tags)
+        return max(self.l1.invalidate_tags(customer_id, tags), self.l2.invalidate_tags(customer_id, tags))
+
+    def occupancy(self) -> Dict[str, Dict[str, Any]]:
+        return self.l1.occupancy()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.l1.stats(), "l2_hits": self.l2_hits}
+
+    def warm(self, limit: int, newer_than: float) -> int:
+        """Load the L2's most recently used live entries into L1. Returns how many."""
+        entries = self.l2.recent(limit, newer_than)
+        # Oldest first, so the most recently used end up at the LRU's hot end
+        for key, customer_id, data, ts, tags in reversed(entries):
+            self.l1.set(customer_id, key, data, tags, 0, stored_at=ts)
+        return len(entries)
+
+    def close(self):
+        self.l2.close()
+
+
+def create_memory_backend(max_size: int = 500) -> MemoryBackend:
+    """MemoryBackend sized by the RAG_QUERY_CACHE_BUDGET_MB / _TENANT_* / _COMPRESS_* settings."""
+    return MemoryBackend(
+        max_size,
+        budget_bytes=int(QUERY_CACHE_BUDGET_MB * 1024 * 1024),
+        tenant_share=QUERY_CACHE_TENANT_SHARE,
+        tenant_weights=parse_weights(QUERY_CACHE_TENANT_WEIGHTS),
+        compress_min_bytes=QUERY_CACHE_COMPRESS_MIN_BYTES,
+    )
+
+
+def create_backend(kind: str = QUERY_CACHE_BACKEND, max_size: int = 500) -> CacheBackend:
+    if kind == "memory":
+        if QUERY_CACHE_L2_PATH:
+            return TieredBackend(create_memory_backend(max_size), SQLiteBackend(QUERY_CACHE_L2_PATH, max_size * 4))
+        return create_memory_backend(max_size)
+    if kind == "sqlite":
+        return SQLiteBackend(QUERY_CACHE_PATH, max_size)
+    if kind == "redis":
+        return RedisBackend(QUERY_CACHE_REDIS_URL)
+    raise ValueError(f"Unknown query cache backend: {kind}")
+
+
+class QueryCache:
+    """LRU cache for RAG query results with TTL, over a pluggable backend.
+
+    Entries may carry dependency tags (source documents, leaf nodes, query
+    terms). Backends keep per-customer key sets and tag indexes so
+    invalidation is proportional to the entries affected, not the cache size.
+    With ``stale_seconds`` set, ``lookup`` keeps returning an expired answer
+    for that long, flagged stale, so the caller can refresh it off the
+    request path.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 500,
+        ttl_seconds: int = 300,
+        backend: Optional[CacheBackend] = None,
+        stale_seconds: float = 0,
+    ):
+        self._max_size = max(1, max_size)
+        self._ttl = ttl_seconds
+        self._stale = max(0.0, stale_seconds)
+        self._cache = backend if backend is not None else MemoryBackend(self._max_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0, "warmed": 0}
+
+    @property
+    def shared(self) -> bool:
+        return self._cache.shared
+
+    def _make_key(self, customer_id: str, query: str, mode: str = "") -> str:
+        # The same question answered by different retrieval modes is a different answer
+        normalized = query.strip().lower()
+        if mode:
+            normalized = f"{mode}\n{normalized}"
+        query_hash = hashlib.sha256(normalized.encode()).hexdigest()
+        return f"{customer_id}:{query_hash}"
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def _backend_error(self, op: str, error: Exception):
+        logger.warning(f"QUERY_CACHE_BACKEND_ERROR | backend={type(self._cache).__name__} | op={op} | error={error}")
+
+    def _read(self, key: str) -> Optional[Tuple[Any, float]]:
+        try:
+            return self._cache.get(key)
+        except BACKEND_ERRORS as e:
+            self._backend_error("get", e)
+            return None
+
+    def _delete(self, key: str):
+        try:
+            self._cache.delete(key)
+        except BACKEND_ERRORS as e:
+            self._backend_error("delete", e)
+
+    def lookup(self, customer_id: str, query: str, mode: str = "") -> Tuple[Optional[dict], bool]:
+        """(answer, is_stale) for a query, counting hits/stale hits/misses; (None, False) on a miss.
+
+        Backend failures count as misses.
+        """
+        key = self._make_key(customer_id, query, mode)
+        entry = self._read(key)
+        if entry is not None:
+            data, stored_at = entry
+            age = time.time() - stored_at
+            if age < self._ttl:
+                self._count("hits")
+                logger.info(f"CACHE_HIT | customer={customer_id}")
+                return data, False
+            if age < self._ttl + self._stale:
+                self._count("stale_hits")
+                logger.info(f"CACHE_STALE_HIT | customer={customer_id} | age={age:.0f}s")
+                return data, True
+            self._delete(key)
+        self._count("misses")
+        return None, False
+
+    def get(self, customer_id: str, query: str, mode: str = "") -> Optional[dict]:
+        """Fresh answer for a query, or None. Does not touch the hit counters."""
+        key = self._make_key(customer_id, query, mode)
+        entry = self._read(key)
+        if entry is None:
+            return None
+        data, stored_at = entry
+        if time.time() - stored_at < self._ttl:
+            return data
+        if time.time() - stored_at >= self._ttl + self._stale:
+            self._delete(key)
+        return None
+
+    def set(self, customer_id: str, query: str, data: dict, tags: Iterable[str] = (), mode: str = ""):
+        # Entries are retained through the stale window; lookup decides freshness
+        key = self._make_key(customer_id, query, mode)
+        try:
+            self._cache.set(customer_id, key, data, set(tags), self._ttl + self._stale)
+        except BACKEND_ERRORS as e:
+            self._backend_error("set", e)
+
+    async def offload(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run ``fn`` (which reads or writes this cache) in a worker thread if the backend blocks."""
+        if self._cache.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def alookup(self, customer_id: str, query: str, mode: str = "") -> Tuple[Optional[dict], bool]:
+        return await self.offload(self.lookup, customer_id, query, mode)
+
+    async def aset(self, customer_id: str, query: str, data: dict, tags: Iterable[str] = (), mode: str = ""):
+        await self.offload(self.set, customer_id, query, data, tags, mode)
+
+    def record_refresh(self, ok: bool):
+        self._count("refreshes" if ok else "refresh_errors")
+
+    def warm(self) -> int:
+        """Fill the in-memory tier from the on-disk L2, if there is one."""
+        warm = getattr(self._cache, "warm", None)
+        if warm is None:
+            return 0
+        try:
+            warmed = warm(self._max_size, time.time() - self._ttl - self._stale)
+        except sqlite3.Error as e:
+            logger.warning(f"QUERY_CACHE_WARM_ERROR | error={e}")
+            return 0
+        with self._stats_lock:
+            self._stats["warmed"] += warmed
+        return warmed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 4) if lookups else 0.0
+        backend_stats = getattr(self._cache, "stats", None)
+        if backend_stats is not None:
+            stats.update(backend_stats())
+        stats.setdefault("l2_hits", 0)
+        stats["backend"] = type(self._cache).__name__
+        return stats
+
+    def occupancy(self, customer_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Per-tenant entries/bytes in the in-memory tier (only ``customer_id``'s, when given)."""
+        occupancy = getattr(self._cache, "occupancy", None)
+        tenants = occupancy() if occupancy is not None else {}
+        if customer_id is not None:
+            return {customer_id: tenants.get(customer_id, {"entries": 0, "bytes": 0})}
+        return tenants
+
+    def invalidate_customer(self, customer_id: str):
+        try:
+            removed = self._cache.invalidate_customer(customer_id)
+        except BACKEND_ERRORS as e:
+            # Nothing more to do than let the tenant's entries age out by TTL
+            logger.error(f"QUERY_CACHE_INVALIDATE_ERROR | customer={customer_id} | error={e}")
+            return
+        if removed:
+            logger.info(f"CACHE_INVALIDATE | customer={customer_id} | entries={removed}")
+
+    def invalidate_tags(self, customer_id: str, tags: Iterable[str]) -> int:
+        """Drop the customer's entries carrying any of ``tags``. Returns how many were dropped."""
+        try:
+            removed = self._cache.invalidate_tags(customer_id, tags)
+        except BACKEND_ERRORS as e:
+            logger.error(f"QUERY_CACHE_INVALIDATE_ERROR | customer={customer_id} | error={e}")
+            return 0
+        if removed:
+            logger.info(f"CACHE_INVALIDATE_TAGS | customer={customer_id} | entries={removed}")
+        return removed
+
+    def invalidate_documents(self, customer_id: str, sources: Iterable[str]) -> int:
+        """Drop answers derived from any of the given source documents."""
+        return self.invalidate_tags(customer_id, (doc_tag(source) for source in sources))
+
+
+def create_query_cache(max_size: int = 500, ttl_seconds: int = 300) -> QueryCache:
+    """QueryCache on the backend selected by RAG_QUERY_CACHE_BACKEND, warmed from its L2 tier."""
+    backend = create_backend(QUERY_CACHE_BACKEND, max_size)
+    cache = QueryCache(max_size, ttl_seconds, backend, stale_seconds=QUERY_CACHE_STALE_SECONDS)
+    warmed = cache.warm()
+    logger.info(f"QUERY_CACHE | backend={type(backend).__name__} | stale={QUERY_CACHE_STALE_SECONDS}s | warmed={warmed}")
+    return cache
@@ -2,20 +2,31 @@
 
 Phase 3: Hierarchical Document Structuring for long aviation RFP analysis.
 """
-import hashlib
+import asyncio
+import json
 import logging
 import os
 import threading
 import time
-from collections import OrderedDict
-from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
 
 from llama_index.core import Document, TreeIndex, Settings
 from llama_index.core.node_parser import MarkdownNodeParser
 from llama_index.llms.azure_openai import AzureOpenAI
 from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
 
+from services.bm25 import BM25_ARTIFACT, BM25Index, tokenize
+from services.index_store import INDEX_MEMORY_FACTOR, IndexMemoryCache, IndexStore
+from services.llm_cache import LLM_CACHE_ENABLED, CachingLLM, LLMCache, llm_endpoint
 from services.pii_masker import mask_pii
+from services.query_cache import QueryCache, create_query_cache, doc_tag  # noqa: F401 (QueryCache re-exported)
+from services.retrieval_cache import RETRIEVAL_CACHE_ENABLED, RetrievalCache
+from services.semantic_cache import SEMANTIC_CACHE_ENABLED, SemanticCache, SemanticHit
+from services.singleflight import SingleFlight
+from services.traversal_memo import TRAVERSAL_MEMO_ENABLED, TraversalMemo
+from services.tree_builder import abuild_tree_index, ainsert_nodes
+from services.vector_index import VectorIndex
 
 logger = logging.getLogger("avicon.rag")
 
@@ -28,6 +39,16 @@ def _configure_llama_index():
     if getattr(Settings, "_avicon_configured", False):
         return
 
+    # NOTE: lazy import — the stand-ins subclass llama_index's LLM and BaseEmbedding
+    from services import simulated_providers as simulated
+
+    if simulated.SIMULATED_PROVIDERS:
+        Settings.llm = simulated.SimulatedLLM()
+        Settings.embed_model = _cached_embed_model(simulated.SimulatedEmbedding())
+        Settings._avicon_configured = True
+        logger.info("SIMULATED_PROVIDERS | llm and embeddings are offline stand-ins")
+        return
+
     Settings.llm = AzureOpenAI(
         model="gpt-4o",
         deployment_name=os.environ.get("AZURE_OPENAI_DEPLOYMENT", "gpt-4o"),
@@ -36,103 +57,387 @@ def _configure_llama_index():
         api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
         temperature=0.1
     )
-    
-    Settings.embed_model = AzureOpenAIEmbedding(
+    if simulated.SIMULATED_RECORD:
+        Settings.llm = simulated.RecordingLLM(Settings.llm, simulated.get_cassette(simulated.SIMULATED_RECORD))
+
+    embed_model = AzureOpenAIEmbedding(
         model="text-embedding-ada-002",
         deployment_name=os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-ada-002"),
         api_key=os.environ.get("AZURE_OPENAI_API_KEY"),
         azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT"),
         api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
     )
-    
+    Settings.embed_model = _cached_embed_model(embed_model)
+
     Settings._avicon_configured = True
 
 
-# ──────────────────────────────────────────────────
-# LRU Cache for query results (thread-safe)
-# ──────────────────────────────────────────────────
-class QueryCache:
-    """Thread-safe LRU cache for RAG query results with TTL."""
-
-    def __init__(self, max_size: int = 500, ttl_seconds: int = 300):
-        self._cache: OrderedDict[str, dict] = OrderedDict()
-        self._max_size = max(1, max_size)
-        self._ttl = ttl_seconds
-        self._lock = threading.Lock()
-
-    def _make_key(self, customer_id: str, query: str) -> str:
-        query_hash = hashlib.sha256(query.strip().lower().encode()).hexdigest()
-        return f"{customer_id}:{query_hash}"
-
-    def get(self, customer_id: str, query: str) -> Optional[dict]:
-        key = self._make_key(customer_id, query)
-        with self._lock:
-            if key in self._cache:
-                entry = self._cache[key]
-                if time.time() - entry["ts"] < self._ttl:
-                    self._cache.move_to_end(key)
-                    logger.info(f"CACHE_HIT | customer={customer_id}")
-                    return entry["data"]
-                else:
-                    del self._cache[key]
-        return None
+# Content-hash -> vector store behind the embedding model (opened on configure)
+_embedding_store: Optional[Any] = None
+
+
+def _cached_embed_model(embed_model: Any) -> Any:
+    """Put the embedding model behind the persistent vector cache, when enabled."""
+    global _embedding_store
+    # NOTE: lazy import — the cache subclasses llama_index's BaseEmbedding
+    from services.embedding_cache import (
+        EMBED_CACHE_ENABLED,
+        CachedEmbedding,
+        EmbeddingStore,
+    )
+
+    if not EMBED_CACHE_ENABLED:
+        return embed_model
+    if _embedding_store is None:
+        _embedding_store = EmbeddingStore()
+    return CachedEmbedding(embed_model, _embedding_store)
 
-    def set(self, customer_id: str, query: str, data: dict):
-        key = self._make_key(customer_id, query)
-        with self._lock:
-            if key in self._cache:
-                self._cache.move_to_end(key)
-            elif len(self._cache) >= self._max_size:
-                self._cache.popitem(last=False)
-            self._cache[key] = {"data": data, "ts": time.time()}
 
-    def invalidate_customer(self, customer_id: str):
-        prefix = f"{customer_id}:"
-        with self._lock:
-            keys_to_remove = [k for k in self._cache.keys() if k.startswith(prefix)]
-            for key in keys_to_remove:
-                del self._cache[key]
-        if keys_to_remove:
-            logger.info(f"CACHE_INVALIDATE | customer={customer_id} | entries={len(keys_to_remove)}")
+def get_embedding_cache_metrics() -> Dict[str, Any]:
+    """Embedding cache hits, misses and remote batches sent for this worker."""
+    return _embedding_store.stats() if _embedding_store is not None else {}
 
 
-_query_cache = QueryCache(max_size=500, ttl_seconds=300)
+# ──────────────────────────────────────────────────
+# Query result cache (backend chosen by RAG_QUERY_CACHE_BACKEND)
+# ──────────────────────────────────────────────────
+def _answer_tags(masked_query: str, nodes: List[Any]) -> Set[str]:
+    """What a cached answer depends on: its source documents, leaves and query terms."""
+    tags = {f"term:{term}" for term in tokenize(masked_query)}
+    for n in nodes:
+        tags.add(f"node:{n.node.node_id}")
+        tags.add(doc_tag(n.node.metadata.get("source", "unknown")))
+    return tags
+
+
+_query_cache = create_query_cache(max_size=500, ttl_seconds=300)
+# Rephrasings of cached questions resolve to the same exact-cache entry
+_semantic_cache = SemanticCache(ttl_seconds=300)
+# Leaves retrieved per (query, index version): answer misses re-run synthesis only
+_retrieval_cache = RetrievalCache()
+# Upper-level branch choices per (index version, candidates, query embedding bucket)
+_traversal_memo = TraversalMemo()
 
 
 # ──────────────────────────────────────────────────
-# In-Memory Customer Document Stores (For Tree RAG)
+# Customer Document Stores (For Tree RAG)
 # ──────────────────────────────────────────────────
-# Given the move from Pinecone to Tree structured JSON, we temporarily store trees in memory per-customer.
-# In a robust production environment, this would be serialized to Redis or LlamaCloud.
-_customer_indexes: Dict[str, TreeIndex] = {}
+# Trees are persisted to disk as versioned snapshots after every build and held
+# in a memory-budgeted LRU per worker. A restarted worker loads them lazily,
+# other gunicorn workers notice a newer version stamp and reload instead of
+# rebuilding, and cold tenants are evicted back to their on-disk snapshot.
+INDEX_MEMORY_BUDGET = int(float(os.environ.get("RAG_INDEX_MEMORY_BUDGET_MB", "1024")) * 1024 * 1024)
+
+# How often (seconds) a worker re-reads a tenant's on-disk version stamp
+VERSION_CHECK_INTERVAL = float(os.environ.get("RAG_INDEX_VERSION_CHECK_SECONDS", "1.0"))
+
+_index_cache = IndexMemoryCache(budget_bytes=INDEX_MEMORY_BUDGET)
 _index_lock = threading.Lock()
+_build_locks: Dict[str, threading.Lock] = {}
+# One snapshot/artifact load at a time per tenant (a build holds its lock for minutes)
+_load_locks: Dict[str, threading.Lock] = {}
+_build_metrics: Dict[str, Dict[str, Any]] = {}
+_index_store = IndexStore()
+
+
+# Completion cache shared by every _get_llm() caller (opened on first use)
+_llm_cache: Optional[LLMCache] = None
+_caching_llm: Optional[CachingLLM] = None
+_llm_lock = threading.Lock()
 
-def _get_customer_index(customer_id: str) -> Optional[TreeIndex]:
-    with _index_lock:
-        return _customer_indexes.get(customer_id)
 
 def _get_llm():
-    """Return the configured Azure OpenAI LLM instance for direct prompting."""
+    """Return the configured Azure OpenAI LLM for direct prompting, behind the completion cache."""
+    global _llm_cache, _caching_llm
     _configure_llama_index()
-    return Settings.llm
+    if not LLM_CACHE_ENABLED:
+        return Settings.llm
+    with _llm_lock:
+        if _caching_llm is None or _caching_llm.wrapped is not Settings.llm:
+            if _llm_cache is None:
+                _llm_cache = LLMCache()
+            _caching_llm = CachingLLM(Settings.llm, _llm_cache)
+        return _caching_llm
+
+
+def get_llm_cache_metrics() -> Dict[str, Any]:
+    """Completion cache hit rate and tokens saved, per endpoint."""
+    if _llm_cache is None:
+        return {"entries": 0, "tokens_saved": 0, "endpoints": {}}
+    return _llm_cache.stats()
+
+
+def _sync_index_version(customer_id: str):
+    """Drop this worker's copy of a tenant's index if another worker published a newer one.
+
+    The version stamp is re-read at most every VERSION_CHECK_INTERVAL seconds.
+    With a per-process answer cache, only the answers the upload could affect
+    are invalidated if the new snapshot was built directly on ours; otherwise
+    all of the tenant's are. A shared cache was invalidated by the publisher.
+    """
+    due, local_version = _index_cache.claim_version_check(customer_id, VERSION_CHECK_INTERVAL)
+    if due:
+        _reconcile_index_version(customer_id, local_version)
+
+
+async def _async_index_version(customer_id: str):
+    """Async form of ``_sync_index_version`` for request paths.
+
+    The rate-limit check stays on the loop; a due check reads CURRENT (and
+    possibly the changes artifact) from disk in a worker thread.
+    """
+    due, local_version = _index_cache.claim_version_check(customer_id, VERSION_CHECK_INTERVAL)
+    if due:
+        await asyncio.to_thread(_reconcile_index_version, customer_id, local_version)
+
+
+def _reconcile_index_version(customer_id: str, local_version: Optional[str]):
+    """Blocking part of the version check: compare with CURRENT and invalidate on change."""
+    disk_version = _index_store.current_version(customer_id)
+    if disk_version == local_version:
+        return
+
+    _index_cache.pop(customer_id, version=local_version)
+    if _query_cache.shared:
+        # The publishing worker already invalidated the shared cache
+        logger.info(f"INDEX_STALE | customer={customer_id} | local={local_version} | disk={disk_version}")
+        return
+    data = _index_store.read_artifact(customer_id, disk_version, CHANGES_ARTIFACT) if disk_version else None
+    changes = json.loads(data) if data else None
+    if changes is not None and local_version is not None and changes["base"] == local_version:
+        _invalidate_changes(customer_id, changes)
+    else:
+        _query_cache.invalidate_customer(customer_id)
+        _semantic_cache.invalidate_customer(customer_id)
+    logger.info(f"INDEX_STALE | customer={customer_id} | local={local_version} | disk={disk_version}")
+
+
+def _load_lock(customer_id: str) -> threading.Lock:
+    with _index_lock:
+        return _load_locks.setdefault(customer_id, threading.Lock())
+
+
+def _load_customer_entry(customer_id: str) -> Optional[Dict[str, Any]]:
+    """Load the tenant's persisted snapshot into the cache (blocking; one loader per tenant)."""
+    with _load_lock(customer_id):
+        # A concurrent query may have loaded it while this one waited
+        entry = _index_cache.get(customer_id)
+        if entry is not None:
+            return entry
+        _configure_llama_index()
+        index, version = _index_store.load_versioned(customer_id)
+        if index is None:
+            return None
+        _set_customer_index(customer_id, index, version)
+        # A tiny budget may evict the entry straight away; still serve this query
+        return _index_cache.peek(customer_id) or {"index": index, "version": version, "extras": {}}
+
+
+def _get_customer_entry(customer_id: str) -> Optional[Dict[str, Any]]:
+    """Cache entry (index, version, extras) for the customer, loading it if needed."""
+    _sync_index_version(customer_id)
+    entry = _index_cache.get(customer_id)
+    if entry is not None:
+        return entry
+    return _load_customer_entry(customer_id)
+
+
+async def _aget_customer_entry(customer_id: str) -> Optional[Dict[str, Any]]:
+    """Async form of ``_get_customer_entry`` for request paths.
+
+    A cold worker or evicted tenant loads and deserializes the snapshot in a
+    worker thread, so the loop keeps serving other requests; concurrent
+    queries for the same tenant wait on that one load.
+    """
+    await _async_index_version(customer_id)
+    entry = _index_cache.get(customer_id)
+    if entry is not None:
+        return entry
+    return await asyncio.to_thread(_load_customer_entry, customer_id)
 
 
 def _get_customer_index(customer_id: str) -> Optional[TreeIndex]:
+    entry = _get_customer_entry(customer_id)
+    return entry["index"] if entry is not None else None
+
+
+def _resident_bytes(serialized_bytes: int) -> int:
+    """Estimated RAM for a structure deserialized from ``serialized_bytes`` of JSON."""
+    return int(serialized_bytes * INDEX_MEMORY_FACTOR)
+
+
+def _set_customer_index(
+    customer_id: str,
+    index: TreeIndex,
+    version: Optional[str] = None,
+    extras: Optional[Dict[str, Any]] = None,
+    extras_bytes: int = 0,
+):
+    """Cache a loaded index, charged for its deserialized JSON plus ``extras_bytes``.
+
+    Memory-mapped artifacts (vectors) are not charged; BM25 is charged when it
+    is loaded (``extras_bytes`` when it arrives with the index).
+    """
+    size = _index_store.index_bytes(customer_id, version) if version else 0
+    _index_cache.put(customer_id, index, version, _resident_bytes(size) + extras_bytes, extras)
+
+
+def _get_lexical_index(customer_id: str, entry: Dict[str, Any]) -> BM25Index:
+    """The tenant's BM25 index for this snapshot, read from disk or rebuilt for older snapshots."""
+    bm25 = entry["extras"].get("bm25")
+    if bm25 is None:
+        with _load_lock(customer_id):
+            bm25 = entry["extras"].get("bm25")
+            if bm25 is None:
+                data = _index_store.read_artifact(customer_id, entry["version"], BM25_ARTIFACT) if entry["version"] else None
+                bm25 = BM25Index.from_bytes(data) if data else BM25Index.from_index(entry["index"])
+                entry["extras"]["bm25"] = bm25
+                _index_cache.charge(customer_id, entry["version"], _resident_bytes(len(data or bm25.to_bytes())))
+    return bm25
+
+
+async def _aget_lexical_index(customer_id: str, entry: Dict[str, Any]) -> BM25Index:
+    """Async form of ``_get_lexical_index``: the JSON parse or rebuild runs in a worker thread."""
+    bm25 = entry["extras"].get("bm25")
+    if bm25 is None:
+        bm25 = await asyncio.to_thread(_get_lexical_index, customer_id, entry)
+    return bm25
+
+
+def _embed_texts(texts: List[str]) -> List[List[float]]:
+    return Settings.embed_model.get_text_embedding_batch(texts)
+
+
+def _get_vector_index(customer_id: str, entry: Dict[str, Any]) -> VectorIndex:
+    """The tenant's leaf embeddings for this snapshot, memory-mapped or embedded for older snapshots.
+
+    Blocking: a backfill runs under the tenant's build lock, so concurrent
+    queries embed the leaves once and never alongside an upload's build.
+    """
+    vectors = entry["extras"].get("vectors")
+    if vectors is not None:
+        return vectors
+    if entry["version"]:
+        vectors = VectorIndex.load(_index_store.snapshot_dir(customer_id, entry["version"]))
+    if vectors is None:
+        with _build_lock(customer_id):
+            # Another query may have backfilled this entry while we waited
+            vectors = entry["extras"].get("vectors")
+            if vectors is None:
+                logger.info(f"VECTOR_BACKFILL | customer={customer_id} | version={entry['version']}")
+                vectors = VectorIndex.from_index(entry["index"], _embed_texts)
+    entry["extras"]["vectors"] = vectors
+    return vectors
+
+
+async def _abuild_vector_index(
+    customer_id: str, index: TreeIndex, previous_version: Optional[str]
+) -> Optional[VectorIndex]:
+    """Embed the leaves of a new snapshot, reusing rows from the previous one.
+
+    Embedding failures never fail the upload: the snapshot is persisted
+    without vectors and they are backfilled by the first vector query.
+    """
+    try:
+        previous = None
+        if previous_version:
+            previous = await asyncio.to_thread(
+                VectorIndex.load, _index_store.snapshot_dir(customer_id, previous_version)
+            )
+        return await asyncio.to_thread(VectorIndex.from_index, index, _embed_texts, previous)
+    except Exception as e:
+        logger.warning(f"VECTOR_BUILD_ERROR | customer={customer_id} | error={e}")
+        return None
+
+
+@contextmanager
+def _build_lock(customer_id: str) -> Iterator[None]:
+    """Serialize index builds for a customer across threads and worker processes."""
     with _index_lock:
-        return _customer_indexes.get(customer_id)
+        thread_lock = _build_locks.setdefault(customer_id, threading.Lock())
+    with thread_lock, _index_store.lock(customer_id):
+        yield
+
+
+@asynccontextmanager
+async def _abuild_lock(customer_id: str):
+    """Async form of ``_build_lock`` — waits for the lock without blocking the loop."""
+    lock = _build_lock(customer_id)
+    acquiring = asyncio.ensure_future(asyncio.to_thread(lock.__enter__))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # The thread still takes the lock; hand it straight back once it does
+        acquiring.add_done_callback(lambda f: f.exception() is None and lock.__exit__(None, None, None))
+        raise
+    try:
+        yield
+    finally:
+        lock.__exit__(None, None, None)
+
+
+def _record_build_metrics(customer_id: str, inserted: int, levels: List[Dict[str, Any]], seconds: float):
+    with _index_lock:
+        _build_metrics[customer_id] = {
+            "inserted": inserted,
+            "seconds": round(seconds, 3),
+            "summaries": sum(level["summaries"] for level in levels),
+            "retries": sum(level["retries"] for level in levels),
+            "levels": levels,
+        }
+    logger.info(
+        f"TREE_BUILD | customer={customer_id} | inserted={inserted} | levels={len(levels)} | seconds={seconds:.3f}"
+    )
 
-def _set_customer_index(customer_id: str, index: TreeIndex):
+
+def get_tree_build_metrics(customer_id: str) -> Dict[str, Any]:
+    """Per-level timings of this worker's most recent tree build for the customer."""
     with _index_lock:
-        _customer_indexes[customer_id] = index
+        return dict(_build_metrics.get(customer_id, {}))
+
+
+def get_index_memory_metrics(customer_id: Optional[str] = None) -> Dict[str, Any]:
+    """Index memory accounting for this worker.
+
+    With a customer_id, only that tenant's footprint is included so tenants
+    cannot see each other's ids; without one, every resident tenant is listed.
+    """
+    metrics = _index_cache.stats()
+    if customer_id is None:
+        metrics["tenant_bytes"] = _index_cache.report()
+    else:
+        metrics["tenant_bytes"] = {customer_id: _index_cache.tenant_bytes(customer_id)}
+    return metrics
 
 
 # ──────────────────────────────────────────────────
 # Document Processing (sync — called by upload endpoint)
 # ──────────────────────────────────────────────────
-def process_and_store_documents(documents: List[Any], customer_id: str) -> int:
-    """Take raw texts, cast them to LlamaIndex Documents, and build a TreeIndex."""
-    _configure_llama_index()
-    
+# Per-snapshot record of what the upload changed, for targeted cache invalidation
+CHANGES_ARTIFACT = "changes.json"
+
+
+def _describe_changes(nodes: List[Any], base_version: Optional[str]) -> Dict[str, Any]:
+    """Sources and vocabulary of newly inserted nodes, relative to ``base_version``."""
+    terms: Set[str] = set()
+    for node in nodes:
+        terms.update(tokenize(node.get_content()))
+    return {
+        "base": base_version,
+        "documents": sorted({node.metadata.get("source", "unknown") for node in nodes}),
+        "terms": sorted(terms),
+    }
+
+
+def _invalidate_changes(customer_id: str, changes: Dict[str, Any]) -> int:
+    """Drop cached answers that depend on changed documents or share terms with new content."""
+    tags = [doc_tag(source) for source in changes["documents"]]
+    tags.extend(f"term:{term}" for term in changes["terms"])
+    return _query_cache.invalidate_tags(customer_id, tags)
+
+
+def _to_nodes(documents: List[Any], customer_id: str) -> List[Any]:
+    """Cast parsed documents to LlamaIndex Documents and split them into nodes."""
     # 1. Convert incoming documents (from Langchain format parser) to LlamaIndex Docs
     llama_docs = []
     for d in documents:
@@ -144,19 +449,76 @@ def process_and_store_documents(documents: List[Any], customer_id: str) -> int:
 
     # 2. Node Parsing (Hierarchical extraction rather than flat char chunking)
     parser = MarkdownNodeParser()
-    nodes = parser.get_nodes_from_documents(llama_docs)
-    
+    return parser.get_nodes_from_documents(llama_docs)
+
+
+async def aprocess_and_store_documents(documents: List[Any], customer_id: str) -> int:
+    """Take raw texts, cast them to LlamaIndex Documents, and add them to the customer's TreeIndex.
+
+    The first upload builds the tree; later uploads are inserted incrementally.
+    Summaries are generated concurrently on the running event loop; blocking
+    steps (parsing, locking, snapshot load/persist) run in worker threads.
+    Returns the number of new nodes stored.
+    """
+    _configure_llama_index()
+
+    nodes = await asyncio.to_thread(_to_nodes, documents, customer_id)
+
     # 3. Build Vectorless Tree (Summary-based parent-child traversal)
-    # The TreeIndex uses the LLM to summarize nodes and build a navigation tree
-    logger.info(f"BUILDING_TREE | customer={customer_id} | nodes={len(nodes)}")
-    index = TreeIndex(nodes)
-    
-    _set_customer_index(customer_id, index)
-    
-    # Invalidate query cache for this customer after new documents
-    _query_cache.invalidate_customer(customer_id)
+    # The TreeIndex uses the LLM to summarize nodes and build a navigation tree.
+    # Uploads are serialized per customer (across workers too) so concurrent
+    # ingests cannot drop each other's nodes.
+    levels: List[Dict[str, Any]] = []
+    new_nodes: List[Any] = []
+    started = time.perf_counter()
+    async with _abuild_lock(customer_id):
+        # Insert into a private copy of the persisted tree so in-flight queries
+        # never observe a half-updated index; the copy is swapped in when done.
+        index, previous_version = await asyncio.to_thread(_index_store.load_versioned, customer_id)
+        with llm_endpoint("tree_build"):
+            if index is None:
+                logger.info(f"BUILDING_TREE | customer={customer_id} | nodes={len(nodes)}")
+                index = await abuild_tree_index(nodes, llm=_get_llm(), metrics=levels)
+                new_nodes.extend(nodes)
+                inserted = len(nodes)
+            else:
+                logger.info(f"INSERTING_TREE | customer={customer_id} | nodes={len(nodes)}")
+                inserted = await ainsert_nodes(
+                    index, nodes, metrics=levels, llm=_get_llm(), inserted=new_nodes
+                )
+
+        if not inserted:
+            # Nothing new (e.g. a re-upload): keep the current version, its
+            # caches and the tenant's cached answers exactly as they are.
+            _record_build_metrics(customer_id, inserted, levels, time.perf_counter() - started)
+            return inserted
+
+        # Lexical and embedding indexes over all leaves, shipped inside the same snapshot
+        bm25 = await asyncio.to_thread(BM25Index.from_index, index)
+        artifacts = {BM25_ARTIFACT: bm25.to_bytes()}
+        extras: Dict[str, Any] = {"bm25": bm25}
+        vectors = await _abuild_vector_index(customer_id, index, previous_version)
+        if vectors is not None:
+            artifacts.update(vectors.to_artifacts())
+        changes = await asyncio.to_thread(_describe_changes, new_nodes, previous_version)
+        artifacts[CHANGES_ARTIFACT] = json.dumps(changes).encode()
+        version = await asyncio.to_thread(_index_store.persist, customer_id, index, artifacts)
+        _set_customer_index(
+            customer_id, index, version, extras=extras, extras_bytes=_resident_bytes(len(artifacts[BM25_ARTIFACT]))
+        )
+
+    _record_build_metrics(customer_id, inserted, levels, time.perf_counter() - started)
+
+    # Invalidate only the cached answers the new documents could affect;
+    # semantic matches onto dropped answers resolve as misses from now on.
+    await _query_cache.offload(_invalidate_changes, customer_id, changes)
+
+    return inserted
+
 
-    return len(nodes)
+def process_and_store_documents(documents: List[Any], customer_id: str) -> int:
+    """Synchronous wrapper around ``aprocess_and_store_documents`` for scripts."""
+    return asyncio.run(aprocess_and_store_documents(documents, customer_id))
 
 
 # ──────────────────────────────────────────────────
@@ -188,67 +550,460 @@ def _extract_sources(docs: Optional[list]) -> List[Dict[str, Any]]:
     return sources
 
 
+RAG_SYSTEM_PROMPT = (
+    "You are an enterprise AI assistant for the Avicon aviation procurement platform. "
+    "1. DEPENDENCY: Answer based ONLY on the provided context.\n"
+    "2. NO HALLUCINATION: Do not guess or extrapolate.\n"
+    "3. DEFINITION OF DONE: Your final answer must be a clear, actionable summary."
+)
+CHILD_BRANCH_FACTOR = 3
+NO_DOCUMENTS_RESPONSE = "I do not have any documents loaded in the system to answer your question."
+
+# Retrieval modes, selectable per request:
+#   tree    — LLM-guided select_leaf traversal (one LLM call per tree level)
+#   hybrid  — BM25 first: answer from the top-k leaves when the lexical match
+#             is confident, otherwise traverse only the subtrees holding hits
+#   lexical — always answer from the BM25 top-k leaves when there are hits
+#   vector  — answer from the cosine top-k leaf embeddings (no tree LLM calls)
+RETRIEVAL_MODES = ("tree", "hybrid", "lexical", "vector")
+DEFAULT_RETRIEVAL_MODE = os.environ.get("RAG_RETRIEVAL_MODE", "tree")
+LEXICAL_TOP_K = int(os.environ.get("RAG_LEXICAL_TOP_K", "5"))
+LEXICAL_CONFIDENCE = float(os.environ.get("RAG_LEXICAL_CONFIDENCE", "0.8"))
+VECTOR_TOP_K = int(os.environ.get("RAG_VECTOR_TOP_K", "5"))
+
+# Identical concurrent queries share one traversal (per worker event loop)
+_query_flights = SingleFlight()
+# Background refreshes of stale answers, by flight key (strong refs keep the tasks alive)
+_refresh_tasks: Dict[str, asyncio.Task] = {}
+
+_retrieval_lock = threading.Lock()
+_retrieval_stats: Dict[str, Any] = {"routes": {}, "selection_calls": 0}
+
+
+def get_query_coalescing_metrics() -> Dict[str, int]:
+    """Traversals executed vs. joined by duplicate in-flight queries."""
+    stats = _query_flights.stats()
+    stats["traversals_saved"] = stats["coalesced"]
+    return stats
+
+
+def get_query_cache_metrics(customer_id: Optional[str] = None) -> Dict[str, Any]:
+    """Exact-cache hits, stale hits, refreshes, byte budget and per-tenant occupancy.
+
+    As with index memory, a customer_id limits occupancy to that tenant.
+    """
+    stats = _query_cache.stats()
+    stats["refreshing"] = len(_refresh_tasks)
+    stats["tenants"] = _query_cache.occupancy(customer_id)
+    return stats
+
+
+def get_semantic_cache_metrics() -> Dict[str, Any]:
+    """Semantic cache hits, misses and audited false hits for this worker."""
+    return _semantic_cache.stats()
+
+
+def get_retrieval_metrics() -> Dict[str, Any]:
+    """Queries per retrieval route, LLM tree-selection calls made, the leaf cache and the traversal memo."""
+    with _retrieval_lock:
+        return {
+            "routes": dict(_retrieval_stats["routes"]),
+            "selection_calls": _retrieval_stats["selection_calls"],
+            "result_cache": _retrieval_cache.stats(),
+            "traversal_memo": _traversal_memo.stats(),
+        }
+
+
+def _record_retrieval(route: str, selection_calls: int):
+    with _retrieval_lock:
+        routes = _retrieval_stats["routes"]
+        routes[route] = routes.get(route, 0) + 1
+        _retrieval_stats["selection_calls"] += selection_calls
+
+
+def _scored_nodes(index: TreeIndex, hits: List[Any]) -> List[Any]:
+    from llama_index.core.schema import NodeWithScore
+
+    scores = dict(hits)
+    return [
+        NodeWithScore(node=node, score=scores[node.node_id])
+        for node in index.docstore.get_nodes(list(scores), raise_error=False) if node
+    ]
+
+
+# Traversal routes cost LLM calls and are worth remembering; the others are cheap
+_CACHED_ROUTES = ("tree", "pruned")
+
+
+def _remember_leaves(
+    customer_id: str, entry: Dict[str, Any], masked_query: str, mode: str,
+    nodes: List[Any], route: str, selection_calls: int,
+):
+    if RETRIEVAL_CACHE_ENABLED and route in _CACHED_ROUTES:
+        hits = [(n.node.node_id, n.score) for n in nodes]
+        _retrieval_cache.set(customer_id, entry["version"], mode, masked_query, hits, route, selection_calls)
+
+
+async def _plan_retrieval(
+    customer_id: str,
+    entry: Dict[str, Any],
+    masked_query: str,
+    mode: str,
+    on_level: Optional[Any] = None,
+    query_embedding: Optional[List[float]] = None,
+    reuse_leaves: bool = True,
+):
+    """Pick the leaves for a query, or a traversal to find them.
+
+    Returns (retriever, nodes, route). ``nodes`` is set when the leaves were
+    remembered from an earlier traversal of this index version, or chosen
+    lexically or by embedding, and no traversal is needed; otherwise the
+    retriever (possibly pruned to the subtrees of BM25 hits, replaying memoized
+    upper-level choices) must be run. ``reuse_leaves=False`` bypasses both.
+    """
+    # NOTE: lazy imports — keeps module import light for the unit-test mocks
+    from services.tree_retriever import ProgressTreeRetriever, ancestor_ids, parent_map
+
+    index = entry["index"]
+    if reuse_leaves and RETRIEVAL_CACHE_ENABLED:
+        cached = _retrieval_cache.get(customer_id, entry["version"], mode, masked_query)
+        if cached is not None:
+            nodes = _scored_nodes(index, cached.hits)
+            if len(nodes) == len(cached.hits):
+                return None, nodes, "cached"
+    allowed_ids = None
+    route = "tree"
+    if mode == "vector":
+        vectors = await asyncio.to_thread(_get_vector_index, customer_id, entry)
+        if query_embedding is None:
+            query_embedding = await Settings.embed_model.aget_query_embedding(masked_query)
+        if len(vectors) and vectors.dim == len(query_embedding):
+            hits = await asyncio.to_thread(vectors.search, query_embedding, VECTOR_TOP_K)
+            nodes = _scored_nodes(index, hits)
+            if nodes:
+                return None, nodes, "vector"
+        else:
+            # Empty tenant, or vectors from a different embedding model: traverse instead
+            logger.warning(f"VECTOR_UNAVAILABLE | customer={customer_id} | rows={len(vectors)} | dim={vectors.dim}")
+    elif mode in ("hybrid", "lexical"):
+        match = (await _aget_lexical_index(customer_id, entry)).match(masked_query, LEXICAL_TOP_K, LEXICAL_CONFIDENCE)
+        hit_ids = [node_id for node_id, _ in match.hits]
+        if hit_ids and (mode == "lexical" or match.is_confident(LEXICAL_CONFIDENCE, LEXICAL_TOP_K)):
+            nodes = _scored_nodes(index, match.hits)
+            if nodes:
+                return None, nodes, "lexical"
+        if hit_ids:
+            parents = entry["extras"].get("parents")
+            if parents is None:
+                parents = entry["extras"]["parents"] = parent_map(index.index_struct)
+            allowed_ids = ancestor_ids(parents, hit_ids)
+            route = "pruned"
+
+    memo_key = None
+    if reuse_leaves and TRAVERSAL_MEMO_ENABLED:
+        try:
+            if query_embedding is None:
+                query_embedding = await Settings.embed_model.aget_query_embedding(masked_query)
+            memo_key = (entry["version"], _traversal_memo.bucket(query_embedding))
+        except Exception as e:
+            logger.warning(f"TRAVERSAL_MEMO_EMBED_ERROR | customer={customer_id} | error={e}")
+
+    retriever = ProgressTreeRetriever(
+        index,
+        on_level=on_level,
+        allowed_ids=allowed_ids,
+        memo=_traversal_memo,
+        memo_key=memo_key,
+        child_branch_factor=CHILD_BRANCH_FACTOR,
+    )
+    return retriever, None, route
+
+
+def _synthesizer_engine(retriever: Any, streaming: bool = False):
+    from llama_index.core.query_engine import RetrieverQueryEngine
+
+    return RetrieverQueryEngine.from_args(
+        retriever,
+        llm=Settings.llm,
+        system_prompt=RAG_SYSTEM_PROMPT,
+        response_mode="tree_summarize",  # Aggregate leaf responses together effectively
+        streaming=streaming,
+    )
+
+
+async def _run_tree_query(
+    customer_id: str,
+    masked_query: str,
+    use_cache: bool,
+    mode: str,
+    query_embedding: Optional[List[float]] = None,
+    reuse_leaves: bool = True,
+) -> Optional[Dict[str, Any]]:
+    """Retrieve leaves and synthesize an answer for one masked query; None if no index.
+
+    ``reuse_leaves=False`` forces a real retrieval (semantic cache audits).
+    """
+    from llama_index.core.schema import QueryBundle
+
+    # RETRIEVE TREE INDEX (in-memory, or lazily loaded from disk)
+    entry = await _aget_customer_entry(customer_id)
+    if entry is None:
+        return None
+
+    # HIERARCHICAL REASONING ENGINE (Vectorless Traversal, optionally BM25-guided)
+    retriever, nodes, route = await _plan_retrieval(
+        customer_id, entry, masked_query, mode,
+        query_embedding=query_embedding, reuse_leaves=use_cache and reuse_leaves,
+    )
+    selection_calls = 0
+    if nodes is None:
+        # Traversal makes blocking LLM calls level by level; keep them off the loop
+        nodes = await asyncio.to_thread(retriever.retrieve, masked_query)
+        selection_calls = retriever.selection_calls
+    _record_retrieval(route, selection_calls)
+    if use_cache:
+        _remember_leaves(customer_id, entry, masked_query, mode, nodes, route, selection_calls)
+
+    query_engine = _synthesizer_engine(retriever)
+    response_obj = await query_engine.asynthesize(QueryBundle(masked_query), nodes)
+
+    result = {
+        "response": str(response_obj),
+        "sources": _extract_sources(getattr(response_obj, 'source_nodes', [])),
+        "cached": False,
+        "retrieval": {"mode": mode, "route": route, "selection_calls": selection_calls},
+        "node_ids": [n.node.node_id for n in nodes],
+    }
+
+    if use_cache:
+        # Cache hits stamp latency onto the stored dict; keep it apart from the shared result
+        await _query_cache.aset(customer_id, masked_query, dict(result), _answer_tags(masked_query, nodes), mode=mode)
+    return result
+
+
+async def _lookup_semantic(
+    customer_id: str, masked_query: str, mode: str
+) -> Tuple[Optional[SemanticHit], Optional[List[float]]]:
+    """Match an exact-cache miss against cached rephrasings. Returns (hit, query embedding)."""
+    if not SEMANTIC_CACHE_ENABLED:
+        return None, None
+    try:
+        embedding = await Settings.embed_model.aget_query_embedding(masked_query)
+    except Exception as e:
+        logger.warning(f"SEMANTIC_CACHE_EMBED_ERROR | customer={customer_id} | error={e}")
+        return None, None
+    hit = await _query_cache.offload(
+        _semantic_cache.lookup, customer_id, embedding, lambda q: _query_cache.get(customer_id, q, mode), mode
+    )
+    return hit, embedding
+
+
+def _schedule_refresh(customer_id: str, masked_query: str, mode: str):
+    """Re-run a query whose cached answer is stale, off the request path.
+
+    At most one refresh per query is scheduled; it shares the singleflight
+    key with foreground runs, so a concurrent miss joins it instead of
+    traversing twice.
+    """
+    flight_key = _query_cache._make_key(customer_id, masked_query, mode)
+    if flight_key in _refresh_tasks:
+        return
+
+    async def refresh():
+        try:
+            await _query_flights.do(flight_key, lambda: _run_tree_query(customer_id, masked_query, True, mode))
+            _query_cache.record_refresh(True)
+        except Exception as e:
+            _query_cache.record_refresh(False)
+            logger.warning(f"CACHE_REFRESH_ERROR | customer={customer_id} | error={e}")
+        finally:
+            _refresh_tasks.pop(flight_key, None)
+
+    _refresh_tasks[flight_key] = asyncio.create_task(refresh())
+
+
+async def _lookup_cached(customer_id: str, masked_query: str, mode: str) -> Optional[Dict[str, Any]]:
+    """Exact-cache answer, serving stale answers while a background refresh runs."""
+    cached, stale = await _query_cache.alookup(customer_id, masked_query, mode)
+    if stale:
+        _schedule_refresh(customer_id, masked_query, mode)
+    return cached
+
+
+def _resolve_mode(mode: Optional[str]) -> str:
+    mode = mode or DEFAULT_RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    return mode
+
+
 async def get_customer_response(
     customer_id: str,
     query: str,
     use_cache: bool = True,
+    retrieval_mode: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Execute async RAG query using TreeIndex logic.
 
     Returns dict with 'response', 'sources', 'latency_ms', 'cached'.
+    Stale exact-cache answers are served while they refresh in the
+    background. Misses fall back to the semantic cache (a sampled share of
+    its hits is re-run to audit for false hits). Concurrent identical queries
+    for a customer are coalesced onto one traversal; each caller still gets
+    its own result dict and latency.
     """
     start = time.time()
     _configure_llama_index()
+    mode = _resolve_mode(retrieval_mode)
 
     masked_query = mask_pii(query)
 
+    # Pick up a newer index (and drop answers cached from the old one) if
+    # another worker rebuilt this tenant's tree.
+    await _async_index_version(customer_id)
+
+    hit, embedding = None, None
     if use_cache:
-        cached = _query_cache.get(customer_id, masked_query)
+        cached = await _lookup_cached(customer_id, masked_query, mode)
+        if cached is None:
+            hit, embedding = await _lookup_semantic(customer_id, masked_query, mode)
+            if hit is not None and not _semantic_cache.should_audit():
+                cached = hit.data
         if cached is not None:
             cached["latency_ms"] = round((time.time() - start) * 1000, 2)
             cached["cached"] = True
             return cached
 
-    # RETRIEVE IN-MEMORY TREE INDEX
-    index = _get_customer_index(customer_id)
-    if not index:
+    flight_key = _query_cache._make_key(customer_id, masked_query, mode)
+    shared = await _query_flights.do(
+        flight_key, lambda: _run_tree_query(customer_id, masked_query, use_cache, mode, embedding, hit is None)
+    )
+    if shared is not None and embedding is not None:
+        if hit is not None:
+            _semantic_cache.record_audit(customer_id, hit.data.get("node_ids", []), shared["node_ids"])
+        _semantic_cache.add(customer_id, masked_query, embedding, mode)
+
+    latency = round((time.time() - start) * 1000, 2)
+    if shared is None:
         return {
-            "response": "I do not have any documents loaded in the system to answer your question.",
+            "response": NO_DOCUMENTS_RESPONSE,
             "sources": [],
-            "latency_ms": round((time.time() - start) * 1000, 2),
+            "latency_ms": latency,
             "cached": False,
         }
 
-    # HIERARCHICAL REASONING ENGINE (Vectorless Traversal)
-    # Convert to standard Query Engine
-    prompt = (
-        "You are an enterprise AI assistant for the Avicon aviation procurement platform. "
-        "1. DEPENDENCY: Answer based ONLY on the provided context.\n"
-        "2. NO HALLUCINATION: Do not guess or extrapolate.\n"
-        "3. DEFINITION OF DONE: Your final answer must be a clear, actionable summary."
-    )
-    
-    query_engine = index.as_query_engine(
-        retriever_mode="select_leaf",
-        child_branch_factor=3,
-        system_prompt=prompt,
-        response_mode="tree_summarize" # Aggregate leaf responses together effectively
+    result = dict(shared)
+    result["latency_ms"] = latency
+    logger.info(
+        f"RAG_QUERY | customer={customer_id} | mode={mode} | route={result['retrieval']['route']} | "
+        f"latency={latency}ms | sources={len(result['sources'])}"
     )
+    return result
 
-    response_obj = await query_engine.aquery(masked_query)
 
-    sources = _extract_sources(getattr(response_obj, 'source_nodes', []))
+# ──────────────────────────────────────────────────
+# Streaming RAG Query (Server-Sent Events)
+# ──────────────────────────────────────────────────
+async def stream_customer_response(
+    customer_id: str,
+    query: str,
+    use_cache: bool = True,
+    retrieval_mode: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Stream a RAG query as events: progress, sources, token (repeated), done.
+
+    Each event is {"event": name, "data": dict}. The traversal runs in a
+    worker thread so per-level progress reaches the client while the LLM
+    selection calls are still running; the final tree_summarize call streams
+    its tokens. The complete answer is stored in the query cache at the end.
+    """
+    # NOTE: lazy imports — keeps module import light for the unit-test mocks
+    from llama_index.core.schema import QueryBundle
 
-    latency = round((time.time() - start) * 1000, 2)
-    result = {
-        "response": str(response_obj),
-        "sources": sources,
-        "latency_ms": latency,
-        "cached": False,
-    }
+    start = time.time()
+    _configure_llama_index()
+    mode = _resolve_mode(retrieval_mode)
+
+    masked_query = mask_pii(query)
+    await _async_index_version(customer_id)
+    yield {"event": "progress", "data": {"stage": "retrieving", "mode": mode}}
 
+    hit, embedding = None, None
     if use_cache:
-        _query_cache.set(customer_id, masked_query, result)
+        cached = await _lookup_cached(customer_id, masked_query, mode)
+        if cached is None:
+            hit, embedding = await _lookup_semantic(customer_id, masked_query, mode)
+            if hit is not None and not _semantic_cache.should_audit():
+                cached = hit.data
+        if cached is not None:
+            yield {"event": "sources", "data": {"sources": cached["sources"]}}
+            yield {"event": "token", "data": {"text": cached["response"]}}
+            yield {"event": "done", "data": {
+                "latency_ms": round((time.time() - start) * 1000, 2),
+                "cached": True,
+            }}
+            return
+
+    entry = await _aget_customer_entry(customer_id)
+    if entry is None:
+        yield {"event": "sources", "data": {"sources": []}}
+        yield {"event": "token", "data": {"text": NO_DOCUMENTS_RESPONSE}}
+        yield {"event": "done", "data": {
+            "latency_ms": round((time.time() - start) * 1000, 2),
+            "cached": False,
+        }}
+        return
 
-    logger.info(f"RAG_QUERY | customer={customer_id} | latency={latency}ms | sources={len(sources)}")
-    return result
+    # Bridge per-level progress from the traversal thread onto this loop
+    loop = asyncio.get_running_loop()
+    progress: asyncio.Queue = asyncio.Queue()
+
+    def on_level(event: Dict[str, Any]):
+        loop.call_soon_threadsafe(progress.put_nowait, event)
+
+    retriever, nodes, route = await _plan_retrieval(
+        customer_id, entry, masked_query, mode,
+        on_level=on_level, query_embedding=embedding, reuse_leaves=use_cache and hit is None,
+    )
+    selection_calls = 0
+    if nodes is None:
+        retrieval = loop.run_in_executor(None, retriever.retrieve, masked_query)
+        retrieval.add_done_callback(lambda _: progress.put_nowait(None))
+
+        while (event := await progress.get()) is not None:
+            yield {"event": "progress", "data": {"stage": "traversal", **event}}
+        nodes = await retrieval
+        selection_calls = retriever.selection_calls
+    _record_retrieval(route, selection_calls)
+    if use_cache:
+        _remember_leaves(customer_id, entry, masked_query, mode, nodes, route, selection_calls)
+
+    sources = _extract_sources(nodes)
+    yield {"event": "sources", "data": {"sources": sources}}
+    yield {"event": "progress", "data": {"stage": "synthesizing", "route": route, "leaves": len(nodes)}}
+
+    query_engine = _synthesizer_engine(retriever, streaming=True)
+    response_obj = await query_engine.asynthesize(QueryBundle(masked_query), nodes)
+
+    parts: List[str] = []
+    async for token in response_obj.async_response_gen():
+        parts.append(token)
+        yield {"event": "token", "data": {"text": token}}
+
+    latency = round((time.time() - start) * 1000, 2)
+    if use_cache:
+        node_ids = [n.node.node_id for n in nodes]
+        await _query_cache.aset(customer_id, masked_query, {
+            "response": "".join(parts),
+            "sources": sources,
+            "cached": False,
+            "retrieval": {"mode": mode, "route": route, "selection_calls": selection_calls},
+            "node_ids": node_ids,
+        }, _answer_tags(masked_query, nodes), mode=mode)
+        if embedding is not None:
+            if hit is not None:
+                _semantic_cache.record_audit(customer_id, hit.data.get("node_ids", []), node_ids)
+            _semantic_cache.add(customer_id, masked_query, embedding, mode)
+
+    logger.info(f"RAG_QUERY_STREAM | customer={customer_id} | mode={mode} | route={route} | latency={latency}ms | sources={len(sources)}")
+    yield {"event": "done", "data": {"latency_ms": latency, "cached": False}}
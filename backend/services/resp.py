@@ -0,0 +1,323 @@
+"""Minimal Redis-protocol (RESP2) client, plus an in-process stand-in server.
+
+The client covers the handful of commands the shared query cache needs
+without pulling in a Redis driver. ``RespServer`` speaks the same protocol
+over a local socket for tests and single-host development; it is not a
+Redis replacement (no persistence, no eviction policy, one keyspace).
+"""
+import fnmatch
+import logging
+import socket
+import socketserver
+import ssl
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger("avicon.resp")
+
+
+class RespError(Exception):
+    """Error reply from the server (``-ERR ...``)."""
+
+
+def _encode(args: Sequence[Any]) -> bytes:
+    out = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        out.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(out)
+
+
+def _read_reply(stream) -> Any:
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        return RespError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        return None if length < 0 else stream.read(length + 2)[:-2]
+    if kind == b"*":
+        length = int(payload)
+        return None if length < 0 else [_read_reply(stream) for _ in range(length)]
+    raise RespError(f"Unknown reply type: {line!r}")
+
+
+class RespClient:
+    """Thread-safe RESP2 client over one connection, reconnecting once on failure.
+
+    Authenticates (AUTH) and selects the database on every (re)connect; with
+    ``ssl_context`` the connection is wrapped in TLS.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 6379,
+        db: int = 0,
+        timeout: float = 2.0,
+        password: Optional[str] = None,
+        username: Optional[str] = None,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ):
+        self._address = (host, port)
+        self._db = db
+        self._timeout = timeout
+        self._password = password
+        self._username = username
+        self._ssl = ssl_context
+        self._sock: Optional[socket.socket] = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url: str, timeout: float = 2.0) -> "RespClient":
+        """``redis://[[user]:password@]host:port/db``; ``rediss://`` connects over TLS."""
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", "rediss"):
+            raise ValueError(f"Unsupported Redis URL scheme: {parsed.scheme}")
+        db = int(parsed.path.lstrip("/") or 0)
+        return cls(
+            parsed.hostname or "127.0.0.1",
+            parsed.port or 6379,
+            db,
+            timeout,
+            password=unquote(parsed.password) if parsed.password else None,
+            username=unquote(parsed.username) if parsed.username else None,
+            ssl_context=ssl.create_default_context() if parsed.scheme == "rediss" else None,
+        )
+
+    def _connect(self):
+        sock = socket.create_connection(self._address, timeout=self._timeout)
+        if self._ssl is not None:
+            sock = self._ssl.wrap_socket(sock, server_hostname=self._address[0])
+        self._sock = sock
+        self._stream = sock.makefile("rb")
+        setup: List[Tuple[Any, ...]] = []
+        if self._password is not None:
+            setup.append(("AUTH", self._username, self._password) if self._username else ("AUTH", self._password))
+        if self._db:
+            setup.append(("SELECT", self._db))
+        for reply in self._roundtrip(setup) if setup else ():
+            if isinstance(reply, RespError):
+                # Wrong credentials or database: retrying will not help
+                self._close()
+                raise reply
+
+    def _roundtrip(self, commands: List[Tuple[Any, ...]]) -> List[Any]:
+        self._sock.sendall(b"".join(_encode(cmd) for cmd in commands))
+        return [_read_reply(self._stream) for _ in commands]
+
+    def pipeline(self, commands: List[Tuple[Any, ...]]) -> List[Any]:
+        """Send commands in one write and return their replies (errors as RespError values)."""
+        if not commands:
+            return []
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._roundtrip(commands)
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt == 2:
+                        raise
+
+    def execute(self, *args: Any) -> Any:
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = self._stream = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+# ──────────────────────────────────────────────────
+# Stand-in server (tests / local development)
+# ──────────────────────────────────────────────────
+class _Store:
+    def __init__(self):
+        self.data: Dict[bytes, Any] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.lock = threading.Lock()
+
+    def _live(self, key: bytes) -> bool:
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def execute(self, args: List[bytes]) -> Any:
+        command = args[0].upper().decode()
+        handler = getattr(self, f"_cmd_{command.lower()}", None)
+        if handler is None:
+            return RespError(f"ERR unknown command '{command}'")
+        with self.lock:
+            try:
+                return handler(*args[1:])
+            except (TypeError, ValueError, IndexError):
+                return RespError(f"ERR wrong arguments for '{command}' command")
+
+    def _cmd_ping(self, *args):
+        return "PONG"
+
+    def _cmd_select(self, db):
+        return "OK"
+
+    def _cmd_get(self, key):
+        return self.data[key] if self._live(key) else None
+
+    def _cmd_set(self, key, value, *options):
+        self.data[key] = value
+        self.expires.pop(key, None)
+        opts = [o.upper() for o in options]
+        if b"PX" in opts:
+            self.expires[key] = time.time() + int(options[opts.index(b"PX") + 1]) / 1000
+        elif b"EX" in opts:
+            self.expires[key] = time.time() + int(options[opts.index(b"EX") + 1])
+        return "OK"
+
+    def _cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._live(key):
+                removed += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return removed
+
+    def _cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._live(key))
+
+    def _cmd_pexpire(self, key, ms):
+        if not self._live(key):
+            return 0
+        self.expires[key] = time.time() + int(ms) / 1000
+        return 1
+
+    def _cmd_sadd(self, key, *members):
+        self._live(key)  # Drops an expired set first
+        members_set = self.data.setdefault(key, set())
+        before = len(members_set)
+        members_set.update(members)
+        return len(members_set) - before
+
+    def _cmd_srem(self, key, *members):
+        if not self._live(key):
+            return 0
+        members_set = self.data[key]
+        before = len(members_set)
+        members_set.difference_update(members)
+        if not members_set:
+            self._cmd_del(key)
+        return before - len(members_set)
+
+    def _cmd_smembers(self, key):
+        return sorted(self.data[key]) if self._live(key) else []
+
+    def _cmd_sunion(self, *keys):
+        union = set()
+        for key in keys:
+            if self._live(key):
+                union |= self.data[key]
+        return sorted(union)
+
+    def _cmd_scard(self, key):
+        return len(self.data[key]) if self._live(key) else 0
+
+    def _cmd_keys(self, pattern):
+        pattern = pattern.decode()
+        return sorted(k for k in list(self.data) if self._live(k) and fnmatch.fnmatchcase(k.decode(), pattern))
+
+    def _cmd_dbsize(self):
+        return sum(1 for k in list(self.data) if self._live(k))
+
+    def _cmd_flushdb(self):
+        self.data.clear()
+        self.expires.clear()
+        return "OK"
+
+
+def _write_reply(wfile, reply: Any):
+    if isinstance(reply, RespError):
+        wfile.write(f"-{reply}\r\n".encode())
+    elif isinstance(reply, str):
+        wfile.write(f"+{reply}\r\n".encode())
+    elif isinstance(reply, int):
+        wfile.write(f":{reply}\r\n".encode())
+    elif reply is None:
+        wfile.write(b"$-1\r\n")
+    elif isinstance(reply, bytes):
+        wfile.write(f"${len(reply)}\r\n".encode() + reply + b"\r\n")
+    else:
+        wfile.write(f"*{len(reply)}\r\n".encode())
+        for item in reply:
+            _write_reply(wfile, item)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        password = self.server.password
+        authenticated = password is None
+        while True:
+            try:
+                request = _read_reply(self.rfile)
+            except (ConnectionError, ValueError):
+                return
+            if not request:
+                reply = RespError("ERR empty command")
+            elif request[0].upper() == b"AUTH":
+                authenticated = password is not None and request[-1].decode() == password
+                reply = "OK" if authenticated else RespError("WRONGPASS invalid password")
+            elif not authenticated:
+                reply = RespError("NOAUTH Authentication required.")
+            else:
+                reply = self.server.store.execute(request)
+            _write_reply(self.wfile, reply)
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    """Local RESP stand-in: ``with RespServer() as server: server.url``.
+
+    With ``password`` set, connections must AUTH first (like ``requirepass``).
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, password: Optional[str] = None):
+        super().__init__((host, port), _Handler)
+        self.store = _Store()
+        self.password = password
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        auth = f":{self.password}@" if self.password is not None else ""
+        return f"redis://{auth}{host}:{port}/0"
+
+    def __enter__(self) -> "RespServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,94 @@
+"""Cache of retrieved leaves, kept apart from the answer cache.
+
+An answer-cache miss does not have to mean a new traversal: when the same
+question (modulo wording: case, punctuation, stopwords and term order) was
+answered against the same index version, the leaves it retrieved are still
+the right ones and only synthesis has to run again. Keying on the index
+version makes uploads retire entries without any explicit invalidation.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.bm25 import tokenize
+
+logger = logging.getLogger("avicon.retrieval_cache")
+
+RETRIEVAL_CACHE_ENABLED = os.environ.get("RAG_RETRIEVAL_CACHE", "1") == "1"
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.environ.get("RAG_RETRIEVAL_CACHE_MAX_ENTRIES", "2048"))
+RETRIEVAL_CACHE_TTL = float(os.environ.get("RAG_RETRIEVAL_CACHE_TTL", "3600"))
+
+
+def normalize_query(query: str) -> str:
+    """Sorted distinct content terms, so rewordings of a question share a key."""
+    return " ".join(sorted(set(tokenize(query))))
+
+
+@dataclass
+class CachedRetrieval:
+    hits: List[Tuple[str, float]]  # (leaf node id, score)
+    route: str  # Route that originally found the leaves
+    selection_calls: int  # LLM calls that traversal cost
+    stored_at: float
+
+
+class RetrievalCache:
+    """Thread-safe LRU of (tenant, index version, mode, normalized query) -> leaves."""
+
+    def __init__(self, max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES, ttl_seconds: float = RETRIEVAL_CACHE_TTL):
+        self._max_entries = max(1, max_entries)
+        self._ttl = ttl_seconds
+        self._entries: OrderedDict[str, CachedRetrieval] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "selection_calls_saved": 0}
+
+    @staticmethod
+    def _make_key(customer_id: str, version: Optional[str], mode: str, query: str) -> str:
+        digest = hashlib.sha256(normalize_query(query).encode()).hexdigest()
+        return f"{customer_id}:{version}:{mode}:{digest}"
+
+    def get(self, customer_id: str, version: Optional[str], mode: str, query: str) -> Optional[CachedRetrieval]:
+        key = self._make_key(customer_id, version, mode, query)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and time.time() - cached.stored_at >= self._ttl:
+                del self._entries[key]
+                cached = None
+            if cached is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            self._stats["selection_calls_saved"] += cached.selection_calls
+        logger.info(f"RETRIEVAL_CACHE_HIT | customer={customer_id} | leaves={len(cached.hits)}")
+        return cached
+
+    def set(
+        self,
+        customer_id: str,
+        version: Optional[str],
+        mode: str,
+        query: str,
+        hits: List[Tuple[str, float]],
+        route: str,
+        selection_calls: int,
+    ):
+        key = self._make_key(customer_id, version, mode, query)
+        with self._lock:
+            self._entries[key] = CachedRetrieval(list(hits), route, selection_calls, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
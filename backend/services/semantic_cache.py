@@ -0,0 +1,209 @@
+"""Semantic (embedding-similarity) tier in front of the exact query cache.
+
+Repeated RFP questionnaires ask the same question in many phrasings; the
+exact cache keys on the normalised text and misses all of them. This tier
+keeps, per tenant, the embeddings of recently answered queries in one compact
+float32 matrix and maps a new query onto a cached one when their cosine
+similarity clears a threshold. Answers themselves stay in the exact cache, so
+anything that evicts or invalidates them there also retires them here.
+
+A sampled share of semantic hits is audited by running the query for real;
+an audit whose retrieved leaves barely overlap the cached answer's counts as
+a false hit, which is the signal for tuning the threshold.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("avicon.semantic_cache")
+
+SEMANTIC_CACHE_ENABLED = os.environ.get("RAG_SEMANTIC_CACHE", "1") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("RAG_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("RAG_SEMANTIC_CACHE_MAX_ENTRIES", "512"))
+# Least recently used tenant (and mode) partitions beyond this are dropped
+SEMANTIC_CACHE_MAX_TENANTS = int(os.environ.get("RAG_SEMANTIC_CACHE_MAX_TENANTS", "256"))
+SEMANTIC_CACHE_AUDIT_RATE = float(os.environ.get("RAG_SEMANTIC_CACHE_AUDIT_RATE", "0.05"))
+# Audited answers sharing less than this Jaccard overlap of leaves are false hits
+SEMANTIC_AUDIT_MIN_OVERLAP = 0.5
+
+
+@dataclass
+class SemanticHit:
+    data: Any
+    query: str  # The cached query this one was matched onto
+    similarity: float
+
+
+class _TenantVectors:
+    """Rows of normalised query embeddings for one tenant, up to ``capacity``.
+
+    Starts at ``initial`` rows and doubles when full, so a tenant that asks a
+    handful of questions does not pay for the full matrix.
+    """
+
+    def __init__(self, dim: int, capacity: int, initial: int = 16):
+        self.capacity = capacity
+        size = min(capacity, initial)
+        self.matrix = np.zeros((size, dim), dtype=np.float32)
+        self.stamps = np.full(size, -np.inf)
+        self.queries: List[Optional[str]] = [None] * size
+        self.rows: Dict[str, int] = {}
+
+    def _grow(self):
+        size = len(self.queries)
+        new_size = min(self.capacity, size * 2)
+        matrix = np.zeros((new_size, self.matrix.shape[1]), dtype=np.float32)
+        matrix[:size] = self.matrix
+        stamps = np.full(new_size, -np.inf)
+        stamps[:size] = self.stamps
+        self.matrix, self.stamps = matrix, stamps
+        self.queries.extend([None] * (new_size - size))
+
+    def put(self, query: str, vector: np.ndarray, now: float):
+        row = self.rows.get(query)
+        if row is None:
+            if len(self.rows) == len(self.queries) < self.capacity:
+                self._grow()
+            # Free slot, otherwise overwrite the least recently stored query
+            row = int(np.argmin(self.stamps))
+            if self.queries[row] is not None:
+                del self.rows[self.queries[row]]
+            self.queries[row] = query
+            self.rows[query] = row
+        self.matrix[row] = vector
+        self.stamps[row] = now
+
+    def drop(self, query: str):
+        row = self.rows.pop(query, None)
+        if row is not None:
+            self.queries[row] = None
+            self.stamps[row] = -np.inf
+            self.matrix[row] = 0.0
+
+
+def _normalize(vector: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+def overlap(a: Sequence[str], b: Sequence[str]) -> float:
+    """Jaccard overlap of two node id lists (1.0 when both are empty)."""
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+class SemanticCache:
+    """Thread-safe per-tenant nearest-query lookup with hit/miss/false-hit counters.
+
+    Each tenant's queries are kept apart per retrieval mode: a rephrasing is
+    only matched onto a query answered by the same mode. At most
+    ``max_tenants`` such partitions are held; the least recently used go first.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = 300,
+        audit_rate: float = SEMANTIC_CACHE_AUDIT_RATE,
+        max_tenants: int = SEMANTIC_CACHE_MAX_TENANTS,
+    ):
+        self._threshold = threshold
+        self._max_entries = max(1, max_entries)
+        self._ttl = ttl_seconds
+        self._audit_rate = audit_rate
+        self._max_tenants = max(1, max_tenants)
+        self._tenants: OrderedDict[Tuple[str, str], _TenantVectors] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "audits": 0, "false_hits": 0}
+
+    def lookup(
+        self,
+        customer_id: str,
+        embedding: Sequence[float],
+        resolve: Callable[[str], Optional[Any]],
+        mode: str = "",
+    ) -> Optional[SemanticHit]:
+        """Closest cached query above the threshold, resolved to its cached answer.
+
+        ``resolve`` fetches the answer for a cached query (from the exact
+        cache); queries whose answer has gone are dropped and count as misses.
+        """
+        vector = _normalize(embedding)
+        with self._lock:
+            tenant = self._tenants.get((customer_id, mode))
+            match = None
+            if tenant is not None and tenant.matrix.shape[1] == len(vector):
+                self._tenants.move_to_end((customer_id, mode))
+                scores = tenant.matrix @ vector
+                scores[tenant.stamps < time.time() - self._ttl] = -np.inf
+                row = int(np.argmax(scores))
+                if scores[row] >= self._threshold:
+                    match = (tenant.queries[row], float(scores[row]))
+
+        data = resolve(match[0]) if match else None
+        with self._lock:
+            if data is None:
+                if match:
+                    self._drop(customer_id, mode, match[0])
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+        logger.info(f"SEMANTIC_CACHE_HIT | customer={customer_id} | similarity={match[1]:.3f}")
+        return SemanticHit(data=data, query=match[0], similarity=round(match[1], 4))
+
+    def add(self, customer_id: str, query: str, embedding: Sequence[float], mode: str = ""):
+        vector = _normalize(embedding)
+        key = (customer_id, mode)
+        with self._lock:
+            tenant = self._tenants.get(key)
+            if tenant is None or tenant.matrix.shape[1] != len(vector):
+                # New tenant, or the embedding model changed: start afresh
+                tenant = self._tenants[key] = _TenantVectors(len(vector), self._max_entries)
+            self._tenants.move_to_end(key)
+            while len(self._tenants) > self._max_tenants:
+                self._tenants.popitem(last=False)
+            tenant.put(query, vector, time.time())
+
+    def should_audit(self) -> bool:
+        return self._audit_rate > 0 and random.random() < self._audit_rate
+
+    def record_audit(self, customer_id: str, cached_nodes: Sequence[str], fresh_nodes: Sequence[str]) -> bool:
+        """Compare an audited hit with a fresh retrieval. Returns True for a false hit."""
+        false_hit = overlap(cached_nodes, fresh_nodes) < SEMANTIC_AUDIT_MIN_OVERLAP
+        with self._lock:
+            self._stats["audits"] += 1
+            self._stats["false_hits"] += false_hit
+        if false_hit:
+            logger.warning(f"SEMANTIC_CACHE_FALSE_HIT | customer={customer_id}")
+        return false_hit
+
+    def _drop(self, customer_id: str, mode: str, query: str):
+        tenant = self._tenants.get((customer_id, mode))
+        if tenant is not None:
+            tenant.drop(query)
+
+    def invalidate_customer(self, customer_id: str):
+        with self._lock:
+            for key in [key for key in self._tenants if key[0] == customer_id]:
+                del self._tenants[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            entries = sum(len(t.rows) for t in self._tenants.values())
+            tenants = len(self._tenants)
+        lookups = stats["hits"] + stats["misses"]
+        stats["entries"] = entries
+        stats["tenants"] = tenants
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["false_hit_rate"] = round(stats["false_hits"] / stats["audits"], 4) if stats["audits"] else 0.0
+        stats["threshold"] = self._threshold
+        return stats
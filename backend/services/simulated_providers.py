@@ -0,0 +1,621 @@
+"""Deterministic offline stand-ins for Azure OpenAI, LlamaParse and Supabase auth.
+
+With SIMULATED_PROVIDERS=1, ``_configure_llama_index`` installs
+``SimulatedLLM``/``SimulatedEmbedding`` and ``load_document`` returns
+synthetic markdown for the uploaded file. The flag is refused (at import,
+so the server fails to boot) unless AVICON_ENV is "development" or "test".
+Auth is never simulated from the environment: test and benchmark harnesses
+set ``middleware.auth.SIMULATED_PROVIDERS`` in-process, after which
+``verify_supabase_token`` accepts ``sim:<user>[:<role>]`` tokens, so
+ingestion, querying, drafting and auth run end to end without credentials
+or network access.
+
+Outputs depend only on the input. Latency is drawn per call from a lognormal
+around a median plus a per-unit term (output tokens, texts, KB parsed), and
+errors are injected at a configured rate; both are seeded by the call's
+content and how often it has been seen, so concurrent runs are reproducible.
+SIMULATED_PROFILE holds JSON overrides, inline or as a file path, e.g.
+``{"llm": {"median_ms": 600, "per_unit_ms": 15}, "llm_error_rate": 0.01}``.
+
+Record/replay: with SIMULATED_RECORD=<cassette.jsonl> the real providers are
+used and each completion and parse is appended to the cassette; with
+SIMULATED_CASSETTE=<cassette.jsonl> the stand-ins answer recorded prompts and
+files with the real responses, at their recorded latency.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field, fields
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms import CompletionResponse, CustomLLM, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+from services.bm25 import tokenize
+
+logger = logging.getLogger("avicon.simulated")
+
+# Environments (AVICON_ENV) in which SIMULATED_PROVIDERS=1 is honoured
+SIMULATION_ENVIRONMENTS = ("development", "test")
+
+
+def _simulation_enabled() -> bool:
+    if os.environ.get("SIMULATED_PROVIDERS", "0") != "1":
+        return False
+    environment = os.environ.get("AVICON_ENV", "production")
+    if environment not in SIMULATION_ENVIRONMENTS:
+        raise RuntimeError(
+            f"SIMULATED_PROVIDERS=1 is refused with AVICON_ENV={environment!r}; "
+            f"it is only honoured with AVICON_ENV in {SIMULATION_ENVIRONMENTS}"
+        )
+    return True
+
+
+SIMULATED_PROVIDERS = _simulation_enabled()
+SIMULATED_PROFILE = os.environ.get("SIMULATED_PROFILE", "")
+SIMULATED_CASSETTE = os.environ.get("SIMULATED_CASSETTE", "")
+SIMULATED_RECORD = os.environ.get("SIMULATED_RECORD", "")
+
+
+class SimulatedProviderError(RuntimeError):
+    """Injected provider failure (rate limit, timeout, job failure)."""
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Latency / error profile
+# ──────────────────────────────────────────────────────────────────────────────
+
+@dataclass
+class Latency:
+    """Lognormal base latency around ``median_ms`` plus ``per_unit_ms`` per unit of work."""
+
+    median_ms: float = 0.0
+    sigma: float = 0.0  # Lognormal shape; 0 always returns the median
+    per_unit_ms: float = 0.0
+
+    def base(self, rng: random.Random) -> float:
+        """Seconds before the first unit (first token, first byte)."""
+        spread = math.exp(rng.gauss(0.0, self.sigma)) if self.sigma > 0 else 1.0
+        return self.median_ms * spread / 1000
+
+    def sample(self, rng: random.Random, units: float = 0.0) -> float:
+        return self.base(rng) + self.per_unit_ms * units / 1000
+
+
+@dataclass
+class SimulationProfile:
+    # First token ~400 ms, then ~80 output tokens/s (gpt-4o on a shared deployment)
+    llm: Latency = field(default_factory=lambda: Latency(400.0, 0.35, 12.5))
+    # Per batch request, plus per text in the batch
+    embed: Latency = field(default_factory=lambda: Latency(60.0, 0.25, 0.5))
+    # Per parse job, plus per KB of input
+    parse: Latency = field(default_factory=lambda: Latency(1500.0, 0.4, 20.0))
+    auth: Latency = field(default_factory=lambda: Latency(40.0, 0.3, 0.0))
+    llm_error_rate: float = 0.0
+    embed_error_rate: float = 0.0
+    parse_error_rate: float = 0.0
+    auth_error_rate: float = 0.0
+    embed_dim: int = 256
+    max_output_tokens: int = 256
+    # Replay recorded calls at their recorded latency rather than the model's
+    replay_latency: bool = True
+    seed: int = 0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SimulationProfile":
+        known = {f.name: f for f in fields(cls)}
+        unknown = set(data) - set(known)
+        if unknown:
+            raise ValueError(f"Unknown simulation profile keys: {sorted(unknown)}")
+        values = {
+            name: Latency(**value) if isinstance(value, dict) else value
+            for name, value in data.items()
+        }
+        return cls(**values)
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "SimulationProfile":
+        """Profile from inline JSON or a JSON file path; empty means the defaults."""
+        if not spec:
+            return cls()
+        if not spec.lstrip().startswith("{"):
+            with open(spec) as f:
+                spec = f.read()
+        return cls.from_dict(json.loads(spec))
+
+    @classmethod
+    def instant(cls, **overrides: Any) -> "SimulationProfile":
+        """No latency at all, for tests and call-counting harnesses."""
+        zero = {name: Latency() for name in ("llm", "embed", "parse", "auth")}
+        return cls(**{**zero, **overrides})
+
+
+class _Dice:
+    """Seeded RNG per (kind, content, occurrence), independent of call interleaving."""
+
+    def __init__(self, seed: int):
+        self._seed = seed
+        self._seen: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def rng(self, kind: str, content: str) -> random.Random:
+        digest = hashlib.sha256(content.encode()).hexdigest()[:16]
+        with self._lock:
+            occurrence = self._seen[(kind, digest)]
+            self._seen[(kind, digest)] += 1
+        return random.Random(f"{self._seed}:{kind}:{digest}:{occurrence}")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Record / replay
+# ──────────────────────────────────────────────────────────────────────────────
+
+class Cassette:
+    """Append-only JSONL of real provider responses keyed by a hash of the request."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[(entry["kind"], entry["key"])] = entry
+
+    @staticmethod
+    def make_key(payload: Any) -> str:
+        data = payload if isinstance(payload, bytes) else str(payload).encode()
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get((kind, key))
+
+    def record(self, kind: str, key: str, response: Any, latency_ms: float):
+        entry = {"kind": kind, "key": key, "response": response, "latency_ms": round(latency_ms, 1)}
+        with self._lock:
+            self._entries[(kind, key)] = entry
+            with open(self._path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_profile: Optional[SimulationProfile] = None
+_cassettes: Dict[str, Cassette] = {}
+_dice: Optional[_Dice] = None
+_state_lock = threading.RLock()
+
+
+def get_profile() -> SimulationProfile:
+    global _profile
+    with _state_lock:
+        if _profile is None:
+            _profile = SimulationProfile.from_spec(SIMULATED_PROFILE)
+        return _profile
+
+
+def set_profile(profile: SimulationProfile):
+    """Replace the process-wide profile (harnesses that build one from flags)."""
+    global _profile, _dice
+    with _state_lock:
+        _profile = profile
+        _dice = None
+
+
+def _get_dice() -> _Dice:
+    global _dice
+    with _state_lock:
+        if _dice is None:
+            _dice = _Dice(get_profile().seed)
+        return _dice
+
+
+def get_cassette(path: str) -> Optional[Cassette]:
+    if not path:
+        return None
+    with _state_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# LLM
+# ──────────────────────────────────────────────────────────────────────────────
+
+# select_leaf choice prompts: numbered summaries, the question and a branching limit
+_CHOICE_RE = re.compile(r"\((\d+)\) (.*?)(?=\n\n\(\d+\) |\n-{5})", re.S)
+_SELECT_QUESTION_RE = re.compile(r"question: '(.*?)'", re.S)
+_BRANCHING_RE = re.compile(r"no more than (\d+)")
+# Synthesis / chat / drafting prompts
+_QUESTION_RE = re.compile(r"(?:Query|Question|RFP Requirement|Requirement):\s*(.+?)\s*(?:\n|$)")
+_SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?]?")
+
+
+def _select(prompt: str, question: str) -> str:
+    """Pick the numbered choices sharing the most terms with the question."""
+    terms = set(tokenize(question))
+    branching = _BRANCHING_RE.search(prompt)
+    limit = int(branching.group(1)) if branching else 1
+    scored = [
+        (len(terms & set(tokenize(text))), -int(number), int(number))
+        for number, text in _CHOICE_RE.findall(prompt)
+    ]
+    best = sorted(scored, reverse=True)[:limit] or [(0, 0, 1)]
+    return "ANSWER: " + ", ".join(str(number) for _, _, number in best)
+
+
+def _answer(prompt: str, question: str, max_tokens: int) -> str:
+    """Extractive answer: the context sentences sharing the most terms with the question."""
+    terms = set(tokenize(question))
+    context = prompt.replace(question, " ")
+    scored = []
+    for position, sentence in enumerate(_SENTENCE_RE.findall(context)):
+        sentence = sentence.strip()
+        overlap = len(terms & set(tokenize(sentence)))
+        if overlap and len(sentence) > 3:
+            scored.append((-overlap, position, sentence))
+    picked = sorted(sorted(scored)[:3], key=lambda item: item[1])
+    text = " ".join(sentence for _, _, sentence in picked) or "The provided context does not cover this."
+    return " ".join(text.split()[:max_tokens])
+
+
+def _summarize(prompt: str, max_tokens: int) -> str:
+    """Distinct content terms in order of first appearance."""
+    return " ".join(list(dict.fromkeys(tokenize(prompt)))[:max_tokens])
+
+
+def classify(prompt: str, max_tokens: int = 256) -> Tuple[str, str]:
+    """(call kind, deterministic completion text) for a prompt."""
+    question = _SELECT_QUESTION_RE.search(prompt)
+    if "ANSWER:" in prompt and question:
+        return "select", _select(prompt, question.group(1))
+    question = _QUESTION_RE.search(prompt)
+    if question:
+        return "answer", _answer(prompt, question.group(1), max_tokens)
+    return "summarize", _summarize(prompt, max_tokens)
+
+
+class SimulatedLLM(CustomLLM):
+    """Deterministic completions with the profile's latency, throughput and error rate.
+
+    Tree choice prompts get the choices sharing the most query terms, prompts
+    carrying a query get an extractive answer from their context, and anything
+    else (node summaries) gets its distinct terms. ``calls`` counts each kind.
+    """
+
+    model_name: str = "simulated-llm"
+    _profile: SimulationProfile = PrivateAttr()
+    _cassette: Optional[Cassette] = PrivateAttr(default=None)
+    _calls: Counter = PrivateAttr(default_factory=Counter)
+
+    def __init__(self, profile: Optional[SimulationProfile] = None, cassette: Optional[Cassette] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._profile = profile or get_profile()
+        self._cassette = cassette if cassette is not None else get_cassette(SIMULATED_CASSETTE)
+        self._calls = Counter()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SimulatedLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=128000, num_output=self._profile.max_output_tokens, model_name=self.model_name)
+
+    @property
+    def calls(self) -> Counter:
+        return self._calls
+
+    def _respond(self, prompt: str) -> Tuple[str, float, float]:
+        """(text, seconds to first token, seconds per further token); raises injected errors."""
+        profile = self._profile
+        rng = _get_dice().rng("llm", prompt)
+        recorded = self._cassette.get("llm", Cassette.make_key(prompt)) if self._cassette is not None else None
+        if recorded is not None:
+            kind, text = "replayed", recorded["response"]
+        else:
+            kind, text = classify(prompt, profile.max_output_tokens)
+        self._calls[kind] += 1
+        tokens = max(1, len(text.split()))
+        if recorded is not None and profile.replay_latency:
+            first, per_token = recorded["latency_ms"] / 1000, 0.0
+        else:
+            first, per_token = profile.llm.base(rng), profile.llm.per_unit_ms / 1000
+        if rng.random() < profile.llm_error_rate:
+            self._calls["errors"] += 1
+            raise SimulatedProviderError(f"Simulated LLM failure after {first * 1000:.0f}ms ({kind})")
+        return text, first, per_token if tokens > 1 else 0.0
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        text, first, per_token = self._respond(prompt)
+        time.sleep(first + per_token * (len(text.split()) - 1))
+        return CompletionResponse(text=text)
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        text, first, per_token = self._respond(prompt)
+        await asyncio.sleep(first + per_token * (len(text.split()) - 1))
+        return CompletionResponse(text=text)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> Iterator[CompletionResponse]:
+        text, first, per_token = self._respond(prompt)
+        time.sleep(first)
+        sent = ""
+        for i, word in enumerate(text.split()):
+            if i:
+                time.sleep(per_token)
+            delta = word if not sent else " " + word
+            sent += delta
+            yield CompletionResponse(text=sent, delta=delta)
+
+    @llm_completion_callback()
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> AsyncIterator[CompletionResponse]:
+        text, first, per_token = self._respond(prompt)
+
+        async def gen() -> AsyncIterator[CompletionResponse]:
+            await asyncio.sleep(first)
+            sent = ""
+            for i, word in enumerate(text.split()):
+                if i:
+                    await asyncio.sleep(per_token)
+                delta = word if not sent else " " + word
+                sent += delta
+                yield CompletionResponse(text=sent, delta=delta)
+
+        return gen()
+
+
+class RecordingLLM(CustomLLM):
+    """Passes completions through to the real LLM and appends each to a cassette.
+
+    Reports itself as a completion model so prompts are formatted exactly as
+    ``SimulatedLLM`` will see them on replay.
+    """
+
+    inner: Any
+    _cassette: Cassette = PrivateAttr()
+
+    def __init__(self, inner: Any, cassette: Cassette, **kwargs: Any):
+        super().__init__(inner=inner, **kwargs)
+        self._cassette = cassette
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RecordingLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self.inner.metadata.model_copy(update={"is_chat_model": False})
+
+    def _record(self, prompt: str, text: str, started: float):
+        self._cassette.record("llm", Cassette.make_key(prompt), text, (time.perf_counter() - started) * 1000)
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        started = time.perf_counter()
+        response = self.inner.complete(prompt, formatted=formatted, **kwargs)
+        self._record(prompt, response.text, started)
+        return response
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        started = time.perf_counter()
+        response = await self.inner.acomplete(prompt, formatted=formatted, **kwargs)
+        self._record(prompt, response.text, started)
+        return response
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> Iterator[CompletionResponse]:
+        started = time.perf_counter()
+        response = None
+        for response in self.inner.stream_complete(prompt, formatted=formatted, **kwargs):
+            yield response
+        self._record(prompt, response.text if response is not None else "", started)
+
+    @llm_completion_callback()
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> AsyncIterator[CompletionResponse]:
+        started = time.perf_counter()
+        stream = await self.inner.astream_complete(prompt, formatted=formatted, **kwargs)
+
+        async def gen() -> AsyncIterator[CompletionResponse]:
+            response = None
+            async for response in stream:
+                yield response
+            self._record(prompt, response.text if response is not None else "", started)
+
+        return gen()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Embeddings
+# ──────────────────────────────────────────────────────────────────────────────
+
+class SimulatedEmbedding(BaseEmbedding):
+    """Hashed bag-of-words vectors: texts sharing terms land close in cosine space."""
+
+    dim: int = 256
+    _profile: SimulationProfile = PrivateAttr()
+    _calls: Counter = PrivateAttr(default_factory=Counter)
+
+    def __init__(self, profile: Optional[SimulationProfile] = None, **kwargs: Any):
+        profile = profile or get_profile()
+        kwargs.setdefault("dim", profile.embed_dim)
+        kwargs.setdefault("model_name", f"simulated-hash-{kwargs['dim']}")
+        super().__init__(**kwargs)
+        self._profile = profile
+        self._calls = Counter()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SimulatedEmbedding"
+
+    @property
+    def calls(self) -> Counter:
+        return self._calls
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for term in tokenize(text):
+            vector[int(hashlib.md5(term.encode()).hexdigest(), 16) % self.dim] += 1.0
+        # Constant component keeps term-less texts from being zero vectors
+        vector[0] += 0.01
+        return vector
+
+    def _delay(self, texts: List[str]) -> float:
+        """Latency of one batch request; raises injected errors."""
+        rng = _get_dice().rng("embed", "\x00".join(texts))
+        self._calls["batches"] += 1
+        self._calls["texts"] += len(texts)
+        if rng.random() < self._profile.embed_error_rate:
+            self._calls["errors"] += 1
+            raise SimulatedProviderError("Simulated embedding failure (429 Too Many Requests)")
+        return self._profile.embed.sample(rng, units=len(texts))
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._delay(texts))
+        return [self._embed(text) for text in texts]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._delay(texts))
+        return [self._embed(text) for text in texts]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._get_text_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await self._aget_text_embedding(query)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Parser
+# ──────────────────────────────────────────────────────────────────────────────
+
+@dataclass
+class ParsedPage:
+    """Shape of a LlamaParse result document (only ``.text`` is read downstream)."""
+
+    text: str
+
+
+_VOCABULARY = [
+    "landing gear", "borescope inspection", "avionics", "cabin interior", "fuel tank sealing",
+    "hydraulic pump", "corrosion prevention", "APU", "brake wear", "eddy current NDT",
+    "structural repair", "ETOPS", "tooling calibration", "spare parts pooling", "turnaround time",
+    "airworthiness directive", "service bulletin", "heavy check", "line maintenance", "component repair",
+]
+# LlamaParse splits long documents into pages of roughly this many characters
+_PAGE_CHARS = 4000
+
+
+def _synthetic_markdown(name: str, data: bytes) -> List[str]:
+    """Pages for the file: its own text when it is text, else generated sections."""
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        text = ""
+    if text.strip() and "\x00" not in text:
+        return [text[i:i + _PAGE_CHARS] for i in range(0, len(text), _PAGE_CHARS)]
+
+    rng = random.Random(hashlib.sha256(data).hexdigest())
+    sections = min(200, max(1, len(data) // 4096))
+    pages, page = [], f"# {os.path.splitext(name)[0]}\n"
+    for i in range(sections):
+        topics = rng.sample(_VOCABULARY, 3)
+        page += (
+            f"\n## Section {i + 1}: {topics[0]}\n"
+            f"Our {topics[0]} capability covers {topics[1]} and {topics[2]} "
+            f"with a {rng.randint(2, 30)} day turnaround under reference WO-{rng.randint(1000, 9999)}.\n"
+            f"| Item | Value |\n|---|---|\n| Facilities | {rng.randint(1, 12)} |\n"
+        )
+        if len(page) >= _PAGE_CHARS:
+            pages.append(page)
+            page = ""
+    if page:
+        pages.append(page)
+    return pages
+
+
+async def simulated_load_document(file_path: str, profile: Optional[SimulationProfile] = None) -> List[ParsedPage]:
+    """``load_document`` stand-in: recorded or synthetic pages after a simulated parse job."""
+    profile = profile or get_profile()
+    data = await asyncio.to_thread(_read_bytes, file_path)
+    key = Cassette.make_key(data)
+    cassette = get_cassette(SIMULATED_CASSETTE)
+    recorded = cassette.get("parse", key) if cassette is not None else None
+    rng = _get_dice().rng("parse", key)
+    if recorded is not None and profile.replay_latency:
+        delay = recorded["latency_ms"] / 1000
+    else:
+        delay = profile.parse.sample(rng, units=len(data) / 1024)
+    await asyncio.sleep(delay)
+    if rng.random() < profile.parse_error_rate:
+        raise SimulatedProviderError(f"Simulated parse job failed for {os.path.basename(file_path)}")
+    pages = recorded["response"] if recorded is not None else _synthetic_markdown(os.path.basename(file_path), data)
+    return [ParsedPage(text) for text in pages]
+
+
+def _read_bytes(file_path: str) -> bytes:
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+async def record_parse(file_path: str, documents: list, latency_ms: float):
+    """Append a real parse result to the SIMULATED_RECORD cassette."""
+    cassette = get_cassette(SIMULATED_RECORD)
+    if cassette is None:
+        return
+    data = await asyncio.to_thread(_read_bytes, file_path)
+    cassette.record("parse", Cassette.make_key(data), [doc.text for doc in documents], latency_ms)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Auth
+# ──────────────────────────────────────────────────────────────────────────────
+
+async def simulated_verify_token(token: str, profile: Optional[SimulationProfile] = None) -> Optional[dict]:
+    """``verify_supabase_token`` stand-in: ``sim:<user>[:<role>]`` maps to a stable user.
+
+    Any other token is rejected, as is an injected auth-server failure.
+    """
+    profile = profile or get_profile()
+    rng = _get_dice().rng("auth", token)
+    await asyncio.sleep(profile.auth.sample(rng))
+    if rng.random() < profile.auth_error_rate:
+        logger.warning("Supabase auth verification failed: simulated 503")
+        return None
+    parts = token.split(":")
+    if len(parts) not in (2, 3) or parts[0] != "sim" or not parts[1]:
+        return None
+    user = parts[1]
+    return {
+        "sub": str(uuid.uuid5(uuid.NAMESPACE_URL, f"avicon-simulated:{user}")),
+        "email": f"{user}@simulated.avicon.local",
+        "role": parts[2] if len(parts) == 3 else "authenticated",
+        "app_metadata": {"provider": "simulated"},
+        "user_metadata": {},
+    }
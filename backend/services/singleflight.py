@@ -0,0 +1,54 @@
+"""Single-flight request coalescing for async work.
+
+Concurrent callers asking for the same key share one in-flight execution:
+the first caller starts the work, duplicates await the same result. The work
+runs in its own task, so a disconnecting caller never cancels it for the rest.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger("avicon.singleflight")
+
+
+class SingleFlight:
+    """Coalesces identical concurrent coroutine calls by key.
+
+    Not thread-safe: use one instance per event loop (one per worker).
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fn`` once for all concurrent callers with the same key.
+
+        Every caller receives the same result object (or exception), so
+        callers must not mutate it in place.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._leaders += 1
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self._coalesced += 1
+            logger.info(f"SINGLEFLIGHT_JOIN | key={key[:16]}")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark a failure as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executions": self._leaders,
+            "coalesced": self._coalesced,
+            "in_flight": len(self._inflight),
+        }
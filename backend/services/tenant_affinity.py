@@ -0,0 +1,59 @@
+"""Tenant-affinity placement via rendezvous (highest-random-weight) hashing.
+
+Each customer_id is owned by the node with the highest hash(node, customer_id)
+score. Adding or removing a node only moves the tenants that node wins or
+loses — roughly 1/N of them — so in-memory tree indexes stay warm everywhere else.
+"""
+import hashlib
+import math
+import os
+from typing import Dict, Iterable, List, Optional
+
+
+def _score(node: str, key: str) -> int:
+    digest = hashlib.blake2b(f"{node}|{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class RendezvousRouter:
+    """Maps tenants to owner nodes (workers, instances or base URLs)."""
+
+    def __init__(self, nodes: Iterable[str], weights: Optional[Dict[str, float]] = None):
+        self._nodes: List[str] = sorted(set(nodes))
+        if not self._nodes:
+            raise ValueError("RendezvousRouter requires at least one node")
+        self._weights = weights or {}
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def _weighted_score(self, node: str, key: str) -> float:
+        if not self._weights:
+            return float(_score(node, key))
+        # Weighted HRW: -w / ln(u) keeps the minimal-disruption property
+        u = (_score(node, key) + 1) / float(2 ** 64 + 1)
+        return -self._weights.get(node, 1.0) / math.log(u)
+
+    def owner(self, customer_id: str) -> str:
+        """Return the node that owns this customer's RAG state."""
+        return max(self._nodes, key=lambda node: self._weighted_score(node, customer_id))
+
+    def ranked(self, customer_id: str) -> List[str]:
+        """All nodes in preference order — the fallback chain if the owner is down."""
+        return sorted(
+            self._nodes,
+            key=lambda node: self._weighted_score(node, customer_id),
+            reverse=True,
+        )
+
+    def with_nodes(self, nodes: Iterable[str]) -> "RendezvousRouter":
+        return RendezvousRouter(nodes, self._weights)
+
+
+def router_from_env() -> Optional[RendezvousRouter]:
+    """Build the router from TENANT_AFFINITY_PEERS, or None when the mode is off."""
+    peers = [p.strip().rstrip("/") for p in os.environ.get("TENANT_AFFINITY_PEERS", "").split(",") if p.strip()]
+    if not peers:
+        return None
+    return RendezvousRouter(peers)
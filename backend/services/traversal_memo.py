@@ -0,0 +1,94 @@
+"""Memo of LLM branch decisions made during tree traversal.
+
+Every select_leaf traversal asks the LLM to pick children at each internal
+level, and the top levels of a tenant's tree see the same candidates for
+every query. This memo remembers, per index version, which children were
+chosen among a given candidate set for queries whose embeddings fall in the
+same locality-sensitive (random-hyperplane) bucket, so similar queries reuse
+the upper-level decisions and only pay for the final descent to the leaves.
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("avicon.traversal_memo")
+
+TRAVERSAL_MEMO_ENABLED = os.environ.get("RAG_TRAVERSAL_MEMO", "1") == "1"
+# Hyperplanes per bucket: more bits means only closer queries share decisions
+TRAVERSAL_MEMO_BITS = int(os.environ.get("RAG_TRAVERSAL_MEMO_BITS", "12"))
+TRAVERSAL_MEMO_MAX_ENTRIES = int(os.environ.get("RAG_TRAVERSAL_MEMO_MAX_ENTRIES", "4096"))
+
+
+def candidates_key(node_ids: Sequence[str]) -> str:
+    """Order-insensitive digest of a level's candidate node ids."""
+    return hashlib.sha256("\n".join(sorted(node_ids)).encode()).hexdigest()[:32]
+
+
+class TraversalMemo:
+    """Thread-safe LRU of (index version, candidates, query bucket) -> chosen node ids."""
+
+    def __init__(self, bits: int = TRAVERSAL_MEMO_BITS, max_entries: int = TRAVERSAL_MEMO_MAX_ENTRIES, seed: int = 0):
+        self._bits = max(1, bits)
+        self._max_entries = max(1, max_entries)
+        self._seed = seed
+        self._planes: Dict[int, np.ndarray] = {}  # Per embedding dimension
+        self._entries: OrderedDict[Tuple[str, str, str], List[str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._levels: Dict[int, Dict[str, int]] = {}
+
+    def bucket(self, embedding: Sequence[float]) -> str:
+        """Sign pattern of the embedding against fixed random hyperplanes."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            planes = self._planes.get(len(vector))
+            if planes is None:
+                rng = np.random.default_rng(self._seed)
+                planes = self._planes[len(vector)] = rng.standard_normal((self._bits, len(vector))).astype(np.float32)
+        bits = planes @ vector >= 0
+        return format(int("".join("1" if b else "0" for b in bits), 2), f"0{(self._bits + 3) // 4}x")
+
+    def _level(self, level: int) -> Dict[str, int]:
+        return self._levels.setdefault(level, {"hits": 0, "misses": 0})
+
+    def get(self, version: Optional[str], candidates: str, bucket: str, level: int) -> Optional[List[str]]:
+        key = (str(version), candidates, bucket)
+        with self._lock:
+            chosen = self._entries.get(key)
+            if chosen is None:
+                self._level(level)["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._level(level)["hits"] += 1
+            return chosen
+
+    def set(self, version: Optional[str], candidates: str, bucket: str, chosen: List[str]):
+        key = (str(version), candidates, bucket)
+        with self._lock:
+            self._entries[key] = list(chosen)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio overall and per level; each hit is one LLM selection call avoided."""
+        with self._lock:
+            levels = {level: dict(counts) for level, counts in sorted(self._levels.items())}
+            entries = len(self._entries)
+        hits = sum(c["hits"] for c in levels.values())
+        lookups = hits + sum(c["misses"] for c in levels.values())
+        for counts in levels.values():
+            total = counts["hits"] + counts["misses"]
+            counts["hit_ratio"] = round(counts["hits"] / total, 4) if total else 0.0
+        return {
+            "entries": entries,
+            "hits": hits,
+            "lookups": lookups,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "llm_calls_avoided": hits,
+            "levels": levels,
+        }
@@ -0,0 +1,235 @@
+"""TreeIndex construction helpers.
+
+Incremental insertion summarizes only the newly uploaded nodes into their own
+subtree and grafts it under the existing root layer, so ingest cost is
+proportional to the new content rather than to the tenant's whole corpus.
+
+Summaries are generated by AsyncTreeBuilder: the sibling groups of a level
+are summarized concurrently (bounded by RAG_TREE_BUILD_CONCURRENCY) with
+retries, while grouping and node placement stay exactly as in llama_index's
+GPTTreeIndexBuilder — so the resulting tree has the same shape.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("avicon.tree_builder")
+
+TREE_BUILD_CONCURRENCY = int(os.environ.get("RAG_TREE_BUILD_CONCURRENCY", "8"))
+TREE_BUILD_RETRIES = int(os.environ.get("RAG_TREE_BUILD_RETRIES", "3"))
+TREE_BUILD_BACKOFF = float(os.environ.get("RAG_TREE_BUILD_BACKOFF_SECONDS", "0.5"))
+
+
+class AsyncTreeBuilder:
+    """Bottom-up summary tree construction with bounded-parallel LLM calls.
+
+    Wraps a GPTTreeIndexBuilder for chunk grouping and parent-node creation,
+    and replaces only the summary generation. Per-level timings, call counts
+    and retries are collected in ``level_metrics``.
+    """
+
+    def __init__(
+        self,
+        num_children: int,
+        summary_prompt: Any,
+        llm: Any,
+        docstore: Any,
+        concurrency: int = TREE_BUILD_CONCURRENCY,
+        retries: int = TREE_BUILD_RETRIES,
+        backoff_seconds: float = TREE_BUILD_BACKOFF,
+    ):
+        from llama_index.core.indices.common_tree.base import GPTTreeIndexBuilder
+
+        self._builder = GPTTreeIndexBuilder(num_children, summary_prompt, llm=llm, docstore=docstore)
+        self.num_children = num_children
+        self._summary_prompt = summary_prompt
+        self._llm = llm
+        self._concurrency = max(1, concurrency)
+        self._retries = max(0, retries)
+        self._backoff = backoff_seconds
+        self.level_metrics: List[Dict[str, Any]] = []
+
+    async def _summarize(self, text_chunk: str, semaphore: asyncio.Semaphore, stats: Dict[str, Any]) -> str:
+        attempt = 0
+        while True:
+            async with semaphore:
+                try:
+                    return await self._llm.apredict(self._summary_prompt, context_str=text_chunk)
+                except Exception as e:
+                    if attempt >= self._retries:
+                        raise
+                    logger.warning(f"TREE_SUMMARY_RETRY | attempt={attempt + 1} | error={e}")
+            stats["retries"] += 1
+            await asyncio.sleep(self._backoff * (2 ** attempt))
+            attempt += 1
+
+    async def build_index_from_nodes(
+        self,
+        index_graph: Any,
+        cur_node_ids: Dict[int, str],
+        all_node_ids: Dict[int, str],
+        level: int = 0,
+    ) -> Any:
+        """Async counterpart of GPTTreeIndexBuilder.build_index_from_nodes."""
+        semaphore = asyncio.Semaphore(self._concurrency)
+        while len(cur_node_ids) > self.num_children:
+            started = time.perf_counter()
+            indices, cur_nodes_chunks, text_chunks = self._builder._prepare_node_and_text_chunks(cur_node_ids)
+            stats = {"level": level, "nodes": len(cur_node_ids), "summaries": len(text_chunks), "retries": 0}
+            summaries = await asyncio.gather(
+                *(self._summarize(chunk, semaphore, stats) for chunk in text_chunks)
+            )
+            new_node_dict = self._builder._construct_parent_nodes(
+                index_graph, indices, cur_nodes_chunks, summaries
+            )
+            all_node_ids.update(new_node_dict)
+            index_graph.root_nodes = new_node_dict
+
+            stats["seconds"] = round(time.perf_counter() - started, 3)
+            self.level_metrics.append(stats)
+            logger.info(
+                f"TREE_LEVEL | level={level} | nodes={stats['nodes']} | summaries={stats['summaries']} | "
+                f"retries={stats['retries']} | seconds={stats['seconds']}"
+            )
+            cur_node_ids = new_node_dict
+            level += 1
+
+        index_graph.root_nodes = cur_node_ids
+        return index_graph
+
+
+async def abuild_tree_index(
+    nodes: Sequence[Any],
+    llm: Optional[Any] = None,
+    metrics: Optional[List[Dict[str, Any]]] = None,
+    **builder_kwargs: Any,
+) -> Any:
+    """Build a new TreeIndex from leaf nodes — same tree as ``TreeIndex(nodes)``.
+
+    Per-level build metrics are appended to ``metrics`` when given.
+    """
+    from llama_index.core import Settings, StorageContext, TreeIndex
+    from llama_index.core.data_structs.data_structs import IndexGraph
+    from llama_index.core.prompts.default_prompts import DEFAULT_SUMMARY_PROMPT
+
+    llm = llm or Settings.llm
+    storage_context = StorageContext.from_defaults()
+    docstore = storage_context.docstore
+    docstore.add_documents(nodes, allow_update=True)
+
+    graph = IndexGraph()
+    for node in nodes:
+        graph.insert(node)
+
+    builder = AsyncTreeBuilder(10, DEFAULT_SUMMARY_PROMPT, llm=llm, docstore=docstore, **builder_kwargs)
+    await builder.build_index_from_nodes(graph, graph.all_nodes, graph.all_nodes)
+    if metrics is not None:
+        metrics.extend(builder.level_metrics)
+    return TreeIndex(index_struct=graph, storage_context=storage_context, llm=llm)
+
+
+def _content_key(node: Any) -> Tuple[Optional[str], str]:
+    """Dedupe key of a leaf: its source document and a hash of its text alone.
+
+    ``node.hash`` also covers metadata, which differs between uploads of the
+    same file (e.g. the per-upload temp name), so it cannot detect re-uploads.
+    The source keeps identical passages from different documents apart, so
+    each stays retrievable and citable.
+    """
+    from llama_index.core.schema import MetadataMode
+
+    digest = hashlib.sha256(node.get_content(metadata_mode=MetadataMode.NONE).encode()).hexdigest()
+    return node.metadata.get("source"), digest
+
+
+def _leaf_keys(index: Any) -> set:
+    """Content keys of every leaf already stored in the index."""
+    graph = index.index_struct
+    leaf_ids = [
+        node_id for node_id in graph.all_nodes.values()
+        if not graph.node_id_to_children_ids.get(node_id)
+    ]
+    return {_content_key(node) for node in index.docstore.get_nodes(leaf_ids, raise_error=False) if node}
+
+
+def insert_nodes(index: Any, nodes: Sequence[Any]) -> int:
+    """Synchronous wrapper around ``ainsert_nodes`` for callers without a running loop."""
+    return asyncio.run(ainsert_nodes(index, nodes))
+
+
+async def ainsert_nodes(
+    index: Any,
+    nodes: Sequence[Any],
+    metrics: Optional[List[Dict[str, Any]]] = None,
+    llm: Optional[Any] = None,
+    inserted: Optional[List[Any]] = None,
+    **builder_kwargs: Any,
+) -> int:
+    """Insert leaf nodes into an existing TreeIndex without rebuilding it.
+
+    1. Nodes whose text already exists as a leaf of the same source document
+       are skipped, so re-uploading a document does not duplicate it (other
+       metadata is not compared).
+    2. The new nodes are summarized bottom-up into a standalone subtree.
+    3. The subtree's roots join the existing root layer. Only if that layer now
+       exceeds ``num_children`` is it consolidated, which re-summarizes the top
+       level alone — existing branches are never re-summarized.
+
+    Returns the number of leaf nodes actually inserted. Per-level build
+    metrics are appended to ``metrics`` and the inserted leaves to
+    ``inserted`` when given; ``llm`` overrides the index's own LLM for the
+    new summaries.
+    """
+    existing = _leaf_keys(index)
+    new_nodes: List[Any] = []
+    for node in nodes:
+        key = _content_key(node)
+        if key in existing:
+            continue
+        existing.add(key)
+        new_nodes.append(node)
+    if inserted is not None:
+        inserted.extend(new_nodes)
+
+    if not new_nodes:
+        logger.info("TREE_INSERT | no new content")
+        return 0
+
+    graph = index.index_struct
+    docstore = index.docstore
+    builder = AsyncTreeBuilder(
+        index.num_children,
+        index.summary_template,
+        llm=llm or index._llm,
+        docstore=docstore,
+        **builder_kwargs,
+    )
+
+    docstore.add_documents(new_nodes, allow_update=True)
+    new_ids: Dict[int, str] = {}
+    next_index = max(graph.all_nodes, default=-1) + 1
+    for node in new_nodes:
+        graph.insert(node, index=next_index)
+        new_ids[next_index] = node.node_id
+        next_index += 1
+
+    old_roots = dict(graph.root_nodes)
+    await builder.build_index_from_nodes(graph, new_ids, graph.all_nodes)
+    merged_roots = {**old_roots, **graph.root_nodes}
+
+    if len(merged_roots) <= index.num_children:
+        graph.root_nodes = merged_roots
+    else:
+        await builder.build_index_from_nodes(graph, merged_roots, graph.all_nodes)
+
+    index.storage_context.index_store.add_index_struct(graph)
+    if metrics is not None:
+        metrics.extend(builder.level_metrics)
+    logger.info(
+        f"TREE_INSERT | inserted={len(new_nodes)} | skipped={len(nodes) - len(new_nodes)} | "
+        f"roots={len(graph.root_nodes)}"
+    )
+    return len(new_nodes)
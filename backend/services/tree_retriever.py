@@ -0,0 +1,143 @@
+"""Tree traversal with per-level progress reporting and optional pruning.
+
+Same select_leaf traversal as llama_index's TreeSelectLeafRetriever, but each
+level reports which branches were considered and chosen, so streaming
+endpoints can show progress while the (sequential) LLM selection calls run.
+
+Given a set of allowed node ids (e.g. the ancestors of BM25 hits), each level
+only considers candidates on those paths; a level whose allowed candidates
+fit within child_branch_factor needs no LLM selection call at all.
+
+Given a TraversalMemo, the choices made at internal levels are remembered
+and replayed for queries in the same embedding bucket; the last level, which
+picks the leaves themselves, is always decided by the LLM.
+"""
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from llama_index.core.indices.tree.select_leaf_retriever import TreeSelectLeafRetriever
+from llama_index.core.indices.utils import get_sorted_node_list
+from llama_index.core.schema import BaseNode, MetadataMode, QueryBundle
+
+from services.traversal_memo import TraversalMemo, candidates_key
+
+logger = logging.getLogger("avicon.tree_retriever")
+
+PREVIEW_CHARS = 80
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+def _preview(node: BaseNode) -> str:
+    text = " ".join(node.get_content(metadata_mode=MetadataMode.NONE).split())
+    return text if len(text) <= PREVIEW_CHARS else text[: PREVIEW_CHARS - 1] + "…"
+
+
+def parent_map(index_graph: Any) -> Dict[str, str]:
+    """child node_id -> parent node_id for every edge of the tree."""
+    return {
+        child: parent
+        for parent, children in index_graph.node_id_to_children_ids.items()
+        for child in children
+    }
+
+
+def ancestor_ids(parents: Dict[str, str], node_ids: Iterable[str]) -> Set[str]:
+    """The given nodes plus every node on their paths up to the root layer."""
+    allowed: Set[str] = set()
+    for node_id in node_ids:
+        while node_id is not None and node_id not in allowed:
+            allowed.add(node_id)
+            node_id = parents.get(node_id)
+    return allowed
+
+
+class ProgressTreeRetriever(TreeSelectLeafRetriever):
+    """TreeSelectLeafRetriever that calls ``on_level`` after every level.
+
+    ``allowed_ids`` restricts traversal to those nodes wherever at least one
+    candidate of a level is allowed. ``selection_calls`` counts LLM calls;
+    ``memo_hits`` counts the ones replayed from ``memo`` instead, which is
+    consulted under ``memo_key`` = (index version, query bucket).
+    """
+
+    def __init__(
+        self,
+        index,
+        on_level: Optional[ProgressCallback] = None,
+        allowed_ids: Optional[Set[str]] = None,
+        memo: Optional[TraversalMemo] = None,
+        memo_key: Optional[Tuple[Optional[str], str]] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(index, **kwargs)
+        self._on_level = on_level
+        self._allowed_ids = allowed_ids
+        self._memo = memo if memo_key is not None else None
+        self._memo_key = memo_key
+        self.selection_calls = 0
+        self.memo_hits = 0
+
+    def _select(self, cur_node_list: List[BaseNode], query_bundle: QueryBundle, level: int) -> List[BaseNode]:
+        """LLM branch choice for one level, replayed from the memo above the leaves."""
+        internal = self._memo is not None and any(
+            self._index_struct.get_children(node) for node in cur_node_list
+        )
+        if internal:
+            version, bucket = self._memo_key
+            key = candidates_key([node.node_id for node in cur_node_list])
+            chosen = self._memo.get(version, key, bucket, level)
+            if chosen is not None:
+                by_id = {node.node_id: node for node in cur_node_list}
+                if all(node_id in by_id for node_id in chosen):
+                    self.memo_hits += 1
+                    return [by_id[node_id] for node_id in chosen]
+
+        self.selection_calls += 1
+        selected_nodes = self._select_nodes(cur_node_list, query_bundle, level=level)
+        if internal and selected_nodes:
+            self._memo.set(version, key, bucket, [node.node_id for node in selected_nodes])
+        return selected_nodes
+
+    def _retrieve_level(
+        self,
+        cur_node_ids: Dict[int, str],
+        query_bundle: QueryBundle,
+        level: int = 0,
+    ) -> List[BaseNode]:
+        cur_nodes = {
+            index: self._docstore.get_node(node_id)
+            for index, node_id in cur_node_ids.items()
+        }
+        cur_node_list = get_sorted_node_list(cur_nodes)
+        if self._allowed_ids is not None:
+            pruned = [node for node in cur_node_list if node.node_id in self._allowed_ids]
+            cur_node_list = pruned or cur_node_list
+
+        if len(cur_node_list) > self.child_branch_factor:
+            selected_nodes = self._select(cur_node_list, query_bundle, level)
+        else:
+            selected_nodes = cur_node_list
+
+        children_nodes = {}
+        for node in selected_nodes:
+            children_nodes.update(self._index_struct.get_children(node))
+
+        if self._on_level is not None:
+            try:
+                self._on_level({
+                    "level": level,
+                    "candidates": len(cur_node_list),
+                    "selected": [
+                        {"node_id": node.node_id, "preview": _preview(node)}
+                        for node in selected_nodes
+                    ],
+                    "leaf": not children_nodes,
+                })
+            except Exception as e:
+                # Progress reporting must never break the traversal itself
+                logger.warning(f"TREE_PROGRESS_ERROR | level={level} | error={e}")
+
+        if not children_nodes:
+            return selected_nodes
+        return self._retrieve_level(children_nodes, query_bundle, level + 1)
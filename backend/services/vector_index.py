@@ -0,0 +1,189 @@
+"""In-process embedding index over a tenant's tree leaves.
+
+Leaf embeddings live in one contiguous, L2-normalised float32 matrix written
+into the TreeIndex snapshot and memory-mapped on load, so a query costs one
+embedding call plus a matrix-vector product instead of one LLM call per tree
+level. Tenants above ``VECTOR_IVF_MIN_ROWS`` leaves also get a coarse IVF
+partition: rows are stored grouped by k-means cluster, and a query only scans
+the ``nprobe`` clusters whose centroids are closest.
+"""
+import io
+import json
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("avicon.vector_index")
+
+VECTOR_MATRIX_ARTIFACT = "vectors.npy"
+VECTOR_CENTROIDS_ARTIFACT = "vectors_ivf.npy"
+VECTOR_META_ARTIFACT = "vectors.json"
+
+VECTOR_IVF_MIN_ROWS = int(os.environ.get("RAG_VECTOR_IVF_MIN_ROWS", "20000"))
+VECTOR_IVF_NPROBE = int(os.environ.get("RAG_VECTOR_IVF_NPROBE", "8"))
+VECTOR_EMBED_BATCH = int(os.environ.get("RAG_VECTOR_EMBED_BATCH", "64"))
+KMEANS_ITERATIONS = 10
+
+Embedder = Callable[[List[str]], List[List[float]]]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _kmeans(matrix: np.ndarray, clusters: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means. Returns (centroids, row -> cluster assignment)."""
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), clusters, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        for c in range(clusters):
+            members = matrix[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids, np.argmax(matrix @ centroids.T, axis=1)
+
+
+class VectorIndex:
+    """Cosine top-k search over (node_id, embedding) rows.
+
+    With ``centroids``/``offsets`` set, rows are stored cluster by cluster and
+    cluster ``c`` spans ``matrix[offsets[c]:offsets[c + 1]]``.
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        matrix: np.ndarray,
+        centroids: Optional[np.ndarray] = None,
+        offsets: Optional[List[int]] = None,
+    ):
+        self.ids = ids
+        self.matrix = matrix
+        self.centroids = centroids
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0
+
+    @classmethod
+    def build(
+        cls,
+        ids: Sequence[str],
+        embeddings: Any,
+        ivf_min_rows: int = VECTOR_IVF_MIN_ROWS,
+    ) -> "VectorIndex":
+        matrix = _normalize(np.asarray(embeddings, dtype=np.float32))
+        ids = list(ids)
+        if len(ids) < max(ivf_min_rows, 2):
+            return cls(ids, matrix)
+
+        clusters = max(2, int(math.sqrt(len(ids))))
+        centroids, assign = _kmeans(matrix, clusters)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=clusters)
+        offsets = [0] + np.cumsum(counts).tolist()
+        return cls([ids[i] for i in order], matrix[order], centroids, offsets)
+
+    @classmethod
+    def from_index(
+        cls,
+        index: Any,
+        embed: Embedder,
+        previous: Optional["VectorIndex"] = None,
+        batch_size: int = VECTOR_EMBED_BATCH,
+    ) -> "VectorIndex":
+        """Embed every leaf of a TreeIndex, reusing rows already in ``previous``."""
+        graph = index.index_struct
+        leaf_ids = [
+            node_id for node_id in graph.all_nodes.values()
+            if not graph.node_id_to_children_ids.get(node_id)
+        ]
+        known = {node_id: row for row, node_id in enumerate(previous.ids)} if previous else {}
+
+        missing = [node_id for node_id in leaf_ids if node_id not in known]
+        nodes = index.docstore.get_nodes(missing, raise_error=False)
+        texts = {node.node_id: node.get_content() for node in nodes if node}
+        fresh_ids = [node_id for node_id in missing if node_id in texts]
+        fresh: List[List[float]] = []
+        for start in range(0, len(fresh_ids), batch_size):
+            fresh.extend(embed([texts[node_id] for node_id in fresh_ids[start:start + batch_size]]))
+
+        ids = [node_id for node_id in leaf_ids if node_id in known] + fresh_ids
+        rows = [previous.matrix[known[node_id]] for node_id in ids[: len(ids) - len(fresh_ids)]]
+        rows.extend(np.asarray(vector, dtype=np.float32) for vector in fresh)
+        if not rows:
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+        logger.info(f"VECTOR_BUILD | leaves={len(ids)} | embedded={len(fresh_ids)} | reused={len(ids) - len(fresh_ids)}")
+        return cls.build(ids, np.vstack(rows))
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        top_k: int = 5,
+        nprobe: int = VECTOR_IVF_NPROBE,
+    ) -> List[Tuple[str, float]]:
+        """(node_id, cosine similarity) of the top_k closest leaves, best first."""
+        if not self.ids or top_k <= 0:
+            return []
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+
+        if self.centroids is None:
+            scores = self.matrix @ query
+            rows = _top_k(scores, top_k)
+            return [(self.ids[i], round(float(scores[i]), 4)) for i in rows]
+
+        probes = _top_k(self.centroids @ query, min(nprobe, len(self.centroids)))
+        spans = [(self.offsets[c], self.offsets[c + 1]) for c in probes]
+        row_ids = np.concatenate([np.arange(lo, hi) for lo, hi in spans])
+        scores = np.concatenate([self.matrix[lo:hi] @ query for lo, hi in spans])
+        best = _top_k(scores, top_k)
+        return [(self.ids[row_ids[i]], round(float(scores[i]), 4)) for i in best]
+
+    # ── Persistence ───────────────────────────────────
+
+    def to_artifacts(self) -> Dict[str, bytes]:
+        def npy(array: np.ndarray) -> bytes:
+            buffer = io.BytesIO()
+            np.save(buffer, np.ascontiguousarray(array, dtype=np.float32))
+            return buffer.getvalue()
+
+        artifacts = {
+            VECTOR_MATRIX_ARTIFACT: npy(self.matrix),
+            VECTOR_META_ARTIFACT: json.dumps({"ids": self.ids, "offsets": self.offsets}).encode(),
+        }
+        if self.centroids is not None:
+            artifacts[VECTOR_CENTROIDS_ARTIFACT] = npy(self.centroids)
+        return artifacts
+
+    @classmethod
+    def load(cls, snapshot_dir: Path) -> Optional["VectorIndex"]:
+        """Memory-map a snapshot's vectors; None if the snapshot has none."""
+        try:
+            meta = json.loads((snapshot_dir / VECTOR_META_ARTIFACT).read_bytes())
+            matrix = np.load(snapshot_dir / VECTOR_MATRIX_ARTIFACT, mmap_mode="r")
+            centroids = None
+            if meta["offsets"] is not None:
+                centroids = np.load(snapshot_dir / VECTOR_CENTROIDS_ARTIFACT)
+        except FileNotFoundError:
+            return None
+        return cls(meta["ids"], matrix, centroids, meta["offsets"])
@@ -38,6 +38,8 @@ HEALTH_CHECK_RETRIES=10
 HEALTH_CHECK_DELAY=3
 PORT="${PORT:-8001}"
 WORKERS="${WORKERS:-2}"
+# Tree index snapshots are shared by all workers; /home survives App Service restarts
+export RAG_INDEX_DIR="${RAG_INDEX_DIR:-/home/avicon_indexes}"
 
 log "INFO" "Starting Avicon Enterprise Backend deployment..."
 log "INFO" "Script directory: $SCRIPT_DIR"
@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 load_dotenv(".env")
 logging.basicConfig(level=logging.INFO)
 
-from services.rag_engine import process_and_store_documents, get_customer_response
+from services.rag_engine import aprocess_and_store_documents, get_customer_response
 from llama_index.core import Document
 
 async def main():
@@ -23,7 +23,7 @@ async def main():
     docs = [MockDoc(doc.text, doc.metadata)]
     
     print("----- PROCESSING -----")
-    count = process_and_store_documents(docs, "test_customer")
+    count = await aprocess_and_store_documents(docs, "test_customer")
     print(f"Stored {count} nodes.")
     
     print("----- QUERYING -----")
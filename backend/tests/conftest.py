@@ -0,0 +1,55 @@
+"""Shared fixtures for the RAG engine tests.
+
+llama_index and services.rag_engine are imported inside the fixtures:
+test_rag_engine replaces llama_index in sys.modules before importing the
+engine, so nothing here may import them at collection time.
+"""
+import pytest
+
+
+class Doc:
+    """LangChain-style document as produced by the parser and PII masker."""
+
+    def __init__(self, text, source="rfp.pdf"):
+        self.page_content = text
+        self.metadata = {"source": source}
+
+
+@pytest.fixture
+def llm():
+    """Model installed as ``Settings.llm``; override (or parametrize) per module."""
+    from llama_index.core.llms import MockLLM
+
+    return MockLLM(max_tokens=8)
+
+
+@pytest.fixture
+def embed_model():
+    """Model installed as ``Settings.embed_model``; override (or parametrize) per module."""
+    from llama_index.core.embeddings import MockEmbedding
+
+    return MockEmbedding(embed_dim=8)
+
+
+@pytest.fixture
+def rag_engine(tmp_path, monkeypatch, llm, embed_model):
+    """services.rag_engine on a throwaway index store with fresh in-memory caches.
+
+    The global llama_index ``Settings`` are restored afterwards, including any
+    model a test assigns itself. Modules layer their own overrides (retrieval
+    cache, traversal memo, feature flags...) on top with ``monkeypatch``.
+    """
+    from llama_index.core import Settings
+
+    from services import rag_engine
+    from services.index_store import IndexMemoryCache, IndexStore
+
+    monkeypatch.setattr(Settings, "_llm", Settings._llm)
+    monkeypatch.setattr(Settings, "_embed_model", Settings._embed_model)
+    monkeypatch.setattr(Settings, "_avicon_configured", True, raising=False)
+    Settings.llm = llm
+    Settings.embed_model = embed_model
+    monkeypatch.setattr(rag_engine, "_index_store", IndexStore(root=str(tmp_path / "indexes")))
+    monkeypatch.setattr(rag_engine, "_index_cache", IndexMemoryCache(budget_bytes=64 * 1024 * 1024))
+    monkeypatch.setattr(rag_engine, "_query_cache", rag_engine.QueryCache())
+    return rag_engine
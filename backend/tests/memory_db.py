@@ -0,0 +1,426 @@
+"""In-memory stand-in for the Motor database, shared by the tests and offline benchmark harnesses.
+
+Implements the subset of the collection API the routers, middleware and
+ingestion queue use: filters with dotted paths (including into arrays of
+sub-documents) and $in/$nin/$lt/$lte/$gt/$gte/$ne/$exists/$regex/$or/$and;
+$set (with the positional ``$``)/$unset/$inc/$push ($each/$slice) updates
+with upsert; inclusion or exclusion projections; sorted/limited cursors;
+distinct; and aggregate pipelines of $match/$sort/$skip/$limit/$group ($sum/$avg/$min/$max).
+Documents are deep-copied in and out, as with a real server round trip.
+"""
+import copy
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_MISSING = object()
+
+
+@dataclass
+class InsertOneResult:
+    inserted_id: Any
+
+
+@dataclass
+class UpdateResult:
+    matched_count: int
+    modified_count: int
+    upserted_id: Any = None
+
+
+@dataclass
+class DeleteResult:
+    deleted_count: int
+
+
+def _values(doc: Any, dotted: str) -> List[Any]:
+    """Every value at ``dotted``, fanning out over arrays as Mongo does."""
+    current = [doc]
+    for part in dotted.split("."):
+        found = []
+        for value in current:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    found.append(value[int(part)])
+                else:
+                    found.extend(v[part] for v in value if isinstance(v, dict) and part in v)
+        current = found
+    return current
+
+
+def _candidates(values: List[Any]) -> List[Any]:
+    """Values plus the elements of array values (a scalar condition matches either)."""
+    out = []
+    for value in values:
+        out.append(value)
+        if isinstance(value, list):
+            out.extend(value)
+    return out
+
+
+def _compare(op: str, value: Any, operand: Any) -> bool:
+    try:
+        if op == "$lt":
+            return value < operand
+        if op == "$lte":
+            return value <= operand
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported operator: {op}")
+
+
+def _match_condition(values: List[Any], cond: Any) -> bool:
+    if not (isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond)):
+        return any(v == cond for v in _candidates(values))
+    candidates = _candidates(values)
+    for op, operand in cond.items():
+        if op == "$options":
+            continue
+        if op == "$exists":
+            if bool(values) != bool(operand):
+                return False
+        elif op == "$ne":
+            if any(v == operand for v in candidates):
+                return False
+        elif op == "$in":
+            if not any(v in operand for v in candidates):
+                return False
+        elif op == "$nin":
+            if any(v in operand for v in candidates):
+                return False
+        elif op == "$regex":
+            flags = re.IGNORECASE if "i" in cond.get("$options", "") else 0
+            pattern = re.compile(operand, flags)
+            if not any(isinstance(v, str) and pattern.search(v) for v in candidates):
+                return False
+        elif not any(_compare(op, v, operand) for v in candidates if v is not None):
+            return False
+    return True
+
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    for key, cond in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in cond):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in cond):
+                return False
+        elif not _match_condition(_values(doc, key), cond):
+            return False
+    return True
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {k: doc[k] for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    for key in projection:
+        doc.pop(key, None)
+    return doc
+
+
+def _sort_key(field: str):
+    def key(doc):
+        value = next(iter(_values(doc, field)), None)
+        # None sorts first ascending, as in Mongo; mixed types by type name
+        return (value is not None, type(value).__name__ if value is not None else "", value if value is not None else 0)
+
+    return key
+
+
+def _sorted(docs: List[Dict[str, Any]], spec: Iterable[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    for field, direction in reversed(list(spec)):
+        docs = sorted(docs, key=_sort_key(field), reverse=direction < 0)
+    return docs
+
+
+def _sort_spec(key: Any, direction: Optional[int] = None) -> List[Tuple[str, int]]:
+    if isinstance(key, str):
+        return [(key, direction if direction is not None else 1)]
+    if isinstance(key, dict):
+        return list(key.items())
+    return list(key)
+
+
+class MemoryCursor:
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key: Any, direction: Optional[int] = None) -> "MemoryCursor":
+        self._sort = _sort_spec(key, direction)
+        return self
+
+    def skip(self, count: int) -> "MemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        self._limit = count
+        return self
+
+    def _results(self) -> List[Dict[str, Any]]:
+        docs = _sorted(self._docs, self._sort) if self._sort else self._docs
+        docs = docs[self._skip:]
+        return docs[: self._limit] if self._limit else docs
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        docs = self._results()
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        self._iter = iter(self._results())
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def _set_path(doc: Dict[str, Any], dotted: str, value: Any):
+    *parents, leaf = dotted.split(".")
+    target: Any = doc
+    for part in parents:
+        target = target[int(part)] if isinstance(target, list) else target.setdefault(part, {})
+    if isinstance(target, list):
+        target[int(leaf)] = value
+    else:
+        target[leaf] = value
+
+
+def _get_path(doc: Dict[str, Any], dotted: str) -> Any:
+    target: Any = doc
+    for part in dotted.split("."):
+        if isinstance(target, list) and part.isdigit() and int(part) < len(target):
+            target = target[int(part)]
+        elif isinstance(target, dict) and part in target:
+            target = target[part]
+        else:
+            return _MISSING
+    return target
+
+
+def _positional(doc: Dict[str, Any], key: str, query: Optional[Dict[str, Any]]) -> str:
+    """Resolve ``"editors.$.name"`` to the index of the array element the query matched."""
+    if ".$" not in key:
+        return key
+    prefix, _, rest = key.partition(".$")
+    array = _get_path(doc, prefix)
+    conditions = {k[len(prefix) + 1:]: v for k, v in (query or {}).items() if k.startswith(prefix + ".")}
+    for i, element in enumerate(array if isinstance(array, list) else []):
+        if isinstance(element, dict) and matches(element, conditions):
+            return f"{prefix}.{i}{rest}"
+    raise ValueError(f"The positional operator did not find the match needed from the query: {key}")
+
+
+def _apply(doc: Dict[str, Any], update: Dict[str, Any], query: Optional[Dict[str, Any]] = None):
+    for key, value in update.get("$set", {}).items():
+        _set_path(doc, _positional(doc, key, query), copy.deepcopy(value))
+    for key in update.get("$unset", {}):
+        *parents, leaf = key.split(".")
+        parent = _get_path(doc, ".".join(parents)) if parents else doc
+        if isinstance(parent, dict):
+            parent.pop(leaf, None)
+    for key, delta in update.get("$inc", {}).items():
+        current = _get_path(doc, key)
+        _set_path(doc, key, (0 if current is _MISSING else current) + delta)
+    for key, value in update.get("$push", {}).items():
+        current = _get_path(doc, key)
+        items = [] if current is _MISSING else list(current)
+        if isinstance(value, dict) and "$each" in value:
+            items.extend(copy.deepcopy(value["$each"]))
+            if "$slice" in value:
+                limit = value["$slice"]
+                items = items[limit:] if limit < 0 else items[:limit]
+        else:
+            items.append(copy.deepcopy(value))
+        _set_path(doc, key, items)
+
+
+def _upsert_base(query: Dict[str, Any]) -> Dict[str, Any]:
+    """Equality fields of a filter, which seed an upserted document."""
+    doc: Dict[str, Any] = {}
+    for key, cond in query.items():
+        if not key.startswith("$") and not (isinstance(cond, dict) and any(k.startswith("$") for k in cond)):
+            _set_path(doc, key, copy.deepcopy(cond))
+    return doc
+
+
+class MemoryCollection:
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.docs: List[Dict[str, Any]] = []
+
+    async def create_index(self, *args: Any, **kwargs: Any) -> str:
+        return "memory"
+
+    async def insert_one(self, doc: Dict[str, Any]) -> InsertOneResult:
+        # Like pymongo, the caller's document gains its _id
+        doc.setdefault("_id", uuid.uuid4().hex)
+        self.docs.append(copy.deepcopy(doc))
+        return InsertOneResult(doc["_id"])
+
+    async def insert_many(self, docs: List[Dict[str, Any]]):
+        return [(await self.insert_one(doc)).inserted_id for doc in docs]
+
+    def _matching(self, query: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [doc for doc in self.docs if matches(doc, query)]
+
+    async def find_one(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None):
+        for doc in self.docs:
+            if matches(doc, query):
+                return _project(doc, projection)
+        return None
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None) -> MemoryCursor:
+        return MemoryCursor([_project(doc, projection) for doc in self._matching(query)])
+
+    async def count_documents(self, query: Optional[Dict[str, Any]] = None) -> int:
+        return len(self._matching(query))
+
+    async def distinct(self, key: str, query: Optional[Dict[str, Any]] = None) -> List[Any]:
+        seen: List[Any] = []
+        for doc in self._matching(query):
+            for value in _candidates(_values(doc, key)):
+                if not isinstance(value, list) and value not in seen:
+                    seen.append(value)
+        return seen
+
+    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> UpdateResult:
+        for doc in self.docs:
+            if matches(doc, query):
+                _apply(doc, update, query)
+                return UpdateResult(1, 1)
+        if upsert:
+            doc = _upsert_base(query)
+            _apply(doc, update)
+            inserted = await self.insert_one(doc)
+            return UpdateResult(0, 0, inserted.inserted_id)
+        return UpdateResult(0, 0)
+
+    async def update_many(self, query: Dict[str, Any], update: Dict[str, Any]) -> UpdateResult:
+        docs = self._matching(query)
+        for doc in docs:
+            _apply(doc, update, query)
+        return UpdateResult(len(docs), len(docs))
+
+    async def find_one_and_update(
+        self,
+        query: Dict[str, Any],
+        update: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        return_document: Any = False,
+        upsert: bool = False,
+    ):
+        for doc in self.docs:
+            if matches(doc, query):
+                before = _project(doc, projection)
+                _apply(doc, update, query)
+                # pymongo's ReturnDocument.AFTER is True
+                return _project(doc, projection) if return_document else before
+        if upsert:
+            doc = _upsert_base(query)
+            _apply(doc, update)
+            await self.insert_one(doc)
+            return _project(doc, projection) if return_document else None
+        return None
+
+    async def delete_one(self, query: Dict[str, Any]) -> DeleteResult:
+        for i, doc in enumerate(self.docs):
+            if matches(doc, query):
+                del self.docs[i]
+                return DeleteResult(1)
+        return DeleteResult(0)
+
+    async def delete_many(self, query: Dict[str, Any]) -> DeleteResult:
+        keep = [doc for doc in self.docs if not matches(doc, query)]
+        deleted = len(self.docs) - len(keep)
+        self.docs = keep
+        return DeleteResult(deleted)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]]) -> MemoryCursor:
+        docs = [copy.deepcopy(doc) for doc in self.docs]
+        for stage in pipeline:
+            (op, spec), = stage.items()
+            if op == "$match":
+                docs = [doc for doc in docs if matches(doc, spec)]
+            elif op == "$sort":
+                docs = _sorted(docs, _sort_spec(spec))
+            elif op == "$skip":
+                docs = docs[spec:]
+            elif op == "$limit":
+                docs = docs[:spec]
+            elif op == "$group":
+                docs = _group(docs, spec)
+            else:
+                raise ValueError(f"Unsupported aggregation stage: {op}")
+        return MemoryCursor(docs)
+
+
+def _expr(doc: Dict[str, Any], expr: Any) -> Any:
+    if isinstance(expr, str) and expr.startswith("$"):
+        return next(iter(_values(doc, expr[1:])), None)
+    return expr
+
+
+def _group(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for doc in docs:
+        groups.setdefault(_expr(doc, spec["_id"]), []).append(doc)
+    out = []
+    for key, members in groups.items():
+        row = {"_id": key}
+        for name, accumulator in spec.items():
+            if name == "_id":
+                continue
+            (op, expr), = accumulator.items()
+            values = [v for v in (_expr(doc, expr) for doc in members) if isinstance(v, (int, float))]
+            if op == "$sum":
+                row[name] = sum(values)
+            elif op == "$avg":
+                row[name] = sum(values) / len(values) if values else None
+            elif op == "$min":
+                row[name] = min(values) if values else None
+            elif op == "$max":
+                row[name] = max(values) if values else None
+            else:
+                raise ValueError(f"Unsupported accumulator: {op}")
+        out.append(row)
+    return out
+
+
+class MemoryDB:
+    """Collections are created on first access, by attribute or item."""
+
+    def __init__(self, name: str = "memory"):
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name)
+        return self._collections[name]
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.bm25 import BM25_ARTIFACT, BM25Index, tokenize
+from tests.conftest import Doc
+
+CORPUS = [
+    ("n1", "EASA Part-145 approval covers base maintenance of the A320 fleet"),
+    ("n2", "Fuel uplift uses Jet A-1 at all outstations"),
+    ("n3", "Cabin crew training is renewed every twelve months"),
+    ("n4", "Part-145 audits are scheduled each quarter by quality"),
+]
+
+
+def test_tokenize_keeps_compound_identifiers_and_parts():
+    assert tokenize("What is the EASA Part-145 scope?") == ["easa", "part-145", "part", "145", "scope"]
+
+
+def test_rank_and_confidence():
+    bm25 = BM25Index.build(CORPUS)
+
+    match = bm25.match("Jet A-1 fuel", top_k=2)
+    assert match.hits[0][0] == "n2"
+    assert match.is_confident(0.8, 2)
+
+    # Shared terms only partly cover the query: no lexical shortcut
+    assert not bm25.match("part-145 engine borescope limits").is_confident(0.8, 5)
+    assert bm25.match("weather radar").hits == []
+
+
+def test_round_trip_bytes():
+    bm25 = BM25Index.build(CORPUS)
+    restored = BM25Index.from_bytes(bm25.to_bytes())
+    assert restored.search("part-145 audits") == bm25.search("part-145 audits")
+    assert len(restored) == 4
+
+
+@pytest.fixture
+def engine(rag_engine):
+    docs = [Doc(f"# Section {i}\nRequirement {i} covers topic{i} handling") for i in range(60)]
+    docs.append(Doc("# Fuel\nJet A-1 uplift at outstations"))
+    rag_engine.process_and_store_documents(docs, "cust-1")
+    return rag_engine
+
+
+def _ask(engine, query, mode):
+    return asyncio.run(engine.get_customer_response("cust-1", query, use_cache=False, retrieval_mode=mode))
+
+
+def test_bm25_artifact_is_persisted_with_snapshot(engine):
+    version = engine._index_store.current_version("cust-1")
+    data = engine._index_store.read_artifact("cust-1", version, BM25_ARTIFACT)
+    assert data and BM25Index.from_bytes(data).search("jet a-1")
+
+
+def test_modes_trade_llm_selection_calls(engine):
+    tree = _ask(engine, "Jet A-1 uplift", "tree")["retrieval"]
+    hybrid = _ask(engine, "Jet A-1 uplift", "hybrid")
+    pruned = _ask(engine, "topic7 borescope limits", "hybrid")["retrieval"]
+
+    assert tree["route"] == "tree" and tree["selection_calls"] > 0
+    assert hybrid["retrieval"] == {"mode": "hybrid", "route": "lexical", "selection_calls": 0}
+    assert hybrid["sources"][0]["source"] == "rfp.pdf"
+    assert pruned["route"] == "pruned" and pruned["selection_calls"] < tree["selection_calls"]
+    assert engine.get_retrieval_metrics()["routes"].keys() >= {"tree", "lexical", "pruned"}
+
+
+def test_unknown_mode_is_rejected(engine):
+    with pytest.raises(ValueError):
+        _ask(engine, "fuel", "vector-ish")
+
+
+def test_cold_load_runs_off_the_event_loop_once_per_tenant(engine, monkeypatch):
+    engine._index_cache.pop("cust-1")
+    loads, parses = [], []
+    load_versioned, from_bytes = engine._index_store.load_versioned, BM25Index.from_bytes
+
+    def tracked_load(customer_id):
+        loads.append(threading.get_ident())
+        return load_versioned(customer_id)
+
+    def tracked_parse(data):
+        parses.append(threading.get_ident())
+        return from_bytes(data)
+
+    monkeypatch.setattr(engine._index_store, "load_versioned", tracked_load)
+    monkeypatch.setattr(BM25Index, "from_bytes", staticmethod(tracked_parse))
+
+    async def burst():
+        return threading.get_ident(), await asyncio.gather(*(
+            engine.get_customer_response("cust-1", "Jet A-1 uplift", use_cache=False, retrieval_mode="hybrid")
+            for _ in range(4)
+        ))
+
+    loop_thread, results = asyncio.run(burst())
+    assert all(r["retrieval"]["route"] == "lexical" for r in results)
+    assert len(loads) == 1 and len(parses) == 1
+    assert loop_thread not in loads + parses
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import threading
+import uuid
+
+import pytest
+
+from services import document_parser, simulated_providers
+from services.index_store import IndexMemoryCache
+from services.semantic_cache import SemanticCache
+from services.simulated_providers import SimulationProfile
+from tests.conftest import Doc
+
+
+@pytest.fixture
+def engine(rag_engine, monkeypatch):
+    monkeypatch.setattr(rag_engine, "VERSION_CHECK_INTERVAL", 0)
+    # MockEmbedding gives every text the same vector; keep the semantic tier out of it
+    monkeypatch.setattr(rag_engine, "SEMANTIC_CACHE_ENABLED", False)
+    rag_engine.process_and_store_documents([
+        Doc("# Fuel\nJet A-1 fuel only", "fuel.pdf"),
+        Doc("# Gear\nLanding gear overhaul every 10 years", "gear.pdf"),
+    ], "cust-1")
+    return rag_engine
+
+
+def _ask(engine, query):
+    return asyncio.run(engine.get_customer_response("cust-1", query, retrieval_mode="lexical"))
+
+
+def _cached(engine, query):
+    return engine._query_cache.get("cust-1", query, "lexical") is not None
+
+
+def test_upload_keeps_unrelated_answers(engine):
+    _ask(engine, "fuel grade")
+    _ask(engine, "landing gear overhaul")
+    assert _cached(engine, "landing gear overhaul")
+
+    engine.process_and_store_documents([Doc("# Gear\nGear overhaul moved to 12 years", "gear-v2.pdf")], "cust-1")
+
+    assert _cached(engine, "fuel grade")
+    assert not _cached(engine, "landing gear overhaul")
+
+
+def test_upload_describes_only_inserted_chunks(engine):
+    _ask(engine, "fuel grade")
+    _ask(engine, "landing gear overhaul")
+
+    # fuel.pdf is re-sent unchanged alongside the new gear content
+    engine.process_and_store_documents([
+        Doc("# Fuel\nJet A-1 fuel only", "fuel.pdf"),
+        Doc("# Gear\nGear overhaul moved to 12 years", "gear-v2.pdf"),
+    ], "cust-1")
+
+    changes = engine._index_store.read_artifact(
+        "cust-1", engine._index_store.current_version("cust-1"), engine.CHANGES_ARTIFACT
+    )
+    assert json.loads(changes)["documents"] == ["gear-v2.pdf"]
+    assert _cached(engine, "fuel grade") and not _cached(engine, "landing gear overhaul")
+
+
+def test_other_worker_upload_invalidates_only_affected(engine, monkeypatch):
+    _ask(engine, "fuel grade")
+    _ask(engine, "landing gear overhaul")
+    local_index_cache, local_query_cache = engine._index_cache, engine._query_cache
+
+    # Another worker (its own in-memory caches) publishes a newer snapshot
+    monkeypatch.setattr(engine, "_index_cache", IndexMemoryCache(budget_bytes=64 * 1024 * 1024))
+    monkeypatch.setattr(engine, "_query_cache", engine.QueryCache())
+    engine.process_and_store_documents([Doc("# Gear\nGear overhaul moved to 12 years", "gear-v2.pdf")], "cust-1")
+    monkeypatch.setattr(engine, "_index_cache", local_index_cache)
+    monkeypatch.setattr(engine, "_query_cache", local_query_cache)
+
+    engine._sync_index_version("cust-1")
+
+    assert _cached(engine, "fuel grade")
+    assert not _cached(engine, "landing gear overhaul")
+
+
+def test_query_path_reads_current_off_the_event_loop(engine, monkeypatch):
+    _ask(engine, "fuel grade")  # Loads the tenant's index
+    threads = []
+    current_version = engine._index_store.current_version
+
+    def tracked(customer_id):
+        threads.append(threading.get_ident())
+        return current_version(customer_id)
+
+    monkeypatch.setattr(engine._index_store, "current_version", tracked)
+    _ask(engine, "landing gear overhaul")
+
+    assert threads and threading.get_ident() not in threads
+
+
+def test_stale_answer_served_while_refreshing(engine, monkeypatch):
+    monkeypatch.setattr(engine, "_query_cache", engine.QueryCache(ttl_seconds=0.1, stale_seconds=60))
+
+    async def scenario():
+        first = await engine.get_customer_response("cust-1", "fuel grade", retrieval_mode="lexical")
+        await asyncio.sleep(0.15)
+        stale = await engine.get_customer_response("cust-1", "fuel grade", retrieval_mode="lexical")
+        await asyncio.gather(*engine._refresh_tasks.values())
+        return first, stale
+
+    first, stale = asyncio.run(scenario())
+
+    assert stale["cached"] is True and stale["response"] == first["response"]
+    assert _cached(engine, "fuel grade")  # Refreshed within the TTL again
+    stats = engine.get_query_cache_metrics()
+    assert (stats["stale_hits"], stats["refreshes"], stats["refreshing"]) == (1, 1, 0)
+
+
+def test_answers_are_kept_apart_per_retrieval_mode(engine, monkeypatch):
+    # Every query is a semantic match under MockEmbedding; only the mode tells them apart
+    monkeypatch.setattr(engine, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(engine, "_semantic_cache", SemanticCache(audit_rate=0))
+    _ask(engine, "fuel grade")
+
+    tree = asyncio.run(engine.get_customer_response("cust-1", "fuel grade", retrieval_mode="tree"))
+    assert tree["cached"] is False and tree["retrieval"]["mode"] == "tree"
+    rephrased = asyncio.run(engine.get_customer_response("cust-1", "which fuel?", retrieval_mode="tree"))
+    assert rephrased["cached"] is True and rephrased["retrieval"]["mode"] == "tree"
+    assert _ask(engine, "fuel grade")["retrieval"]["mode"] == "lexical"
+
+
+def test_reuploaded_document_invalidates_by_original_filename(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(simulated_providers, "SIMULATED_PROVIDERS", True)
+    monkeypatch.setattr(simulated_providers, "_profile", SimulationProfile.instant())
+
+    async def upload(text):
+        # Each upload is spooled under a fresh temp name, as the upload router does
+        path = tmp_path / f"{uuid.uuid4().hex}_brakes.md"
+        path.write_text(text)
+        parsed = await document_parser.load_document(str(path))
+        masked = await document_parser.mask_documents(parsed, str(path), "cust-1", source="brakes.md")
+        return await engine.aprocess_and_store_documents(masked, "cust-1")
+
+    asyncio.run(upload("# Brakes\nCarbon brake wear pin check"))
+    assert _ask(engine, "brake wear pin")["sources"][0]["source"] == "brakes.md"
+    assert engine._query_cache.invalidate_documents("cust-1", ["brakes.md"]) == 1
+    assert not _cached(engine, "brake wear pin")
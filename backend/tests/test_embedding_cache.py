@@ -0,0 +1,94 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from llama_index.core.embeddings import MockEmbedding
+
+from services.embedding_cache import CachedEmbedding, EmbeddingStore
+
+
+class CountingEmbedding(MockEmbedding):
+    """MockEmbedding that records the size of every remote batch."""
+    batches: list = []
+
+    def _get_text_embeddings(self, texts):
+        self.batches.append(len(texts))
+        return [[float(len(t)), 1.0, 0.5, 0.25] for t in texts]
+
+    async def _aget_text_embeddings(self, texts):
+        return self._get_text_embeddings(texts)
+
+
+def _model(tmp_path, dtype="float16"):
+    inner = CountingEmbedding(embed_dim=4, embed_batch_size=2, batches=[])
+    return CachedEmbedding(inner, EmbeddingStore(str(tmp_path / "embed.sqlite3"), dtype=dtype)), inner
+
+
+def test_only_changed_text_is_embedded(tmp_path):
+    model, inner = _model(tmp_path)
+    first = model.get_text_embedding_batch(["fuel", "gear", "cabin"])
+    second = model.get_text_embedding_batch(["fuel", "gear", "cabin", "galley", "fuel"])
+
+    assert inner.batches == [2, 1, 1]  # Three texts in batches of 2, then only "galley"
+    assert np.allclose(second[:3], first) and second[4] == second[0]
+    stats = model._store.stats()
+    assert (stats["hits"], stats["misses"], stats["remote_batches"]) == (4, 4, 3)
+
+
+def test_store_is_compact_and_shared(tmp_path):
+    model, inner = _model(tmp_path)
+    asyncio.run(model.aget_text_embedding_batch(["a" * 7]))
+
+    store = EmbeddingStore(str(tmp_path / "embed.sqlite3"))  # Another worker
+    key = EmbeddingStore.make_key(model.model_name, "text", "a" * 7)
+    assert store.get_many([key]) == {key: [7.0, 1.0, 0.5, 0.25]}
+    blob = store._conn().execute("SELECT vector FROM embeddings").fetchone()[0]
+    assert len(blob) == 4 * 2  # float16
+
+
+def test_query_embeddings_are_cached_separately(tmp_path):
+    model, _ = _model(tmp_path, dtype="float32")
+    model.get_query_embedding("fuel grade")
+    model.get_query_embedding("fuel grade")
+
+    assert model._store.stats()["hits"] == 1
+    assert model.get_text_embedding_batch(["fuel grade"]) and model._store.stats()["misses"] == 2
+
+
+def test_ttl_and_lru_bound(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embed.sqlite3"), ttl_seconds=0.2, max_entries=2)
+    for i in range(3):
+        store.put_many({f"k{i}": [float(i)]})
+        time.sleep(0.01)
+    store.get_many(["k0"])  # Recently used: survives the trim
+
+    assert store.trim() == 1 and sorted(store.get_many(["k0", "k1", "k2"])) == ["k0", "k2"]
+    time.sleep(0.25)
+    assert store.get_many(["k0", "k2"]) == {}
+    assert store.trim() == 2 and len(store) == 0
+
+
+def test_store_from_before_timestamps_is_replaced(tmp_path):
+    path = str(tmp_path / "embed.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE embeddings (key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL)")
+
+    store = EmbeddingStore(path)
+    store.put_many({"k": [1.0]})
+    assert store.get_many(["k"]) == {"k": [1.0]}
+
+
+def test_async_paths_touch_sqlite_off_the_event_loop(tmp_path):
+    model, _ = _model(tmp_path)
+    threads = []
+    get_many = model._store.get_many
+    model._store.get_many = lambda keys: threads.append(threading.get_ident()) or get_many(keys)
+
+    async def run():
+        await model.aget_text_embedding_batch(["fuel"])
+        await model.aget_query_embedding("fuel grade")
+
+    asyncio.run(run())
+    assert len(threads) == 2 and threading.get_ident() not in threads
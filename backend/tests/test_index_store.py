@@ -0,0 +1,211 @@
+import json
+from pathlib import Path
+
+from services.index_store import IndexMemoryCache, IndexStore
+
+
+class DummyStorageContext:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def persist(self, persist_dir):
+        path = Path(persist_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        (path / "index.json").write_text(json.dumps(self.payload))
+
+
+class DummyIndex:
+    """Mock TreeIndex exposing only the storage context used for persistence."""
+    def __init__(self, payload):
+        self.storage_context = DummyStorageContext(payload)
+
+
+def _json_loader(persist_dir):
+    return json.loads((Path(persist_dir) / "index.json").read_text())
+
+
+def test_index_store_round_trip(tmp_path):
+    store = IndexStore(root=tmp_path, loader=_json_loader)
+    store.persist("cust1", DummyIndex({"nodes": 3}))
+
+    assert store.exists("cust1")
+    assert store.load("cust1") == {"nodes": 3}
+
+
+def test_index_store_missing_customer(tmp_path):
+    store = IndexStore(root=tmp_path, loader=_json_loader)
+    assert store.load("nobody") is None
+    assert not store.exists("nobody")
+
+
+def test_index_store_replaces_previous_snapshot(tmp_path):
+    store = IndexStore(root=tmp_path, loader=_json_loader)
+    store.persist("cust1", DummyIndex({"v": 1}))
+    store.persist("cust1", DummyIndex({"v": 2}))
+
+    assert store.load("cust1") == {"v": 2}
+    # No scratch directories are left behind
+    tenant_dir = store._tenant_dir("cust1")
+    assert not [p for p in tenant_dir.iterdir() if p.name.endswith(".tmp")]
+
+
+def test_index_store_tenant_isolation(tmp_path):
+    store = IndexStore(root=tmp_path, loader=_json_loader)
+    store.persist("cust1", DummyIndex({"owner": "cust1"}))
+    store.persist("../cust1", DummyIndex({"owner": "evil"}))
+
+    assert store.load("cust1") == {"owner": "cust1"}
+    assert store._tenant_dir("../cust1").parent == tmp_path
+
+
+def test_index_store_corrupt_snapshot_returns_none(tmp_path):
+    def broken_loader(persist_dir):
+        raise ValueError("corrupt")
+
+    store = IndexStore(root=tmp_path, loader=broken_loader)
+    store.persist("cust1", DummyIndex({}))
+    assert store.load("cust1") is None
+
+
+def test_index_store_delete(tmp_path):
+    store = IndexStore(root=tmp_path, loader=_json_loader)
+    store.persist("cust1", DummyIndex({}))
+    store.delete("cust1")
+    assert store.load("cust1") is None
+
+
+def test_index_store_versions_are_published(tmp_path):
+    store = IndexStore(root=tmp_path, loader=_json_loader)
+    assert store.current_version("cust1") is None
+
+    v1 = store.persist("cust1", DummyIndex({"v": 1}))
+    v2 = store.persist("cust1", DummyIndex({"v": 2}))
+
+    assert v1 < v2
+    assert store.current_version("cust1") == v2
+    assert store.load_versioned("cust1") == ({"v": 2}, v2)
+
+
+def test_index_store_prunes_old_snapshots(tmp_path):
+    store = IndexStore(root=tmp_path, loader=_json_loader)
+    versions = [store.persist("cust1", DummyIndex({"v": i})) for i in range(5)]
+
+    tenant_dir = store._tenant_dir("cust1")
+    kept = sorted(p.name for p in tenant_dir.iterdir() if p.is_dir())
+    assert kept == versions[-2:]
+
+
+def test_index_store_shared_between_workers(tmp_path):
+    """A snapshot written by one worker's store is visible to another's."""
+    worker_a = IndexStore(root=tmp_path, loader=_json_loader)
+    worker_b = IndexStore(root=tmp_path, loader=_json_loader)
+
+    version = worker_a.persist("cust1", DummyIndex({"built_by": "a"}))
+
+    assert worker_b.current_version("cust1") == version
+    assert worker_b.load("cust1") == {"built_by": "a"}
+
+
+def test_index_store_lock_released_after_use(tmp_path):
+    store = IndexStore(root=tmp_path, loader=_json_loader)
+    with store.lock("cust1"):
+        store.persist("cust1", DummyIndex({"v": 1}))
+    with store.lock("cust1"):
+        assert store.load("cust1") == {"v": 1}
+
+
+def test_snapshot_bytes(tmp_path):
+    store = IndexStore(root=tmp_path, loader=_json_loader)
+    version = store.persist("cust1", DummyIndex({"payload": "x" * 100}))
+    assert store.snapshot_bytes("cust1", version) > 100
+    assert store.snapshot_bytes("cust1", "missing") == 0
+
+
+def test_index_bytes_counts_only_deserialized_files(tmp_path):
+    store = IndexStore(root=tmp_path, loader=_json_loader)
+    version = store.persist("cust1", DummyIndex({}), artifacts={
+        "docstore.json": b"d" * 300,
+        "index_store.json": b"i" * 50,
+        "vectors.npy": b"v" * 4000,
+        "bm25.json": b"b" * 700,
+    })
+    assert store.index_bytes("cust1", version) == 350
+    assert store.snapshot_bytes("cust1", version) > 5000
+    assert store.index_bytes("cust1", "missing") == 0
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = IndexMemoryCache(budget_bytes=100)
+    cache.put("a", "idx-a", "v1", 40)
+    cache.put("b", "idx-b", "v1", 40)
+    cache.get("a")  # a is now most recently used
+    cache.put("c", "idx-c", "v1", 40)  # over budget: evicts b
+
+    assert cache.get("b") is None
+    assert cache.get("a")["index"] == "idx-a"
+    assert cache.get("c")["index"] == "idx-c"
+    stats = cache.stats()
+    assert stats["used_bytes"] == 80
+    assert stats["evictions"] == 1
+
+
+def test_memory_cache_charge_evicts_others_and_checks_version():
+    cache = IndexMemoryCache(budget_bytes=100)
+    cache.put("a", "idx-a", "v1", 40)
+    cache.put("b", "idx-b", "v1", 40)
+
+    # a is least recently used, but it is the tenant being charged: b goes
+    assert cache.charge("a", "v1", 30)
+    assert cache.peek("b") is None and cache.tenant_bytes("a") == 70
+    assert cache.charge("a", "v0", 10) is False
+    assert cache.stats()["used_bytes"] == 70
+
+
+def test_memory_cache_keeps_single_oversized_index():
+    cache = IndexMemoryCache(budget_bytes=10)
+    cache.put("a", "idx-a", "v1", 50)
+    cache.put("b", "idx-b", "v1", 50)
+
+    assert cache.get("a") is None
+    assert cache.get("b")["index"] == "idx-b"
+    assert cache.stats()["tenants"] == 1
+
+
+def test_memory_cache_replaces_and_reaccounts():
+    cache = IndexMemoryCache(budget_bytes=1000)
+    cache.put("a", "old", "v1", 100)
+    cache.put("a", "new", "v2", 300)
+
+    assert cache.get("a")["index"] == "new"
+    assert cache.stats()["used_bytes"] == 300
+    # An older version loaded concurrently never overwrites a newer one
+    assert cache.put("a", "stale", "v0", 10) is False
+    assert cache.get("a")["index"] == "new"
+
+
+def test_memory_cache_pop_only_matching_version():
+    cache = IndexMemoryCache(budget_bytes=1000)
+    cache.put("a", "idx", "v2", 100)
+
+    assert cache.pop("a", version="v1") is None
+    assert cache.pop("a", version="v2")["index"] == "idx"
+    assert cache.stats()["used_bytes"] == 0
+
+
+def test_memory_cache_report_per_tenant():
+    cache = IndexMemoryCache(budget_bytes=1000)
+    cache.put("small", "i", "v1", 10)
+    cache.put("large", "i", "v1", 500)
+
+    assert cache.report() == {"large": 500, "small": 10}
+    assert cache.tenant_bytes("large") == 500
+    assert cache.tenant_bytes("missing") == 0
+
+
+def test_memory_cache_version_check_is_rate_limited():
+    cache = IndexMemoryCache(budget_bytes=1000)
+    assert cache.claim_version_check("a", 0.0) == (False, None)
+
+    cache.put("a", "idx", "v1", 10)
+    assert cache.claim_version_check("a", 60.0) == (False, None)
+    assert cache.claim_version_check("a", 0.0) == (True, "v1")
@@ -0,0 +1,231 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services import ingestion
+from services.ingestion import NODE, IngestionQueue, new_job
+from tests.memory_db import MemoryCollection, MemoryDB
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    calls = {"active": 0, "peak": 0}
+
+    async def load_document(path):
+        return [f"parsed:{path}"]
+
+    async def mask_documents(docs, path, customer_id, source=None):
+        calls["source"] = source
+        return [f"masked:{d}" for d in docs]
+
+    async def index(docs, customer_id):
+        calls["active"] += 1
+        calls["peak"] = max(calls["peak"], calls["active"])
+        await asyncio.sleep(0.02)
+        calls["active"] -= 1
+        return len(docs) * 7
+
+    monkeypatch.setattr(ingestion, "load_document", load_document)
+    monkeypatch.setattr(ingestion, "mask_documents", mask_documents)
+    monkeypatch.setattr(ingestion, "aprocess_and_store_documents", index)
+    return calls
+
+
+def _spool(tmp_path, name="rfp.pdf"):
+    path = tmp_path / name
+    path.write_bytes(b"%PDF")
+    return str(path)
+
+
+def test_job_runs_all_stages_and_cleans_up(tmp_path, pipeline):
+    db = MemoryDB()
+    path = _spool(tmp_path, "3f2a9c_rfp.pdf")
+
+    async def run():
+        queue = IngestionQueue(db, workers=1)
+        await queue.start()
+        job = await queue.submit("cust-1", "rfp.pdf", path)
+        await queue._queue.join()
+        await queue.stop()
+        return await queue.get(job["job_id"], "cust-1")
+
+    job = asyncio.run(run())
+
+    assert job["status"] == "succeeded"
+    assert job["chunks_created"] == 7
+    assert all(job["stages"][s]["status"] == "done" for s in ("parse", "mask", "index"))
+    assert all(job["stages"][s]["duration_ms"] >= 0 for s in ("parse", "mask", "index"))
+    assert "path" not in job and "lease_until" not in job
+    assert pipeline["source"] == "rfp.pdf"  # Chunks are named as uploaded, not by temp name
+    assert not (tmp_path / "3f2a9c_rfp.pdf").exists()
+
+
+def test_failed_stage_is_recorded(tmp_path, pipeline, monkeypatch):
+    async def broken_mask(docs, path, customer_id, source=None):
+        raise ValueError("presidio exploded")
+
+    monkeypatch.setattr(ingestion, "mask_documents", broken_mask)
+    db = MemoryDB()
+
+    async def run():
+        queue = IngestionQueue(db, workers=1, max_attempts=1)
+        await queue.start()
+        job = await queue.submit("cust-1", "rfp.pdf", _spool(tmp_path))
+        await queue._queue.join()
+        await queue.stop()
+        return await queue.get(job["job_id"], "cust-1")
+
+    job = asyncio.run(run())
+
+    assert job["status"] == "failed"
+    assert job["error"] == "mask failed: ValueError"
+    assert job["stages"]["parse"]["status"] == "done"
+    assert job["stages"]["mask"]["status"] == "failed"
+    assert job["stages"]["index"]["status"] == "pending"
+
+
+def test_failed_stage_is_retried_until_the_last_attempt(tmp_path, pipeline, monkeypatch):
+    failures = {"left": 1}
+
+    async def flaky_index(docs, customer_id):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise RuntimeError("429 Too Many Requests")
+        return 7
+
+    monkeypatch.setattr(ingestion, "aprocess_and_store_documents", flaky_index)
+    db = MemoryDB()
+
+    async def run(name):
+        # The sweep picks the requeued job up again, spooled file and all
+        queue = IngestionQueue(db, workers=1, max_attempts=2, sweep_seconds=0.05)
+        await queue.start()
+        await queue.submit("cust-1", name, _spool(tmp_path, name))
+        await _wait_for(lambda: db.ingestion_jobs.docs[-1]["status"] in ("succeeded", "failed"))
+        await queue.stop()
+        return db.ingestion_jobs.docs[-1]
+
+    job = asyncio.run(run("rfp.pdf"))
+    assert (job["status"], job["attempts"], job["chunks_created"]) == ("succeeded", 2, 7)
+
+    # Failing every attempt: the last one fails the job and drops the spooled file
+    failures["left"] = 2
+    job = asyncio.run(run("again.pdf"))
+    assert (job["status"], job["attempts"], job["error"]) == ("failed", 2, "index failed: RuntimeError")
+    assert not (tmp_path / "again.pdf").exists()
+
+
+def test_worker_pool_is_bounded(tmp_path, pipeline):
+    db = MemoryDB()
+
+    async def run():
+        queue = IngestionQueue(db, workers=2)
+        await queue.start()
+        for i in range(6):
+            await queue.submit("cust-1", f"doc{i}.pdf", _spool(tmp_path, f"doc{i}.pdf"))
+        await queue._queue.join()
+        await queue.stop()
+
+    asyncio.run(run())
+
+    assert pipeline["peak"] == 2
+    assert all(d["status"] == "succeeded" for d in db.ingestion_jobs.docs)
+
+
+def test_start_recovers_queued_and_orphaned_jobs(tmp_path, pipeline):
+    db = MemoryDB()
+    now = datetime.now(timezone.utc)
+    queued = new_job("cust-1", "a.pdf", _spool(tmp_path, "a.pdf"))
+    orphaned = dict(new_job("cust-1", "b.pdf", _spool(tmp_path, "b.pdf")),
+                    status="running", lease_until=now - timedelta(seconds=5), attempts=1)
+    leased = dict(new_job("cust-1", "c.pdf", _spool(tmp_path, "c.pdf")),
+                  status="running", lease_until=now + timedelta(minutes=5), attempts=1)
+    elsewhere = dict(new_job("cust-1", "d.pdf", _spool(tmp_path, "d.pdf")), node=f"{NODE}-other")
+    for job in (queued, orphaned, leased, elsewhere):
+        db.ingestion_jobs.docs.append(job)
+
+    async def run():
+        queue = IngestionQueue(db, workers=2)
+        await queue.start()
+        assert await queue.sweep() == 2
+        # Jobs already waiting locally are not queued twice
+        assert await queue.recover() == 0
+        await queue._queue.join()
+        await queue.stop()
+
+    asyncio.run(run())
+
+    status = {d["filename"]: d["status"] for d in db.ingestion_jobs.docs}
+    assert status == {"a.pdf": "succeeded", "b.pdf": "succeeded", "c.pdf": "running", "d.pdf": "queued"}
+
+
+async def _wait_for(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_sweep_requeues_job_whose_lease_expires_after_start(tmp_path, pipeline):
+    # A worker died mid-job just before this one started: its lease is still live
+    db = MemoryDB()
+    orphaned = dict(new_job("cust-1", "a.pdf", _spool(tmp_path, "a.pdf")), status="running",
+                    lease_until=datetime.now(timezone.utc) + timedelta(seconds=0.2), attempts=1)
+    db.ingestion_jobs.docs.append(orphaned)
+
+    async def run():
+        queue = IngestionQueue(db, workers=1, sweep_seconds=0.05)
+        await queue.start()
+        assert await queue.sweep() == 0
+        await _wait_for(lambda: db.ingestion_jobs.docs[0]["status"] == "succeeded")
+        await queue.stop()
+
+    asyncio.run(run())
+    assert db.ingestion_jobs.docs[0]["attempts"] == 2
+
+
+class UnreachableCollection(MemoryCollection):
+    """Fails like Motor does while Mongo cannot be reached."""
+
+    down = True
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("No servers found yet")
+
+    async def create_index(self, *args, **kwargs):
+        self._check()
+        return await super().create_index(*args, **kwargs)
+
+    def find(self, query, projection=None):
+        self._check()
+        return super().find(query, projection)
+
+
+def test_start_does_not_wait_for_mongo_and_recovers_later(tmp_path, pipeline):
+    db = MemoryDB()
+    db.ingestion_jobs = UnreachableCollection("ingestion_jobs")
+    db.ingestion_jobs.docs.append(new_job("cust-1", "a.pdf", _spool(tmp_path, "a.pdf")))
+
+    async def run():
+        queue = IngestionQueue(db, workers=1, sweep_seconds=0.05)
+        await asyncio.wait_for(queue.start(), timeout=0.5)
+        await asyncio.sleep(0.1)
+        assert db.ingestion_jobs.docs[0]["status"] == "queued"
+        db.ingestion_jobs.down = False
+        await _wait_for(lambda: db.ingestion_jobs.docs[0]["status"] == "succeeded")
+        await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_jobs_are_scoped_to_customer(tmp_path, pipeline):
+    db = MemoryDB()
+
+    async def run():
+        queue = IngestionQueue(db, workers=1)
+        job = await queue.submit("cust-1", "rfp.pdf", _spool(tmp_path))
+        return await queue.get(job["job_id"], "cust-2")
+
+    assert asyncio.run(run()) is None
@@ -40,6 +40,7 @@ def test_query_cache_make_key():
 
     key4 = cache._make_key("cust2", "query1")
     assert key1 != key4
+    assert cache._make_key("cust1", "query1", "tree") != cache._make_key("cust1", "query1", "lexical")
 
 
 def test_query_cache_set_get():
@@ -149,3 +150,65 @@ def test_query_cache_thread_safety_smoke_test():
 
     # If we reached here without crash, it's a good sign
     assert True
+
+
+def test_query_cache_invalidate_tags_only_affected():
+    cache = QueryCache()
+    cache.set("c", "q1", "a1", tags={"doc:a.pdf", "term:fuel"})
+    cache.set("c", "q2", "a2", tags={"doc:b.pdf", "term:gear"})
+    cache.set("other", "q1", "a3", tags={"doc:a.pdf"})
+
+    assert cache.invalidate_documents("c", ["a.pdf"]) == 1
+
+    assert cache.get("c", "q1") is None
+    assert cache.get("c", "q2") == "a2"
+    assert cache.get("other", "q1") == "a3"
+    assert cache.invalidate_tags("c", ["term:gear", "term:unknown"]) == 1
+    assert "c" not in cache._cache._by_customer and "c" not in cache._cache._by_tag
+
+
+def test_query_cache_eviction_cleans_tag_index():
+    cache = QueryCache(max_size=1)
+    cache.set("c", "q1", "a1", tags={"doc:a.pdf"})
+    cache.set("c", "q2", "a2", tags={"doc:b.pdf"})
+
+    assert "doc:a.pdf" not in cache._cache._by_tag["c"]
+    assert cache.invalidate_documents("c", ["a.pdf"]) == 0
+    assert cache.get("c", "q2") == "a2"
+
+
+def test_byte_budget_and_tenant_fairness():
+    from services.query_cache import MemoryBackend
+
+    backend = MemoryBackend(max_size=1000, budget_bytes=4000, tenant_share=0.5, tenant_weights={"gold": 3})
+    cache = QueryCache(max_size=1000, backend=backend)
+    answer = {"response": "x" * 300, "sources": []}
+    for i in range(4):
+        cache.set("quiet", f"q{i}", answer)
+    for i in range(20):
+        cache.set("chatty", f"q{i}", answer)
+
+    occupancy = cache.occupancy()
+    assert occupancy["chatty"]["bytes"] <= 2000  # Capped at half the budget
+    assert occupancy["quiet"]["entries"] == 4  # Not flushed by the chatty tenant
+    assert cache.get("chatty", "q19") is not None and cache.get("chatty", "q0") is None
+
+    for i in range(4):
+        cache.set("gold", f"q{i}", answer)
+    occupancy = cache.occupancy()
+    assert sum(t["bytes"] for t in occupancy.values()) <= 4000
+    assert occupancy["gold"]["entries"] == 4  # Weighted: the others yield first
+    assert cache.occupancy("quiet") == {"quiet": occupancy["quiet"]}
+    assert cache.stats()["evictions"] > 0
+
+
+def test_compressed_answers_round_trip():
+    from services.query_cache import MemoryBackend
+
+    cache = QueryCache(backend=MemoryBackend(budget_bytes=1_000_000, compress_min_bytes=256))
+    answer = {"response": "Turnaround time is 12 days. " * 40, "sources": [{"source": "mro.pdf"}]}
+    cache.set("c", "q1", answer)
+
+    assert cache.get("c", "q1") == answer
+    stats = cache.stats()
+    assert stats["compression_saved_bytes"] > 0 and stats["bytes"] < len(answer["response"])
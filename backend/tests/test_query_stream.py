@@ -0,0 +1,68 @@
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from routers import query as query_router
+from tests.conftest import Doc
+
+
+@pytest.fixture
+def client(rag_engine):
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def fake_auth(request: Request, call_next):
+        request.state.customer_id = request.headers.get("X-Test-Customer")
+        return await call_next(request)
+
+    app.include_router(query_router.router, prefix="/api")
+    return TestClient(app)
+
+
+def _events(resp):
+    events = []
+    for block in resp.text.strip().split("\n\n"):
+        name, data = block.split("\n", 1)
+        events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def test_stream_emits_progress_sources_tokens_done(client, rag_engine):
+    rag_engine.process_and_store_documents(
+        [Doc(f"# Section {i}\nRequirement {i} details") for i in range(40)], "cust-1"
+    )
+
+    resp = client.post("/api/query/stream", json={"query": "What is required?"},
+                       headers={"X-Test-Customer": "cust-1"})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _events(resp)
+    names = [name for name, _ in events]
+    assert names[0] == "progress" and events[0][1]["stage"] == "retrieving"
+    traversal = [data for name, data in events if name == "progress" and data["stage"] == "traversal"]
+    assert traversal and traversal[0]["level"] == 0 and traversal[-1]["leaf"]
+    assert names.index("sources") < names.index("token") < names.index("done")
+    assert names[-1] == "done" and events[-1][1]["cached"] is False
+
+    answer = "".join(data["text"] for name, data in events if name == "token")
+    cached = rag_engine._query_cache.get("cust-1", "What is required?", rag_engine.DEFAULT_RETRIEVAL_MODE)
+    assert cached["response"] == answer
+
+
+def test_stream_serves_second_request_from_cache(client, rag_engine):
+    rag_engine.process_and_store_documents([Doc("# Fuel\nJet A-1 only")], "cust-2")
+    headers = {"X-Test-Customer": "cust-2"}
+
+    client.post("/api/query/stream", json={"query": "fuel?"}, headers=headers)
+    events = _events(client.post("/api/query/stream", json={"query": "fuel?"}, headers=headers))
+
+    assert [name for name, _ in events] == ["progress", "sources", "token", "done"]
+    assert events[-1][1]["cached"] is True
+
+
+def test_stream_requires_authentication(client):
+    resp = client.post("/api/query/stream", json={"query": "q"})
+    assert resp.status_code == 401
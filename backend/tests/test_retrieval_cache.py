@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+
+from services.retrieval_cache import RetrievalCache, normalize_query
+from tests.conftest import Doc
+
+
+def test_rewordings_share_a_key_per_index_version():
+    cache = RetrievalCache()
+    assert normalize_query("What is the MRO turnaround time?") == normalize_query("MRO: turnaround time")
+
+    cache.set("c", "v1", "tree", "What is the MRO turnaround time?", [("n1", None)], "tree", 3)
+    assert cache.get("c", "v1", "tree", "turnaround time MRO").hits == [("n1", None)]
+    assert cache.get("c", "v2", "tree", "turnaround time MRO") is None
+    assert cache.get("c", "v1", "hybrid", "turnaround time MRO") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["selection_calls_saved"]) == (1, 2, 3)
+
+
+def test_ttl_and_capacity():
+    cache = RetrievalCache(max_entries=1, ttl_seconds=0.1)
+    cache.set("c", "v1", "tree", "q1", [("n1", 1.0)], "tree", 1)
+    cache.set("c", "v1", "tree", "q2", [("n2", 1.0)], "tree", 1)
+
+    assert cache.get("c", "v1", "tree", "q1") is None
+    time.sleep(0.15)
+    assert cache.get("c", "v1", "tree", "q2") is None
+
+
+@pytest.fixture
+def engine(rag_engine, monkeypatch):
+    monkeypatch.setattr(rag_engine, "_retrieval_cache", RetrievalCache())
+    monkeypatch.setattr(rag_engine, "SEMANTIC_CACHE_ENABLED", False)
+    docs = [Doc(f"# Section {i}\nRequirement {i} covers topic{i} handling") for i in range(30)]
+    rag_engine.process_and_store_documents(docs, "cust-1")
+    return rag_engine
+
+
+def _ask(engine, query):
+    return asyncio.run(engine.get_customer_response("cust-1", query, retrieval_mode="tree"))
+
+
+def test_answer_miss_reuses_leaves_and_skips_traversal(engine):
+    first = _ask(engine, "Which requirement covers topic3?")
+    engine._query_cache.invalidate_customer("cust-1")  # e.g. answer TTL expired
+    again = _ask(engine, "which requirement covers topic3")
+
+    assert first["retrieval"]["route"] == "tree" and first["retrieval"]["selection_calls"] > 0
+    assert again["cached"] is False
+    assert again["retrieval"] == {"mode": "tree", "route": "cached", "selection_calls": 0}
+    assert again["node_ids"] == first["node_ids"]
+    saved = engine.get_retrieval_metrics()["result_cache"]["selection_calls_saved"]
+    assert saved == first["retrieval"]["selection_calls"]
+
+    # A new index version retires the remembered leaves
+    engine.process_and_store_documents([Doc("# Fuel\nJet A-1 uplift")], "cust-1")
+    assert _ask(engine, "Which requirement covers topic3?")["retrieval"]["route"] == "tree"
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import time
+
+import pytest
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+from services.bm25 import tokenize
+from services.semantic_cache import SemanticCache
+from tests.conftest import Doc
+
+
+def test_hit_above_threshold_only():
+    cache = SemanticCache(threshold=0.9)
+    answers = {"q1": {"response": "a1"}}
+    cache.add("c", "q1", [1.0, 0.0])
+
+    hit = cache.lookup("c", [0.99, 0.05], answers.get)
+    assert hit.data == {"response": "a1"} and hit.query == "q1"
+    assert cache.lookup("c", [0.5, 0.5], answers.get) is None
+    assert cache.lookup("other", [1.0, 0.0], answers.get) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_lookup_is_scoped_by_mode():
+    cache = SemanticCache(threshold=0.9)
+    cache.add("c", "q1", [1.0, 0.0], mode="lexical")
+
+    assert cache.lookup("c", [1.0, 0.0], lambda q: q, mode="tree") is None
+    assert cache.lookup("c", [1.0, 0.0], lambda q: q, mode="lexical").query == "q1"
+    cache.invalidate_customer("c")
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicted_answer_is_a_miss_and_dropped():
+    cache = SemanticCache(threshold=0.9)
+    cache.add("c", "q1", [1.0, 0.0])
+
+    assert cache.lookup("c", [1.0, 0.0], lambda q: None) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_capacity_replaces_oldest_and_ttl_expires():
+    cache = SemanticCache(threshold=0.9, max_entries=2, ttl_seconds=0.1)
+    cache.add("c", "q1", [1.0, 0.0, 0.0])
+    cache.add("c", "q2", [0.0, 1.0, 0.0])
+    cache.add("c", "q3", [0.0, 0.0, 1.0])
+
+    assert cache.lookup("c", [1.0, 0.0, 0.0], lambda q: q) is None
+    assert cache.lookup("c", [0.0, 0.0, 1.0], lambda q: q).query == "q3"
+    time.sleep(0.15)
+    assert cache.lookup("c", [0.0, 0.0, 1.0], lambda q: q) is None
+
+
+def test_matrix_grows_lazily_and_tenants_are_capped():
+    cache = SemanticCache(threshold=0.9, max_entries=64, max_tenants=2)
+    cache.add("a", "q0", [1.0, 0.0])
+    assert cache._tenants[("a", "")].matrix.shape == (16, 2)
+    for i in range(1, 20):
+        cache.add("a", f"q{i}", [1.0, i / 10])
+    assert cache._tenants[("a", "")].matrix.shape == (32, 2)
+    assert cache.lookup("a", [1.0, 0.0], lambda q: q).query == "q0"
+
+    cache.add("b", "q", [1.0, 0.0])
+    cache.lookup("a", [1.0, 0.0], lambda q: q)
+    cache.add("c", "q", [1.0, 0.0])
+
+    assert cache.lookup("b", [1.0, 0.0], lambda q: q) is None
+    assert cache.lookup("a", [1.0, 0.0], lambda q: q) is not None
+    assert cache.stats()["tenants"] == 2
+
+
+def test_audit_counts_false_hits():
+    cache = SemanticCache()
+    assert cache.record_audit("c", ["n1", "n2"], ["n1", "n2"]) is False
+    assert cache.record_audit("c", ["n1", "n2"], ["n7"]) is True
+    assert cache.stats()["false_hit_rate"] == 0.5
+
+
+class BagOfWordsEmbedding(BaseEmbedding):
+    def _embed(self, text):
+        vector = [0.0] * 64
+        for term in tokenize(text):
+            vector[int(hashlib.md5(term.encode()).hexdigest(), 16) % 64] += 1.0
+        return vector
+
+    def _get_text_embedding(self, text):
+        return self._embed(text)
+
+    def _get_query_embedding(self, query):
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query):
+        return self._embed(query)
+
+
+@pytest.fixture
+def embed_model():
+    return BagOfWordsEmbedding()
+
+
+@pytest.fixture
+def engine(rag_engine, monkeypatch):
+    monkeypatch.setattr(rag_engine, "_semantic_cache", SemanticCache(threshold=0.85, audit_rate=0))
+    rag_engine.process_and_store_documents([Doc("# MRO\nTurnaround time is 12 days")], "cust-1")
+    return rag_engine
+
+
+def _ask(engine, query):
+    return asyncio.run(engine.get_customer_response("cust-1", query))
+
+
+def test_rephrased_question_is_served_from_cache(engine):
+    first = _ask(engine, "What is the MRO turnaround time?")
+    second = _ask(engine, "what's the turnaround time for MRO")
+    unrelated = _ask(engine, "Which fuel grade is approved?")
+
+    assert first["cached"] is False
+    assert second["cached"] is True and second["response"] == first["response"]
+    assert unrelated["cached"] is False
+    assert engine.get_semantic_cache_metrics()["hits"] == 1
+
+
+def test_audited_hit_reruns_query(engine, monkeypatch):
+    monkeypatch.setattr(engine._semantic_cache, "_audit_rate", 1.0)
+    _ask(engine, "What is the MRO turnaround time?")
+
+    audited = _ask(engine, "what's the turnaround time for MRO")
+
+    stats = engine.get_semantic_cache_metrics()
+    assert audited["cached"] is False
+    assert stats["audits"] == 1 and stats["false_hits"] == 0
@@ -0,0 +1,149 @@
+import asyncio
+import random
+
+import pytest
+from llama_index.core.llms import MockLLM
+
+from middleware import auth
+from services import simulated_providers
+from services.simulated_providers import (
+    Cassette,
+    Latency,
+    RecordingLLM,
+    SimulatedEmbedding,
+    SimulatedLLM,
+    SimulatedProviderError,
+    SimulationProfile,
+    simulated_load_document,
+)
+from tests.conftest import Doc
+
+
+def test_latency_model_and_profile_overrides():
+    latency = Latency(median_ms=100, sigma=0.5, per_unit_ms=10)
+    samples = sorted(latency.base(random.Random(i)) for i in range(401))
+    assert 0.08 < samples[200] < 0.12 and samples[0] < samples[-1]
+    assert Latency(median_ms=100, per_unit_ms=10).sample(random.Random(0), units=5) == pytest.approx(0.15)
+
+    profile = SimulationProfile.from_spec('{"llm": {"median_ms": 5}, "llm_error_rate": 0.5}')
+    assert profile.llm == Latency(median_ms=5) and profile.llm_error_rate == 0.5
+    with pytest.raises(ValueError):
+        SimulationProfile.from_dict({"llm_ms": 5})
+
+
+def test_completions_are_deterministic_and_classified():
+    llm = SimulatedLLM(profile=SimulationProfile.instant())
+    choices = (
+        "Some choices are given below. It is provided in a numbered list (1 to 2), "
+        "where each item in the list corresponds to a summary.\n---------------------\n"
+        "(1) brake wear limits\n\n(2) fuel tank sealing\n---------------------\n"
+        "Using only the choices above and not prior knowledge, return the top choices "
+        "(no more than 1, ranked by most relevant to least) that are most relevant to "
+        "the question: 'fuel sealing'\nProvide choices in the following format: "
+        "'ANSWER: <numbers>' and explain why these summaries were selected as relevant to the question.\n"
+    )
+    answer = "Context:\nThe APU shop visit takes 12 days. Brakes are replaced at 10%.\nQuery: How long is the APU shop visit?\nAnswer: "
+
+    assert llm.complete(choices).text == "ANSWER: 2"
+    assert llm.complete(answer).text == "The APU shop visit takes 12 days."
+    assert llm.complete(answer).text == SimulatedLLM(profile=SimulationProfile.instant()).complete(answer).text
+    assert dict(llm.calls) == {"select": 1, "answer": 2}
+
+    streamed = list(llm.stream_complete(answer))
+    assert streamed[-1].text == "The APU shop visit takes 12 days." and len(streamed) == 7
+
+
+def test_injected_errors_and_latency():
+    failing = SimulatedLLM(profile=SimulationProfile.instant(llm_error_rate=1.0))
+    with pytest.raises(SimulatedProviderError):
+        asyncio.run(failing.acomplete("Summarize this"))
+    assert failing.calls["errors"] == 1
+
+    slow = SimulatedLLM(profile=SimulationProfile.instant(llm=Latency(median_ms=30)))
+
+    async def timed():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(slow.acomplete(f"Summarize part {i}") for i in range(5)))
+        return loop.time() - start
+
+    # Concurrent calls overlap rather than serialize
+    assert 0.03 <= asyncio.run(timed()) < 0.12
+
+
+def test_embeddings_parse_and_auth(tmp_path, monkeypatch):
+    embed = SimulatedEmbedding(profile=SimulationProfile.instant())
+    vectors = embed.get_text_embedding_batch(["fuel tank sealing", "fuel tank sealing", "brake wear"])
+    assert vectors[0] == vectors[1] != vectors[2] and len(vectors[0]) == 256
+    assert embed.calls["texts"] == 3
+
+    text_file = tmp_path / "capabilities.md"
+    text_file.write_text("# Capabilities\nWe overhaul landing gear.")
+    binary_file = tmp_path / "scan.pdf"
+    binary_file.write_bytes(bytes(range(256)) * 64)
+    pages = asyncio.run(simulated_load_document(str(text_file), SimulationProfile.instant()))
+    assert [p.text for p in pages] == ["# Capabilities\nWe overhaul landing gear."]
+    generated = asyncio.run(simulated_load_document(str(binary_file), SimulationProfile.instant()))
+    again = asyncio.run(simulated_load_document(str(binary_file), SimulationProfile.instant()))
+    assert [p.text for p in generated] == [p.text for p in again] and "## Section 4" in generated[0].text
+
+    monkeypatch.setattr(auth, "SIMULATED_PROVIDERS", True)
+    user = asyncio.run(auth.verify_supabase_token("sim:alice:admin"))
+    assert user["role"] == "admin" and user == asyncio.run(auth.verify_supabase_token("sim:alice:admin"))
+    assert user["sub"] != asyncio.run(auth.verify_supabase_token("sim:bob"))["sub"]
+    assert asyncio.run(auth.verify_supabase_token("eyJhbGciOi.not-simulated")) is None
+
+
+def test_env_flag_is_refused_outside_dev_and_test(monkeypatch):
+    monkeypatch.setenv("SIMULATED_PROVIDERS", "1")
+    monkeypatch.delenv("AVICON_ENV", raising=False)
+    with pytest.raises(RuntimeError, match="refused"):
+        simulated_providers._simulation_enabled()
+    monkeypatch.setenv("AVICON_ENV", "production")
+    with pytest.raises(RuntimeError):
+        simulated_providers._simulation_enabled()
+
+    monkeypatch.setenv("AVICON_ENV", "test")
+    assert simulated_providers._simulation_enabled()
+    monkeypatch.setenv("SIMULATED_PROVIDERS", "0")
+    assert not simulated_providers._simulation_enabled()
+    # Auth only accepts sim: tokens when a harness switches it on in-process
+    assert auth.SIMULATED_PROVIDERS is False
+
+
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    recorder = RecordingLLM(MockLLM(), Cassette(path))
+    real = recorder.complete("Query: what is recorded?\nAnswer: ").text
+
+    replayer = SimulatedLLM(profile=SimulationProfile.instant(), cassette=Cassette(path))
+    assert replayer.complete("Query: what is recorded?\nAnswer: ").text == real
+    assert replayer.calls["replayed"] == 1
+    assert not recorder.metadata.is_chat_model
+
+
+@pytest.fixture
+def llm():
+    return SimulatedLLM(profile=SimulationProfile.instant())
+
+
+@pytest.fixture
+def embed_model():
+    return SimulatedEmbedding(profile=SimulationProfile.instant())
+
+
+def test_tree_query_end_to_end(rag_engine, monkeypatch):
+    monkeypatch.setattr(rag_engine, "LLM_CACHE_ENABLED", False)
+    topics = ["landing gear", "borescope", "avionics", "fuel sealing", "hydraulics", "brakes"]
+    docs = [
+        Doc(f"# Work order WO-{100 + i}\nWO-{100 + i} covers {topic} in {8 + i} days.", f"section-{i}.pdf")
+        for i, topic in enumerate(topics * 4)
+    ]
+    rag_engine.process_and_store_documents(docs, "cust-1")
+
+    result = asyncio.run(
+        rag_engine.get_customer_response("cust-1", "How long does WO-115 take?", use_cache=False, retrieval_mode="tree")
+    )
+
+    assert any(s["source"] == "section-15.pdf" for s in result["sources"])
+    assert "23 days" in result["response"]
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight
+
+
+def test_concurrent_duplicates_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"answer": 42}
+
+    async def run():
+        return await asyncio.gather(*(flights.do("k", work) for _ in range(5)))
+
+    results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert flights.stats() == {"executions": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_distinct_keys_and_sequential_calls_run_separately():
+    flights = SingleFlight()
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def run():
+        await asyncio.gather(flights.do("a", lambda: work("a")), flights.do("b", lambda: work("b")))
+        await flights.do("a", lambda: work("a"))
+
+    asyncio.run(run())
+
+    assert sorted(calls) == ["a", "a", "b"]
+    assert flights.stats()["coalesced"] == 0
+
+
+def test_failure_propagates_to_all_callers_and_is_not_remembered():
+    flights = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("llm down")
+
+    async def run():
+        results = await asyncio.gather(
+            flights.do("k", boom), flights.do("k", boom), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        return await flights.do("k", lambda: asyncio.sleep(0, result="ok"))
+
+    assert asyncio.run(run()) == "ok"
+
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flights.do("k", work))
+        second = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
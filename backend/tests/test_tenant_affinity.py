@@ -0,0 +1,152 @@
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from middleware.tenant_affinity import FORWARDED_HEADER, TenantAffinityMiddleware
+from services.tenant_affinity import RendezvousRouter
+
+TENANTS = [f"tenant-{i}" for i in range(1000)]
+
+
+def test_owner_is_deterministic():
+    a = RendezvousRouter(["n1", "n2", "n3"])
+    b = RendezvousRouter(["n3", "n1", "n2"])
+    assert all(a.owner(t) == b.owner(t) for t in TENANTS)
+
+
+def test_tenants_spread_across_nodes():
+    router = RendezvousRouter(["n1", "n2", "n3", "n4"])
+    counts = {}
+    for t in TENANTS:
+        counts[router.owner(t)] = counts.get(router.owner(t), 0) + 1
+    assert set(counts) == {"n1", "n2", "n3", "n4"}
+    assert min(counts.values()) > 150
+
+
+def test_adding_node_only_moves_tenants_to_it():
+    base = RendezvousRouter(["n1", "n2", "n3"])
+    grown = base.with_nodes(["n1", "n2", "n3", "n4"])
+    moved = [t for t in TENANTS if base.owner(t) != grown.owner(t)]
+
+    assert all(grown.owner(t) == "n4" for t in moved)
+    assert len(moved) < len(TENANTS) * 0.35
+
+
+def test_removing_node_only_moves_its_tenants():
+    base = RendezvousRouter(["n1", "n2", "n3"])
+    shrunk = base.with_nodes(["n1", "n2"])
+    moved = [t for t in TENANTS if base.owner(t) != shrunk.owner(t)]
+
+    assert all(base.owner(t) == "n3" for t in moved)
+
+
+def test_ranked_starts_with_owner():
+    router = RendezvousRouter(["n1", "n2", "n3"])
+    for t in TENANTS[:50]:
+        ranked = router.ranked(t)
+        assert ranked[0] == router.owner(t)
+        assert sorted(ranked) == ["n1", "n2", "n3"]
+
+
+def test_weights_shift_ownership():
+    router = RendezvousRouter(["n1", "n2"], weights={"n1": 3.0, "n2": 1.0})
+    n1 = sum(router.owner(t) == "n1" for t in TENANTS)
+    assert n1 > 650
+
+
+def _make_app(owner_router, upstream_calls, error=None):
+    def handler(request: httpx.Request):
+        upstream_calls.append(request)
+        if error is not None:
+            raise error("owner failed", request=request)
+        return httpx.Response(200, json={"served_by": "owner"})
+
+    app = FastAPI()
+    app.add_middleware(
+        TenantAffinityMiddleware,
+        router=owner_router,
+        self_node="http://self",
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+    @app.middleware("http")
+    async def fake_auth(request: Request, call_next):
+        request.state.customer_id = request.headers.get("X-Test-Customer")
+        return await call_next(request)
+
+    @app.post("/api/query/")
+    async def query(request: Request):
+        return {"served_by": "self", "body": (await request.json())}
+
+    @app.get("/api/stats")
+    async def stats():
+        return {"served_by": "self"}
+
+    return app
+
+
+def test_middleware_forwards_to_owner():
+    router = RendezvousRouter(["http://self", "http://peer"])
+    tenant = next(t for t in TENANTS if router.owner(t) == "http://peer")
+    calls = []
+    client = TestClient(_make_app(router, calls))
+
+    resp = client.post("/api/query/", json={"query": "q"}, headers={"X-Test-Customer": tenant})
+
+    assert resp.json() == {"served_by": "owner"}
+    assert len(calls) == 1
+    assert str(calls[0].url) == "http://peer/api/query/"
+    assert calls[0].headers[FORWARDED_HEADER] == "http://self"
+
+
+def test_middleware_serves_own_tenants_locally():
+    router = RendezvousRouter(["http://self", "http://peer"])
+    tenant = next(t for t in TENANTS if router.owner(t) == "http://self")
+    calls = []
+    client = TestClient(_make_app(router, calls))
+
+    resp = client.post("/api/query/", json={"query": "q"}, headers={"X-Test-Customer": tenant})
+
+    assert resp.json() == {"served_by": "self", "body": {"query": "q"}}
+    assert calls == []
+
+
+def test_middleware_never_forwards_twice_or_non_rag_paths():
+    router = RendezvousRouter(["http://self", "http://peer"])
+    tenant = next(t for t in TENANTS if router.owner(t) == "http://peer")
+    calls = []
+    client = TestClient(_make_app(router, calls))
+
+    hop = client.post(
+        "/api/query/", json={"query": "q"},
+        headers={"X-Test-Customer": tenant, FORWARDED_HEADER: "http://peer"},
+    )
+    other = client.get("/api/stats", headers={"X-Test-Customer": tenant})
+
+    assert hop.json() == {"served_by": "self", "body": {"query": "q"}}
+    assert other.json() == {"served_by": "self"}
+    assert calls == []
+
+
+def test_unreachable_owner_falls_back_to_local_with_full_body():
+    router = RendezvousRouter(["http://self", "http://peer"])
+    tenant = next(t for t in TENANTS if router.owner(t) == "http://peer")
+    calls = []
+    client = TestClient(_make_app(router, calls, error=httpx.ConnectError))
+
+    resp = client.post("/api/query/", json={"query": "q"}, headers={"X-Test-Customer": tenant})
+
+    assert resp.json() == {"served_by": "self", "body": {"query": "q"}}
+    assert len(calls) == 1
+
+
+def test_owner_failure_after_send_is_a_502_not_a_replay():
+    router = RendezvousRouter(["http://self", "http://peer"])
+    tenant = next(t for t in TENANTS if router.owner(t) == "http://peer")
+    calls = []
+    client = TestClient(_make_app(router, calls, error=httpx.ReadTimeout))
+
+    resp = client.post("/api/query/", json={"query": "q"}, headers={"X-Test-Customer": tenant})
+
+    assert resp.status_code == 502
+    assert len(calls) == 1
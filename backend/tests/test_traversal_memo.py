@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from services.retrieval_cache import RetrievalCache
+from services.traversal_memo import TraversalMemo, candidates_key
+from services.tree_retriever import ProgressTreeRetriever
+from tests.conftest import Doc
+
+
+def test_buckets_group_nearby_embeddings():
+    memo = TraversalMemo(bits=8)
+    assert memo.bucket([1.0, 0.2, 0.0]) == memo.bucket([1.0, 0.21, 0.0])
+    assert memo.bucket([1.0, 0.2, 0.0]) != memo.bucket([-1.0, -0.2, 0.0])
+    assert candidates_key(["b", "a"]) == candidates_key(["a", "b"])
+
+
+def test_lookup_is_per_version_and_counts_levels():
+    memo = TraversalMemo()
+    memo.set("v1", "cands", "b1", ["n1"])
+
+    assert memo.get("v1", "cands", "b1", level=0) == ["n1"]
+    assert memo.get("v2", "cands", "b1", level=0) is None
+    assert memo.get("v1", "cands", "b2", level=1) is None
+
+    stats = memo.stats()
+    assert (stats["hits"], stats["lookups"], stats["llm_calls_avoided"]) == (1, 3, 1)
+    assert stats["levels"][0]["hit_ratio"] == 0.5 and stats["levels"][1]["hits"] == 0
+
+
+@pytest.fixture
+def engine(rag_engine, monkeypatch):
+    monkeypatch.setattr(rag_engine, "_retrieval_cache", RetrievalCache())
+    monkeypatch.setattr(rag_engine, "_traversal_memo", TraversalMemo())
+    monkeypatch.setattr(rag_engine, "SEMANTIC_CACHE_ENABLED", False)
+    # MockLLM cannot pick branches; always take the first candidate
+    monkeypatch.setattr(
+        ProgressTreeRetriever, "_select_nodes", lambda self, nodes, query_bundle, level=0: nodes[:1]
+    )
+    docs = [Doc(f"# Section {i}\nRequirement {i} covers topic{i} handling") for i in range(60)]
+    rag_engine.process_and_store_documents(docs, "cust-1")
+    return rag_engine
+
+
+def _ask(engine, query):
+    return asyncio.run(engine.get_customer_response("cust-1", query, retrieval_mode="tree"))
+
+
+def test_similar_query_replays_upper_levels(engine):
+    first = _ask(engine, "Which requirement covers topic3?")["retrieval"]
+    # MockEmbedding puts every query in one bucket; different terms miss the leaf cache
+    second = _ask(engine, "topic3 handling scope")["retrieval"]
+
+    assert second["route"] == "tree"
+    assert 1 <= second["selection_calls"] < first["selection_calls"]  # Only the final descent
+    stats = engine.get_retrieval_metrics()["traversal_memo"]
+    assert stats["llm_calls_avoided"] == first["selection_calls"] - second["selection_calls"]
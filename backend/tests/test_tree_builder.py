@@ -0,0 +1,193 @@
+import asyncio
+import uuid
+
+import pytest
+from llama_index.core import TreeIndex
+from llama_index.core.llms import MockLLM
+from llama_index.core.schema import TextNode
+
+from services import document_parser, simulated_providers
+from services.simulated_providers import SimulationProfile
+from services.tree_builder import abuild_tree_index, insert_nodes
+
+
+class CountingLLM(MockLLM):
+    """MockLLM that counts summarization calls."""
+    calls: int = 0
+
+    def complete(self, prompt, formatted=False, **kwargs):
+        self.calls += 1
+        return super().complete(prompt, formatted=formatted, **kwargs)
+
+
+class SlowFlakyLLM(MockLLM):
+    """Async MockLLM that tracks peak concurrency and fails the first N calls."""
+    active: int = 0
+    peak: int = 0
+    failures: int = 0
+
+    async def acomplete(self, prompt, formatted=False, **kwargs):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if self.failures > 0:
+                self.failures -= 1
+                raise RuntimeError("429 Too Many Requests")
+            return self.complete(prompt, formatted=formatted, **kwargs)
+        finally:
+            self.active -= 1
+
+
+def _shape(index):
+    """Tree structure by graph position: {index: sorted child indices}, roots."""
+    graph = index.index_struct
+    position = {node_id: idx for idx, node_id in graph.all_nodes.items()}
+    children = {
+        position[node_id]: sorted(position[c] for c in child_ids)
+        for node_id, child_ids in graph.node_id_to_children_ids.items()
+        if child_ids
+    }
+    return children, sorted(graph.root_nodes)
+
+
+def _nodes(prefix, count):
+    return [TextNode(text=f"{prefix} section {i}") for i in range(count)]
+
+
+def _leaf_texts(index):
+    graph = index.index_struct
+    leaf_ids = [
+        node_id for node_id in graph.all_nodes.values()
+        if not graph.node_id_to_children_ids.get(node_id)
+    ]
+    return sorted(n.get_content() for n in index.docstore.get_nodes(leaf_ids))
+
+
+def _reachable_leaves(index):
+    graph = index.index_struct
+    stack = list(graph.root_nodes.values())
+    leaves = set()
+    while stack:
+        node_id = stack.pop()
+        children = graph.node_id_to_children_ids.get(node_id, [])
+        if children:
+            stack.extend(children)
+        else:
+            leaves.add(node_id)
+    return leaves
+
+
+def test_insert_nodes_keeps_existing_content():
+    llm = CountingLLM(max_tokens=5)
+    index = TreeIndex(_nodes("old", 25), llm=llm)
+
+    inserted = insert_nodes(index, _nodes("new", 12))
+
+    assert inserted == 12
+    texts = _leaf_texts(index)
+    assert len(texts) == 37
+    assert "old section 0" in texts
+    assert "new section 11" in texts
+    # Every leaf is still reachable from the root layer
+    assert len(_reachable_leaves(index)) == 37
+    assert len(index.index_struct.root_nodes) <= index.num_children
+
+
+def test_insert_nodes_cost_is_proportional_to_new_content():
+    llm = CountingLLM(max_tokens=5)
+    index = TreeIndex(_nodes("old", 200), llm=llm)
+    build_calls = llm.calls
+
+    llm.calls = 0
+    insert_nodes(index, _nodes("new", 10))
+
+    # 10 new leaves fit under a single root; nothing else is re-summarized
+    assert llm.calls <= 2
+    assert llm.calls < build_calls
+
+
+def test_insert_nodes_skips_duplicate_content():
+    llm = CountingLLM(max_tokens=5)
+    index = TreeIndex(_nodes("old", 5), llm=llm)
+
+    assert insert_nodes(index, _nodes("old", 5)) == 0
+    assert len(_leaf_texts(index)) == 5
+
+
+def test_insert_nodes_keeps_identical_text_from_another_document():
+    index = TreeIndex([TextNode(text="Torque to 45 Nm", metadata={"source": "a.pdf"})], llm=CountingLLM(max_tokens=5))
+
+    same = TextNode(text="Torque to 45 Nm", metadata={"source": "a.pdf"})
+    other = TextNode(text="Torque to 45 Nm", metadata={"source": "b.pdf"})
+    assert insert_nodes(index, [same, other]) == 1
+    assert _leaf_texts(index) == ["Torque to 45 Nm", "Torque to 45 Nm"]
+
+
+def test_reupload_through_parse_path_inserts_nothing(rag_engine, tmp_path, monkeypatch):
+    # The offline LlamaParse stand-in returns a text file's contents as parsed pages
+    monkeypatch.setattr(simulated_providers, "SIMULATED_PROVIDERS", True)
+    monkeypatch.setattr(simulated_providers, "_profile", SimulationProfile.instant())
+    content = "\n".join(f"# Section {i}\nWork order {i} covers landing gear overhaul." for i in range(3))
+
+    async def upload():
+        # Spooled as the upload router does: a fresh uuid-prefixed temp name per upload
+        path = tmp_path / f"{uuid.uuid4().hex}_capabilities.md"
+        path.write_text(content)
+        parsed = await document_parser.load_document(str(path))
+        masked = await document_parser.mask_documents(parsed, str(path), "cust-1", source="capabilities.md")
+        return await rag_engine.aprocess_and_store_documents(masked, "cust-1")
+
+    assert asyncio.run(upload()) == 3
+    version = rag_engine._index_store.current_version("cust-1")
+    assert asyncio.run(upload()) == 0
+    # A duplicate upload publishes nothing: no new snapshot, no CURRENT move
+    assert rag_engine._index_store.current_version("cust-1") == version
+    tenant_dir = rag_engine._index_store.snapshot_dir("cust-1", version).parent
+    snapshots = [p for p in tenant_dir.iterdir() if p.is_dir()]
+    assert [p.name for p in snapshots] == [version]
+
+
+def test_insert_nodes_consolidates_root_layer():
+    llm = CountingLLM(max_tokens=5)
+    index = TreeIndex(_nodes("old", 95), llm=llm, num_children=10)
+    assert len(index.index_struct.root_nodes) == 10
+
+    insert_nodes(index, _nodes("new", 30))
+
+    assert len(index.index_struct.root_nodes) <= 10
+    assert len(_reachable_leaves(index)) == 125
+
+
+def test_async_build_matches_sequential_tree_shape():
+    nodes = _nodes("doc", 137)
+    sequential = TreeIndex(nodes, llm=MockLLM(max_tokens=5))
+    metrics = []
+
+    concurrent = asyncio.run(abuild_tree_index(_nodes("doc", 137), llm=MockLLM(max_tokens=5), metrics=metrics))
+
+    assert _shape(concurrent) == _shape(sequential)
+    assert _leaf_texts(sequential) == _leaf_texts(concurrent)
+    assert [m["summaries"] for m in metrics] == [14, 2]
+
+
+def test_async_build_bounds_concurrency_and_retries():
+    llm = SlowFlakyLLM(max_tokens=5)
+    llm.failures = 2
+    metrics = []
+
+    index = asyncio.run(abuild_tree_index(
+        _nodes("doc", 120), llm=llm, metrics=metrics, concurrency=4, backoff_seconds=0,
+    ))
+
+    assert llm.peak == 4
+    assert sum(m["retries"] for m in metrics) == 2
+    assert len(_reachable_leaves(index)) == 120
+
+
+def test_async_build_gives_up_after_retries():
+    llm = SlowFlakyLLM(max_tokens=5)
+    llm.failures = 10
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(abuild_tree_index(_nodes("doc", 30), llm=llm, retries=1, backoff_seconds=0))
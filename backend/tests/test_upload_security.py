@@ -30,7 +30,10 @@ with patch("dotenv.load_dotenv"):
     with patch.dict("os.environ", {"MONGO_URL": "mongodb://mock", "DB_NAME": "mock_db"}):
         from server import app
         from fastapi.testclient import TestClient
+        from services.ingestion import new_job
 
+# Lifespan does not run without a context manager; stub the ingestion queue
+app.state.ingestion = MagicMock(submit=AsyncMock(side_effect=new_job))
 client = TestClient(app)
 
 class TestUploadSecurity(unittest.TestCase):
@@ -59,16 +62,15 @@ class TestUploadSecurity(unittest.TestCase):
 
                 response = self.client.post("/api/documents/upload", files=files, headers=headers)
 
-                self.assertEqual(response.status_code, 200, response.text)
+                self.assertEqual(response.status_code, 202, response.text)
+                self.assertEqual(response.json()["status"], "queued")
 
                 # Verify content was written
                 handle = mock_file_obj.__aenter__.return_value
                 handle.write.assert_called_with(b"Hello World")
 
-                # Verify cleanup (unlink) should NOT be called on success (documents.py unlinks in finally block)
-                # Wait, existing code: finally: if temp_path.exists(): temp_path.unlink()
-                # So it IS called on success too.
-                mock_unlink.assert_called()
+                # The queued ingestion job owns the spooled file, so the request must not delete it
+                mock_unlink.assert_not_called()
 
     def test_upload_filename_sanitization(self):
         # Filename with path traversal characters
@@ -84,7 +86,7 @@ class TestUploadSecurity(unittest.TestCase):
                  patch("pathlib.Path.unlink"):
 
                 response = self.client.post("/api/documents/upload", files=files, headers=headers)
-                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.status_code, 202)
 
                 # Check filename used in open
                 args, _ = mocked_file.call_args
@@ -109,7 +111,7 @@ class TestUploadSecurity(unittest.TestCase):
                  patch("pathlib.Path.unlink"):
 
                 response = self.client.post("/api/documents/upload", files=files, headers=headers)
-                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.status_code, 202)
 
                 args, _ = mocked_file.call_args
                 path_arg = str(args[0])
@@ -0,0 +1,106 @@
+import asyncio
+
+import numpy as np
+import pytest
+from llama_index.core.embeddings import MockEmbedding
+
+from services.vector_index import VectorIndex
+from tests.conftest import Doc
+
+
+def _clustered(rows, dim=16, clusters=12, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim))
+    return centres[rng.integers(0, clusters, rows)] + 0.1 * rng.normal(size=(rows, dim))
+
+
+def test_search_returns_cosine_top_k():
+    ids = ["a", "b", "c"]
+    index = VectorIndex.build(ids, [[1, 0], [0.7, 0.7], [0, 1]])
+
+    hits = index.search([1, 0.1], top_k=2)
+
+    assert [node_id for node_id, _ in hits] == ["a", "b"]
+    assert hits[0][1] == pytest.approx(0.995, abs=1e-3)
+    assert VectorIndex.build([], np.zeros((0, 2))).search([1, 0]) == []
+
+
+def test_ivf_matches_exact_search_on_clustered_data():
+    data = _clustered(2000)
+    ids = [f"n{i}" for i in range(len(data))]
+    exact = VectorIndex.build(ids, data, ivf_min_rows=10**9)
+    ivf = VectorIndex.build(ids, data, ivf_min_rows=1000)
+    assert ivf.centroids is not None and ivf.offsets[-1] == len(ids)
+
+    queries = _clustered(20, seed=1)
+    recall = np.mean([
+        len({i for i, _ in ivf.search(q, 10, nprobe=8)} & {i for i, _ in exact.search(q, 10)}) / 10
+        for q in queries
+    ])
+    assert recall >= 0.9
+
+
+def test_artifacts_round_trip_memory_mapped(tmp_path):
+    index = VectorIndex.build([f"n{i}" for i in range(300)], _clustered(300), ivf_min_rows=100)
+    for name, data in index.to_artifacts().items():
+        (tmp_path / name).write_bytes(data)
+
+    loaded = VectorIndex.load(tmp_path)
+
+    assert isinstance(loaded.matrix, np.memmap)
+    query = _clustered(1, seed=3)[0]
+    assert loaded.search(query, 5) == index.search(query, 5)
+    assert VectorIndex.load(tmp_path / "missing") is None
+
+
+class CountingEmbedding(MockEmbedding):
+    def _get_text_embeddings(self, texts):
+        self.__dict__.setdefault("embedded", []).extend(texts)
+        return super()._get_text_embeddings(texts)
+
+
+@pytest.fixture
+def embed_model():
+    return CountingEmbedding(embed_dim=8)
+
+
+def test_vector_mode_skips_tree_selection_calls(rag_engine):
+    rag_engine.process_and_store_documents([Doc(f"# Section {i}\nRequirement {i}") for i in range(60)], "cust-1")
+
+    result = asyncio.run(rag_engine.get_customer_response("cust-1", "requirement 7", use_cache=False, retrieval_mode="vector"))
+
+    assert result["retrieval"] == {"mode": "vector", "route": "vector", "selection_calls": 0}
+    assert result["sources"][0]["source"] == "rfp.pdf"
+    assert isinstance(rag_engine._index_cache.peek("cust-1")["extras"]["vectors"].matrix, np.memmap)
+
+
+def test_incremental_upload_embeds_only_new_leaves(rag_engine, embed_model):
+    rag_engine.process_and_store_documents([Doc(f"# Section {i}\nRequirement {i}") for i in range(20)], "cust-1")
+    first = len(embed_model.embedded)
+    rag_engine.process_and_store_documents([Doc("# Fuel\nJet A-1 only")], "cust-1")
+
+    version = rag_engine._index_store.current_version("cust-1")
+    vectors = VectorIndex.load(rag_engine._index_store.snapshot_dir("cust-1", version))
+    assert len(embed_model.embedded) - first == 1
+    assert len(vectors) == first + 1
+
+
+def test_backfill_embeds_once_under_the_build_lock(rag_engine, embed_model, monkeypatch):
+    # A snapshot persisted without vectors (e.g. the embedding API was down)
+    async def no_vectors(customer_id, index, previous_version):
+        return None
+
+    monkeypatch.setattr(rag_engine, "_abuild_vector_index", no_vectors)
+    rag_engine.process_and_store_documents([Doc(f"# Section {i}\nRequirement {i}") for i in range(20)], "cust-1")
+    embedded = len(getattr(embed_model, "embedded", []))
+
+    async def ask_concurrently():
+        return await asyncio.gather(*(
+            rag_engine.get_customer_response("cust-1", f"requirement {i}", use_cache=False, retrieval_mode="vector")
+            for i in range(4)
+        ))
+
+    results = asyncio.run(ask_concurrently())
+
+    assert all(r["retrieval"]["route"] == "vector" for r in results)
+    assert len(embed_model.embedded) - embedded == 20